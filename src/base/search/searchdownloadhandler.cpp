@@ -36,6 +36,16 @@
 #include "base/utils/fs.h"
 #include "searchpluginmanager.h"
 
+namespace
+{
+    // nova2dl prints a `path url` line for every downloaded torrent
+    QString parseDownloadedPath(const QString &line)
+    {
+        const QList<QStringView> parts = QStringView(line).trimmed().split(u' ');
+        return (parts.size() == 2) ? parts[0].toString() : QString();
+    }
+}
+
 SearchDownloadHandler::SearchDownloadHandler(const QString &pluginName, const QString &url, SearchPluginManager *manager)
     : QObject(manager)
     , m_manager {manager}
@@ -55,17 +65,63 @@ SearchDownloadHandler::SearchDownloadHandler(const QString &pluginName, const QS
     m_downloadProcess->start(Utils::ForeignApps::pythonInfo().executableName, params, QIODevice::ReadOnly);
 }
 
+SearchDownloadHandler::SearchDownloadHandler(const QList<SearchDownload> &downloads, SearchPluginManager *manager)
+    : QObject(manager)
+    , m_manager {manager}
+    , m_downloadProcess {new QProcess(this)}
+{
+    m_downloadProcess->setEnvironment(QProcess::systemEnvironment());
+    connect(m_downloadProcess, &QProcess::readyReadStandardOutput, this, &SearchDownloadHandler::readBatchOutput);
+    connect(m_downloadProcess, qOverload<int, QProcess::ExitStatus>(&QProcess::finished), this, [this]
+    {
+        readBatchOutput();
+        emit batchFinished();
+    });
+    connect(m_downloadProcess, &QProcess::errorOccurred, this, [this](const QProcess::ProcessError error)
+    {
+        if (error == QProcess::FailedToStart)
+            emit batchFinished();
+    });
+    const QStringList params
+    {
+        Utils::ForeignApps::PYTHON_ISOLATE_MODE_FLAG,
+        (SearchPluginManager::engineLocation() / Path(u"nova2dl.py"_s)).toString(),
+        u"--batch"_s
+    };
+    m_downloadProcess->start(Utils::ForeignApps::pythonInfo().executableName, params, QIODevice::ReadWrite);
+
+    // pass the downloads on stdin as `engine_name:download_parameter` lines, there can be too many for the command line
+    QByteArray input;
+    for (const SearchDownload &download : downloads)
+        input += download.pluginName.toUtf8() + ':' + download.url.toUtf8() + '\n';
+    m_downloadProcess->write(input);
+    m_downloadProcess->closeWriteChannel();
+}
+
 void SearchDownloadHandler::downloadProcessFinished(int exitcode)
 {
     QString path;
 
     if ((exitcode == 0) && (m_downloadProcess->exitStatus() == QProcess::NormalExit))
-    {
-        const QString line = QString::fromUtf8(m_downloadProcess->readAllStandardOutput()).trimmed();
-        const QList<QStringView> parts = QStringView(line).split(u' ');
-        if (parts.size() == 2)
-            path = parts[0].toString();
-    }
+        path = parseDownloadedPath(QString::fromUtf8(m_downloadProcess->readAllStandardOutput()));
 
     emit downloadFinished(path);
 }
+
+void SearchDownloadHandler::readBatchOutput()
+{
+    QByteArray output = m_downloadProcess->readAllStandardOutput();
+    output.replace('\r', "");
+
+    QList<QByteArray> lines = output.split('\n');
+    if (!m_batchOutputTruncated.isEmpty())
+        lines.prepend(m_batchOutputTruncated + lines.takeFirst());
+    m_batchOutputTruncated = lines.takeLast();
+
+    for (const QByteArray &line : asConst(lines))
+    {
+        const QString path = parseDownloadedPath(QString::fromUtf8(line));
+        if (!path.isEmpty())
+            emit downloadFinished(path);
+    }
+}
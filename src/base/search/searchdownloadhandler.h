@@ -28,11 +28,14 @@
 
 #pragma once
 
+#include <QByteArray>
+#include <QList>
 #include <QObject>
 
 class QProcess;
 
 class SearchPluginManager;
+struct SearchDownload;
 
 class SearchDownloadHandler : public QObject
 {
@@ -42,13 +45,20 @@ class SearchDownloadHandler : public QObject
     friend class SearchPluginManager;
 
     SearchDownloadHandler(const QString &pluginName, const QString &url, SearchPluginManager *manager);
+    // downloads all the torrents with a single nova2dl process
+    SearchDownloadHandler(const QList<SearchDownload> &downloads, SearchPluginManager *manager);
 
 signals:
+    // in batch mode, only emitted for the torrents that were downloaded
     void downloadFinished(const QString &path);
+    // emitted once the downloads of a batch are over
+    void batchFinished();
 
 private:
     void downloadProcessFinished(int exitcode);
+    void readBatchOutput();
 
     SearchPluginManager *m_manager = nullptr;
     QProcess *m_downloadProcess = nullptr;
+    QByteArray m_batchOutputTruncated;
 };
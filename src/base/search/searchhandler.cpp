@@ -29,8 +29,13 @@
 
 #include "searchhandler.h"
 
+#include <algorithm>
 #include <chrono>
 
+#include <QJsonArray>
+#include <QJsonDocument>
+#include <QJsonObject>
+#include <QJsonValue>
 #include <QList>
 #include <QMetaObject>
 #include <QProcess>
@@ -58,6 +63,10 @@ namespace
         PL_PUB_DATE,
         NB_PLUGIN_COLUMNS
     };
+
+    // nova2 writes one such line per engine to stderr when the engine completes, followed by a JSON object:
+    // {"engine": "engine1", "status": "ok", "results": 42, "elapsed_ms": 1234}
+    const QByteArray ENGINE_COMPLETION_RECORD_PREFIX = QByteArrayLiteral("nova2:completed ");
 }
 
 SearchHandler::SearchHandler(const QString &pattern, const QString &category, const QStringList &usedPlugins, SearchPluginManager *manager)
@@ -76,6 +85,7 @@ SearchHandler::SearchHandler(const QString &pattern, const QString &category, co
     {
         Utils::ForeignApps::PYTHON_ISOLATE_MODE_FLAG,
         (SearchPluginManager::engineLocation() / Path(u"nova2.py"_s)).toString(),
+        u"--format=ndjson"_s,
         m_usedPlugins.join(u','),
         m_category
     };
@@ -86,6 +96,7 @@ SearchHandler::SearchHandler(const QString &pattern, const QString &category, co
 
     connect(m_searchProcess, &QProcess::errorOccurred, this, &SearchHandler::processFailed);
     connect(m_searchProcess, &QProcess::readyReadStandardOutput, this, &SearchHandler::readSearchOutput);
+    connect(m_searchProcess, &QProcess::readyReadStandardError, this, &SearchHandler::readSearchErrors);
     connect(m_searchProcess, qOverload<int, QProcess::ExitStatus>(&QProcess::finished)
             , this, &SearchHandler::processFinished);
 
@@ -111,7 +122,13 @@ void SearchHandler::cancelSearch()
 #ifdef Q_OS_WIN
     m_searchProcess->kill();
 #else
+    // nova2 stops its engines on SIGTERM and prints the results found so far, kill it if it does not exit
     m_searchProcess->terminate();
+    QTimer::singleShot(5s, m_searchProcess, [process = m_searchProcess]
+    {
+        if (process->state() != QProcess::NotRunning)
+            process->kill();
+    });
 #endif
     m_searchCancelled = true;
     m_searchTimeout->stop();
@@ -123,11 +140,14 @@ void SearchHandler::cancelSearch()
 void SearchHandler::processFinished(const int exitcode)
 {
     m_searchTimeout->stop();
+    readSearchErrors();
 
     if (m_searchCancelled)
         emit searchFinished(true);
     else if ((m_searchProcess->exitStatus() == QProcess::NormalExit) && (exitcode == 0))
         emit searchFinished(false);
+    else if ((m_searchProcess->exitStatus() == QProcess::NormalExit) && (m_succeededEngineCount > 0))
+        emit searchFinished(false); // some engines failed or timed out but the others delivered their results
     else
         emit searchFailed();
 }
@@ -150,6 +170,12 @@ void SearchHandler::readSearchOutput()
 
     for (const QByteArray &line : asConst(lines))
     {
+        if (line.startsWith('{'))
+        {
+            parseSearchResults(line, searchResultList);
+            continue;
+        }
+
         SearchResult searchResult;
         if (parseSearchResult(QString::fromUtf8(line), searchResult))
             searchResultList << searchResult;
@@ -163,6 +189,29 @@ void SearchHandler::readSearchOutput()
     }
 }
 
+// search QProcess reports the completion of every engine on stderr,
+// along with any errors of the engines
+void SearchHandler::readSearchErrors()
+{
+    QByteArray output = m_searchProcess->readAllStandardError();
+    output.replace('\r', "");
+
+    QList<QByteArray> lines = output.split('\n');
+    if (!m_searchErrorLineTruncated.isEmpty())
+        lines.prepend(m_searchErrorLineTruncated + lines.takeFirst());
+    m_searchErrorLineTruncated = lines.takeLast();
+
+    for (const QByteArray &line : asConst(lines))
+    {
+        if (!line.startsWith(ENGINE_COMPLETION_RECORD_PREFIX))
+            continue;
+
+        const QJsonObject record = QJsonDocument::fromJson(line.sliced(ENGINE_COMPLETION_RECORD_PREFIX.size())).object();
+        if (record.value(u"status"_s).toString() == u"ok")
+            ++m_succeededEngineCount;
+    }
+}
+
 void SearchHandler::processFailed()
 {
     if (!m_searchCancelled)
@@ -211,6 +260,40 @@ bool SearchHandler::parseSearchResult(const QStringView line, SearchResult &sear
     return true;
 }
 
+// Parse one batch of search results in NDJSON format:
+// {"event": "results", "engine": "engine1", "results": [{"link": "...", "name": "...", "size": 1024, ...}, ...]}
+void SearchHandler::parseSearchResults(const QByteArray &line, QList<SearchResult> &searchResults) const
+{
+    const QJsonObject batch = QJsonDocument::fromJson(line).object();
+    if (batch.value(u"event"_s).toString() != u"results")
+        return;
+
+    const QString engineName = batch.value(u"engine"_s).toString();
+    const QJsonArray results = batch.value(u"results"_s).toArray();
+    searchResults.reserve(searchResults.size() + results.size());
+
+    for (const QJsonValue &value : results)
+    {
+        const QJsonObject result = value.toObject();
+
+        SearchResult searchResult;
+        searchResult.fileUrl = result.value(u"link"_s).toString().trimmed();
+        searchResult.fileName = result.value(u"name"_s).toString().trimmed();
+        searchResult.fileSize = result.value(u"size"_s).toInteger(-1);
+        searchResult.nbSeeders = std::max<qint64>(result.value(u"seeds"_s).toInteger(-1), -1);
+        searchResult.nbLeechers = std::max<qint64>(result.value(u"leech"_s).toInteger(-1), -1);
+        searchResult.siteUrl = result.value(u"engine_url"_s).toString().trimmed();
+        searchResult.engineName = engineName;
+        searchResult.descrLink = result.value(u"desc_link"_s).toString().trimmed();
+
+        const qint64 secs = result.value(u"pub_date"_s).toInteger(-1);
+        if (secs > 0)
+            searchResult.pubDate = QDateTime::fromSecsSinceEpoch(secs);
+
+        searchResults.append(searchResult);
+    }
+}
+
 SearchPluginManager *SearchHandler::manager() const
 {
     return m_manager;
@@ -79,9 +79,11 @@ signals:
 
 private:
     void readSearchOutput();
+    void readSearchErrors();
     void processFailed();
     void processFinished(int exitcode);
     bool parseSearchResult(QStringView line, SearchResult &searchResult);
+    void parseSearchResults(const QByteArray &line, QList<SearchResult> &searchResults) const;
 
     const QString m_pattern;
     const QString m_category;
@@ -90,6 +92,8 @@ private:
     QProcess *m_searchProcess = nullptr;
     QTimer *m_searchTimeout = nullptr;
     QByteArray m_searchResultLineTruncated;
+    QByteArray m_searchErrorLineTruncated;
+    int m_succeededEngineCount = 0;
     bool m_searchCancelled = false;
     QList<SearchResult> m_results;
 };
@@ -354,6 +354,11 @@ SearchDownloadHandler *SearchPluginManager::downloadTorrent(const QString &plugi
     return new SearchDownloadHandler(pluginName, url, this);
 }
 
+SearchDownloadHandler *SearchPluginManager::downloadTorrents(const QList<SearchDownload> &downloads)
+{
+    return new SearchDownloadHandler(downloads, this);
+}
+
 SearchHandler *SearchPluginManager::startSearch(const QString &pattern, const QString &category, const QStringList &usedPlugins)
 {
     // No search pattern entered
@@ -509,11 +514,19 @@ void SearchPluginManager::updateNova()
         Utils::Fs::copyFile(filePathBundled, filePathDisk);
     };
 
+    updateFile(Path(u"cancellation.py"_s), true);
+    updateFile(Path(u"dnscache.py"_s), true);
+    updateFile(Path(u"enginestats.py"_s), true);
     updateFile(Path(u"helpers.py"_s), true);
+    updateFile(Path(u"httpcache.py"_s), true);
+    updateFile(Path(u"httpclient.py"_s), true);
     updateFile(Path(u"nova2.py"_s), true);
     updateFile(Path(u"nova2dl.py"_s), true);
     updateFile(Path(u"novaprinter.py"_s), true);
+    updateFile(Path(u"resultfilter.py"_s), true);
+    updateFile(Path(u"resultmerger.py"_s), true);
     updateFile(Path(u"socks.py"_s), false);
+    updateFile(Path(u"tracing.py"_s), true);
 }
 
 void SearchPluginManager::update()
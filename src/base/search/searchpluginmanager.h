@@ -55,6 +55,13 @@ struct PluginInfo
     bool enabled = false;
 };
 
+// Torrent of a search result, downloaded by its plugin
+struct SearchDownload
+{
+    QString pluginName;
+    QString url;
+};
+
 class SearchDownloadHandler;
 class SearchHandler;
 
@@ -86,6 +93,7 @@ public:
 
     SearchHandler *startSearch(const QString &pattern, const QString &category, const QStringList &usedPlugins);
     SearchDownloadHandler *downloadTorrent(const QString &pluginName, const QString &url);
+    SearchDownloadHandler *downloadTorrents(const QList<SearchDownload> &downloads);
 
     static PluginVersion getPluginVersion(const Path &filePath);
     static QString categoryFullName(const QString &categoryName);
@@ -317,8 +317,24 @@ void SearchJobWidget::cancelSearch()
 void SearchJobWidget::downloadTorrents(const AddTorrentOption option)
 {
     const QModelIndexList rows = m_ui->resultsBrowser->selectionModel()->selectedRows();
+    if (rows.size() == 1)
+    {
+        downloadTorrent(rows.first(), option);
+        return;
+    }
+
+    // the torrents that are not magnet links are downloaded by a single nova2dl process
+    QList<SearchDownload> downloads;
     for (const QModelIndex &rowIndex : rows)
-        downloadTorrent(rowIndex, option);
+        prepareDownload(rowIndex, option, downloads);
+
+    if (downloads.isEmpty())
+        return;
+
+    SearchDownloadHandler *downloadHandler = SearchPluginManager::instance()->downloadTorrents(downloads);
+    connect(downloadHandler, &SearchDownloadHandler::downloadFinished
+        , this, [this, option](const QString &source) { addTorrentToSession(source, option); });
+    connect(downloadHandler, &SearchDownloadHandler::batchFinished, downloadHandler, &SearchDownloadHandler::deleteLater);
 }
 
 void SearchJobWidget::openTorrentPages()
@@ -413,6 +429,22 @@ void SearchJobWidget::setStatus(Status value)
 }
 
 void SearchJobWidget::downloadTorrent(const QModelIndex &rowIndex, const AddTorrentOption option)
+{
+    QList<SearchDownload> downloads;
+    prepareDownload(rowIndex, option, downloads);
+    if (downloads.isEmpty())
+        return;
+
+    const SearchDownload &download = downloads.first();
+    SearchDownloadHandler *downloadHandler = SearchPluginManager::instance()->downloadTorrent(download.pluginName, download.url);
+    connect(downloadHandler, &SearchDownloadHandler::downloadFinished
+        , this, [this, option](const QString &source) { addTorrentToSession(source, option); });
+    connect(downloadHandler, &SearchDownloadHandler::downloadFinished, downloadHandler, &SearchDownloadHandler::deleteLater);
+}
+
+// Add the torrent of a row to the session if it is a magnet link,
+// otherwise append it to the downloads of the plugins
+void SearchJobWidget::prepareDownload(const QModelIndex &rowIndex, const AddTorrentOption option, QList<SearchDownload> &downloads)
 {
     const QString torrentUrl = m_proxyModel->data(
                 m_proxyModel->index(rowIndex.row(), SearchSortModel::DL_LINK)).toString();
@@ -420,16 +452,9 @@ void SearchJobWidget::downloadTorrent(const QModelIndex &rowIndex, const AddTorr
                 m_proxyModel->index(rowIndex.row(), SearchSortModel::ENGINE_NAME)).toString();
 
     if (torrentUrl.startsWith(u"magnet:", Qt::CaseInsensitive))
-    {
         addTorrentToSession(torrentUrl, option);
-    }
     else
-    {
-        SearchDownloadHandler *downloadHandler = SearchPluginManager::instance()->downloadTorrent(engineName, torrentUrl);
-        connect(downloadHandler, &SearchDownloadHandler::downloadFinished
-            , this, [this, option](const QString &source) { addTorrentToSession(source, option); });
-        connect(downloadHandler, &SearchDownloadHandler::downloadFinished, downloadHandler, &SearchDownloadHandler::deleteLater);
-    }
+        downloads.append({.pluginName = engineName, .url = torrentUrl});
 
     setRowVisited(rowIndex.row());
 }
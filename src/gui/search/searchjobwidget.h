@@ -45,6 +45,7 @@ class QStandardItemModel;
 class LineEdit;
 class SearchHandler;
 class SearchSortModel;
+struct SearchDownload;
 struct SearchResult;
 
 template <typename T> class SettingValue;
@@ -117,6 +118,7 @@ private:
     void updateResultsCount();
     void setStatus(Status value);
     void downloadTorrent(const QModelIndex &rowIndex, AddTorrentOption option = AddTorrentOption::Default);
+    void prepareDownload(const QModelIndex &rowIndex, AddTorrentOption option, QList<SearchDownload> &downloads);
     void addTorrentToSession(const QString &source, AddTorrentOption option = AddTorrentOption::Default);
     void fillFilterComboBoxes();
     NameFilteringMode filteringMode() const;
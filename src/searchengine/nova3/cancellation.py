@@ -0,0 +1,117 @@
+#VERSION: 1.00
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+""" Cooperative cancellation of engine searches
+
+    nova2 sets a `CancellationToken` for every engine search it runs, see `currentToken`. Cancelling the token
+    runs the callbacks registered on it, which abort the sockets of the requests in progress so the engine wakes up
+    at once, then `helpers.retrieve_url()` and `novaprinter.prettyPrinter()` raise `SearchCancelled` in the engine.
+"""
+
+import itertools
+import threading
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import Optional
+
+
+class SearchCancelled(BaseException):
+    """ Raised inside an engine search when it is cancelled.
+        Not an `Exception` so it is not swallowed by the error handling of the engine.
+    """
+
+
+class CancellationToken:
+    def __init__(self) -> None:
+        # reentrant as `cancel()` may be called from a signal handler interrupting `register()`
+        self._lock = threading.RLock()
+        self._cancelled = False
+        self._callbacks: dict[int, Callable[[], None]] = {}
+        self._ids = itertools.count()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """ Mark the token as cancelled and run the registered callbacks, once """
+
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, {}
+
+        for callback in callbacks.values():
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled:
+            raise SearchCancelled()
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """ Call `callback` when the token is cancelled, right away if it already is
+
+            Return a function unregistering the callback.
+        """
+
+        with self._lock:
+            if not self._cancelled:
+                callbackId = next(self._ids)
+                self._callbacks[callbackId] = callback
+                return lambda: self._unregister(callbackId)
+
+        callback()
+        return _noop
+
+    def _unregister(self, callbackId: int) -> None:
+        with self._lock:
+            self._callbacks.pop(callbackId, None)
+
+
+def _noop() -> None:
+    pass
+
+
+# Set by nova2 for every engine search it runs, like `novaprinter.printContext`.
+# Threads started with `contextvars.copy_context().run()` or `asyncio.to_thread()` see the token of their search.
+currentToken: ContextVar[CancellationToken] = ContextVar('currentToken')
+
+
+def current() -> Optional[CancellationToken]:
+    return currentToken.get(None)
+
+
+def raise_if_cancelled() -> None:
+    """ Raise `SearchCancelled` when the search running in the current context is cancelled """
+
+    token = currentToken.get(None)
+    if token is not None:
+        token.raise_if_cancelled()
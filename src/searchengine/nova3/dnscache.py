@@ -0,0 +1,204 @@
+#VERSION: 1.04
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Cache of host name resolutions, shared by the processes of nova2 through a SQLite database
+
+    `getaddrinfo()` does not tell the TTL of the DNS records, so answers are kept for a fixed time,
+    and unknown hosts for a shorter one. Addresses are returned in the order of `getaddrinfo()`: for lookups of both
+    address families the system resolver queries the A and AAAA records in parallel and sorts the answers
+    (RFC 6724). Trying them in turn, or racing both families (RFC 8305), is left to the connecting side.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Union
+
+import tracing
+
+# the resolver functions of the socket module, before `DNSCache.install()` replaces them
+_getaddrinfo = socket.getaddrinfo
+_gethostbyname = socket.gethostbyname
+
+AddressInfo = tuple[socket.AddressFamily, socket.SocketKind, int, str, tuple[Any, ...]]
+
+# only the answers that the host does not exist are cached, temporary failures are retried by the next lookup
+NEGATIVE_ERRORS = frozenset(code for code in (socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', None)) if code is not None)
+# seconds a lookup waits for another process writing the database, it resolves without the database after that
+BUSY_TIMEOUT: float = 0.1
+
+
+class _Answer:
+    def __init__(self, addresses: list[AddressInfo], error: Optional[tuple[int, str]], expires_at: float) -> None:
+        self.addresses = addresses
+        self.error = error  # errno and message of the `socket.gaierror`
+        self.expires_at = expires_at
+
+
+def _is_ip_address(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except OSError:
+            continue
+    return False
+
+
+class DNSCache:
+    def __init__(self, path: str, ttl: float = 300, negative_ttl: float = 30) -> None:
+        """ @param path         Database file
+            @param ttl          Seconds addresses are reused
+            @param negative_ttl Seconds the answer that a host does not exist is reused
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # only guards `_answers`, the database is used without it by connections of every thread
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._answers: dict[str, _Answer] = {}  # in front of the database
+
+        # a connection must not be shared with a forked child process
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def install(self) -> None:
+        """ Make the socket module resolve host names through the cache """
+
+        socket.getaddrinfo = self.getaddrinfo  # type: ignore[assignment]
+        socket.gethostbyname = self.gethostbyname
+
+    def getaddrinfo(self, host: Union[bytes, str, None], port: Union[bytes, str, int, None], family: int = 0,
+                    type: int = 0, proto: int = 0, flags: int = 0) -> list[AddressInfo]:
+        """ Same as `socket.getaddrinfo()` """
+
+        if isinstance(host, bytes):
+            host = host.decode('idna')
+        if (host is None) or _is_ip_address(host) or (flags & socket.AI_NUMERICHOST):
+            return _getaddrinfo(host, port, family, type, proto, flags)
+
+        key = json.dumps([host.lower(), port if not isinstance(port, bytes) else port.decode(), family, type, proto, flags])
+        with tracing.span('getaddrinfo', 'dns', host=host) as span:
+            answer = self._get(key)
+            span.set(cached=(answer is not None))
+            if answer is None:
+                answer = self._resolve(host, port, family, type, proto, flags)
+                self._put(key, answer)
+
+        if answer.error is not None:
+            raise socket.gaierror(*answer.error)
+        return list(answer.addresses)
+
+    def gethostbyname(self, hostname: str) -> str:
+        """ Same as `socket.gethostbyname()` """
+
+        if _is_ip_address(hostname):
+            return _gethostbyname(hostname)
+        return self.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_STREAM)[0][4][0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._answers.clear()
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM addresses")
+        except sqlite3.Error:
+            pass
+
+    def _resolve(self, host: str, port: Union[bytes, str, int, None], family: int, type: int, proto: int,
+                 flags: int) -> _Answer:
+        now = time.time()
+        try:
+            addresses = _getaddrinfo(host, port, family, type, proto, flags)
+        except socket.gaierror as e:
+            if e.errno not in NEGATIVE_ERRORS:
+                raise
+            return _Answer([], (e.errno, e.strerror), now + self.negative_ttl)
+        return _Answer(addresses, None, now + self.ttl)
+
+    def _get(self, key: str) -> Optional[_Answer]:
+        now = time.time()
+        with self._lock:
+            answer = self._answers.get(key)
+        if (answer is not None) and (answer.expires_at > now):
+            return answer
+
+        try:
+            row = self._connect().execute("SELECT addresses, error_code, error_message, expires_at FROM addresses "
+                                          "WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+
+        addresses, error_code, error_message, expires_at = row
+        answer = _Answer([(socket.AddressFamily(f), socket.SocketKind(t), p, c, tuple(s))
+                          for f, t, p, c, s in json.loads(addresses)],
+                         ((error_code, error_message) if error_code is not None else None), expires_at)
+        with self._lock:
+            self._answers[key] = answer
+        return answer
+
+    def _put(self, key: str, answer: _Answer) -> None:
+        with self._lock:
+            self._answers[key] = answer
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO addresses (key, addresses, error_code, error_message, expires_at) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   (key, json.dumps([list(a) for a in answer.addresses]),
+                                    (answer.error[0] if answer.error is not None else None),
+                                    (answer.error[1] if answer.error is not None else None), answer.expires_at))
+                connection.execute("DELETE FROM addresses WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error:
+            pass
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread """
+
+        connection: Optional[sqlite3.Connection] = getattr(self._local, 'connection', None)
+        if connection is None:
+            # a lookup does not wait long for the other processes, it is faster to resolve the host again
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS addresses ("
+                                   "key TEXT PRIMARY KEY, addresses TEXT NOT NULL, error_code INTEGER, "
+                                   "error_message TEXT, expires_at REAL NOT NULL)")
+            self._local.connection = connection
+        return connection
+
+    def _forget(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
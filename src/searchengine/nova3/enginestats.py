@@ -0,0 +1,164 @@
+#VERSION: 1.00
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Health statistics of the engines, computed from their recent searches stored in a SQLite database
+
+    The statistics drive the order searches are started in: fast and reliable engines first, failing ones last.
+    An engine failing `CIRCUIT_BREAKER_FAILURES` times in a row has its circuit breaker open until
+    `CIRCUIT_BREAKER_COOLDOWN` seconds passed since its last search, nova2 may skip it meanwhile.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+# number of recent searches per engine the statistics are computed from
+WINDOW = 50
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN = 15 * 60
+
+
+class EngineStats(NamedTuple):
+    runs: int
+    success_rate: float
+    timeout_rate: float
+    p50_ms: int  # latencies of the successful searches, of all searches when none succeeded
+    p95_ms: int
+    mean_results: float  # of the successful searches
+    consecutive_failures: int
+    last_run: float  # Unix time
+    circuit_open: bool
+
+
+def _percentile(sorted_values: list[int], fraction: float) -> int:
+    # nearest-rank method
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def compute_stats(runs: list[tuple[str, int, int, float]], now: float) -> EngineStats:
+    """ @param runs Status, results count, elapsed milliseconds and finish time of the searches of an engine,
+                    oldest first
+    """
+
+    succeeded = [run for run in runs if run[0] == 'ok']
+    latencies = sorted(run[2] for run in (succeeded if len(succeeded) > 0 else runs))
+
+    consecutive_failures = 0
+    for run in reversed(runs):
+        if run[0] == 'ok':
+            break
+        consecutive_failures += 1
+
+    last_run = runs[-1][3]
+    circuit_open = ((consecutive_failures >= CIRCUIT_BREAKER_FAILURES)
+                    and ((now - last_run) < CIRCUIT_BREAKER_COOLDOWN))
+
+    return EngineStats(runs=len(runs),
+                       success_rate=(len(succeeded) / len(runs)),
+                       timeout_rate=(sum(1 for run in runs if run[0] == 'timeout') / len(runs)),
+                       p50_ms=_percentile(latencies, 0.5),
+                       p95_ms=_percentile(latencies, 0.95),
+                       mean_results=((sum(max(run[1], 0) for run in succeeded) / len(succeeded)) if len(succeeded) > 0 else 0.0),
+                       consecutive_failures=consecutive_failures,
+                       last_run=last_run,
+                       circuit_open=circuit_open)
+
+
+def schedule(engines: Iterable[str], stats: dict[str, EngineStats]) -> list[str]:
+    """ Order the engines by the expected time for a successful search, engines with an open circuit breaker last
+
+        Engines without statistics come first so they get measured.
+    """
+
+    def priority(engine: str) -> tuple[bool, float]:
+        engine_stats = stats.get(engine)
+        if engine_stats is None:
+            return (False, 0.0)
+        return (engine_stats.circuit_open, engine_stats.p50_ms / max(engine_stats.success_rate, 0.05))
+
+    return sorted(engines, key=priority)
+
+
+class StatsStore:
+    def __init__(self, path: str, window: int = WINDOW) -> None:
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        # a connection must not be shared with a forked child process
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def record(self, engine: str, status: str, results: int, elapsed_ms: int) -> None:
+        """ Store the outcome of a search, `status` is one of "ok", "error" and "timeout" """
+
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute("INSERT INTO runs (engine, status, results, elapsed_ms, finished_at) VALUES (?, ?, ?, ?, ?)",
+                                       (engine, status, results, elapsed_ms, time.time()))
+                    connection.execute("DELETE FROM runs WHERE engine = ? AND id NOT IN ("
+                                       "SELECT id FROM runs WHERE engine = ? ORDER BY id DESC LIMIT ?)",
+                                       (engine, engine, self.window))
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict[str, EngineStats]:
+        with self._lock:
+            try:
+                rows = self._connect().execute("SELECT engine, status, results, elapsed_ms, finished_at FROM runs ORDER BY id").fetchall()
+            except sqlite3.Error:
+                return {}
+
+        runs: dict[str, list[tuple[str, int, int, float]]] = {}
+        for engine, *run in rows:
+            runs.setdefault(engine, []).append(tuple(run))  # type: ignore[arg-type]
+
+        now = time.time()
+        return {engine: compute_stats(engine_runs, now) for engine, engine_runs in runs.items()}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # wait for the other processes instead of failing while they write
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS runs ("
+                                   "id INTEGER PRIMARY KEY AUTOINCREMENT, engine TEXT NOT NULL, status TEXT NOT NULL, "
+                                   "results INTEGER NOT NULL, elapsed_ms INTEGER NOT NULL, finished_at REAL NOT NULL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS runs_engine ON runs (engine, id)")
+            self._connection = connection
+        return self._connection
+
+    def _forget(self) -> None:
+        self._lock = threading.Lock()
+        self._connection = None
@@ -1,4 +1,4 @@
-#VERSION: 1.51
+#VERSION: 1.67
 
 # Author:
 #  Christophe DUMEZ (chris@qbittorrent.org)
@@ -27,21 +27,39 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import cancellation
+import codecs
+import contextvars
 import datetime
-import gzip
 import html
 import io
 import os
 import re
 import socket
-import socks
-import ssl
 import sys
-import tempfile
-import urllib.error
-import urllib.request
-from collections.abc import Mapping
-from typing import Any, Optional
+import threading
+import time
+import tracing
+import urllib.parse
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Any, Optional
+
+# ssl, urllib.request and the modules using them are imported by the first request, see `_setupNetwork()`
+if TYPE_CHECKING:
+    import ssl
+    import urllib.request
+    from concurrent.futures import Future
+
+    import dnscache
+    import httpcache
+
+try:
+    import brotli  # optional, decodes "br" encoded responses in `retrieve_url_chunks()`
+except ImportError:
+    brotli = None
 
 
 def getBrowserUserAgent() -> str:
@@ -62,72 +80,504 @@ def getBrowserUserAgent() -> str:
 
 headers: dict[str, Any] = {'User-Agent': getBrowserUserAgent()}
 
-# SOCKS5 Proxy support
-if "sock_proxy" in os.environ and len(os.environ["sock_proxy"].strip()) > 0:
-    proxy_str = os.environ["sock_proxy"].strip()
-    m = re.match(r"^(?:(?P<username>[^:]+):(?P<password>[^@]+)@)?(?P<host>[^:]+):(?P<port>\w+)$",
-                 proxy_str)
-    if m is not None:
-        socks.setdefaultproxy(socks.PROXY_TYPE_SOCKS5, m.group('host'),
-                              int(m.group('port')), True, m.group('username'), m.group('password'))
-        socket.socket = socks.socksocket  # type: ignore[misc]
+# Opt-in cache of host name resolutions shared by the processes of a search, enabled by setting `nova_dns_ttl`
+# to the seconds addresses are reused. It replaces the resolver functions of the socket module.
+dnsCache: Optional['dnscache.DNSCache'] = None
+_networkReady = False
+_networkLock = threading.Lock()
+
+
+def _setupNetwork() -> None:
+    """ Install the SOCKS5 proxy of `sock_proxy` and the DNS cache of `nova_dns_ttl`, once per process
+
+        Called by the helpers before their first request rather than at import, so the workers of a search
+        do not open the DNS cache before an engine needs it. Connections opened by an engine without the helpers
+        go through the proxy once the helpers made a request.
+    """
+
+    global dnsCache, _networkReady
+    if _networkReady:
+        return
+    with _networkLock:
+        if _networkReady:
+            return
+
+        # SOCKS5 Proxy support
+        proxyStr = os.environ.get("sock_proxy", "").strip()
+        if len(proxyStr) > 0:
+            m = re.match(r"^(?:(?P<username>[^:]+):(?P<password>[^@]+)@)?(?P<host>[^:]+):(?P<port>\w+)$", proxyStr)
+            if m is not None:
+                import socks
+                socks.setdefaultproxy(socks.PROXY_TYPE_SOCKS5, m.group('host'),
+                                      int(m.group('port')), True, m.group('username'), m.group('password'))
+                socket.socket = socks.socksocket  # type: ignore[misc]
+
+        try:
+            dnsTTL = float(os.environ.get("nova_dns_ttl", "").strip() or 0)
+        except ValueError:
+            print("Invalid nova_dns_ttl, DNS cache disabled", file=sys.stderr)
+            dnsTTL = 0
+        if dnsTTL > 0:
+            import dnscache
+            dnsCache = dnscache.DNSCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dns_cache.sqlite'),
+                                         dnsTTL, min(30, dnsTTL))
+            dnsCache.install()
+
+        _networkReady = True
 
 
 # This is only provided for backward compatibility, new code should not use it
 htmlentitydecode = html.unescape
 
+# Maximum number of concurrent requests to the same host.
+# Only matters when engines run in threads of the same process, e.g. `nova2.py --executor=async`
+MAX_CONNECTIONS_PER_HOST: int = 4
+_hostSemaphores: dict[str, threading.BoundedSemaphore] = {}
+_hostSemaphoresLock = threading.Lock()
+
+
+def _hostSemaphore(url: str) -> threading.BoundedSemaphore:
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    with _hostSemaphoresLock:
+        semaphore = _hostSemaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+            _hostSemaphores[host] = semaphore
+        return semaphore
+
+
+# Opt-in cache of the pages fetched by `retrieve_url()`, see `enable_response_cache()`
+responseCache: Optional['httpcache.ResponseCache'] = None
+
+
+def enable_response_cache(ttl: float = 600, max_size: int = 64 * 1024 * 1024, path: Optional[str] = None) -> None:
+    """ Cache the pages fetched by `retrieve_url()` on disk
+
+        @param ttl      Seconds a page is served from the cache before it is revalidated with the server
+        @param max_size Size cap of the cache in bytes, least recently used pages are evicted first
+        @param path     Database file, by default in the engines location
+
+        The cache can also be enabled for all engines of a search with the `nova_cache_ttl` and
+        `nova_cache_size` environment variables.
+    """
+
+    import httpcache
+
+    global responseCache
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'response_cache.sqlite')
+    responseCache = httpcache.ResponseCache(path, ttl, max_size)
+
+
+if len(os.environ.get("nova_cache_ttl", "").strip()) > 0:
+    try:
+        enable_response_cache(float(os.environ["nova_cache_ttl"]),
+                              int(os.environ.get("nova_cache_size", "").strip() or 64 * 1024 * 1024))
+    except ValueError:
+        print("Invalid nova_cache_ttl or nova_cache_size, response cache disabled", file=sys.stderr)
+
+
+def _fetch(request: 'urllib.request.Request', ssl_context: Optional['ssl.SSLContext']) -> tuple[bytes, str]:
+    """ Return the response body and content type, going through `responseCache` when enabled """
+
+    import httpclient
+
+    cache = responseCache
+    if cache is None:
+        response = httpclient.urlopen(request, context=ssl_context)
+        with tracing.span('download', 'download'):
+            return response.read(), response.getheader('Content-Type', '')
 
-def retrieve_url(url: str, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional[ssl.SSLContext] = None, unescape_html_entities: bool = True) -> str:
+    key = cache.key(request.get_method(), request.full_url, request.data, dict(request.header_items()))
+    cached = cache.get(key)
+    if cached is not None:
+        if cached.fresh:
+            return cached.body, cached.content_type
+        if cached.etag is not None:
+            request.add_header('If-None-Match', cached.etag)
+        if cached.last_modified is not None:
+            request.add_header('If-Modified-Since', cached.last_modified)
+
+    response = httpclient.urlopen(request, context=ssl_context)
+    with tracing.span('download', 'download'):
+        data = response.read()
+    if (response.status == 304) and (cached is not None):
+        cache.refresh(key, response.headers)
+        return cached.body, cached.content_type
+    if response.status == 200:
+        cache.put(key, request.full_url, data, response.headers)
+    return data, response.getheader('Content-Type', '')
+
+
+def retrieve_url(url: str, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional['ssl.SSLContext'] = None, unescape_html_entities: bool = True) -> str:
     """ Return the content of the url page as a string """
 
+    import urllib.error
+    import urllib.request
+
+    _setupNetwork()
     request = urllib.request.Request(url, request_data, {**headers, **custom_headers})
+    with tracing.span('retrieve_url', 'fetch', url=url):
+        with _hostSemaphore(url):
+            try:
+                data, contentType = _fetch(request, ssl_context)
+            except urllib.error.URLError as errno:
+                print(f"Connection error: {errno.reason}", file=sys.stderr)
+                return ""
+        # a body without length ends early when its socket is shut down on cancellation
+        cancellation.raise_if_cancelled()
+
+        # Check if it is gzipped
+        if data[:2] == b'\x1f\x8b':
+            # Data is gzip encoded, decode it
+            with tracing.span('gunzip', 'decompress'):
+                import gzip
+                with io.BytesIO(data) as compressedStream, gzip.GzipFile(fileobj=compressedStream) as gzipper:
+                    data = gzipper.read()
+
+        with tracing.span('decode', 'decode'):
+            dataStr = data.decode(_charset(contentType), 'replace')
+
+            if unescape_html_entities:
+                dataStr = html.unescape(dataStr)
+
+    return dataStr
+
+
+def retrieve_urls(urls: Iterable[str], max_parallel: int = MAX_CONNECTIONS_PER_HOST, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional['ssl.SSLContext'] = None, unescape_html_entities: bool = True) -> Iterator[str]:
+    """ Yield the content of the url pages in order, like `retrieve_url()` does for each of them
+
+        Up to `max_parallel` pages are fetched ahead of the one being processed. `urls` is consumed lazily
+        and stopping the iteration cancels the pages not fetched yet, e.g. to stop at the first page
+        without results:
+
+            for page in retrieve_urls(f"{self.url}/search/{what}/{n}" for n in range(1, 11)):
+                if parser.feed_page(page) == 0:
+                    break
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    urlIterator = iter(urls)
+    executor = ThreadPoolExecutor(max_workers=max(max_parallel, 1), thread_name_prefix='retrieve_urls')
+    pending: 'deque[Future[str]]' = deque()
+
+    def prefetch() -> None:
+        url = next(urlIterator, None)
+        if url is not None:
+            # in the context of the caller, so the pages of a cancelled search are aborted as well
+            pending.append(executor.submit(contextvars.copy_context().run, retrieve_url, url, custom_headers,
+                                           request_data, ssl_context, unescape_html_entities))
+
     try:
-        response = urllib.request.urlopen(request, context=ssl_context)
-    except urllib.error.URLError as errno:
-        print(f"Connection error: {errno.reason}", file=sys.stderr)
-        return ""
-    data: bytes = response.read()
-
-    # Check if it is gzipped
-    if data[:2] == b'\x1f\x8b':
-        # Data is gzip encoded, decode it
-        with io.BytesIO(data) as compressedStream, gzip.GzipFile(fileobj=compressedStream) as gzipper:
-            data = gzipper.read()
-
-    charset = 'utf-8'
+        for _ in range(max(max_parallel, 1)):
+            prefetch()
+        while len(pending) > 0:
+            page = pending.popleft().result()
+            prefetch()
+            yield page
+    finally:
+        # pages being fetched complete in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _charset(contentType: str) -> str:
     try:
-        charset = response.getheader('Content-Type', '').split('charset=', 1)[1]
+        return contentType.split('charset=', 1)[1]
     except IndexError:
-        pass
+        return 'utf-8'
 
-    dataStr = data.decode(charset, 'replace')
 
-    if unescape_html_entities:
-        dataStr = html.unescape(dataStr)
+# Size of the reads of `retrieve_url_chunks()`
+STREAM_CHUNK_SIZE: int = 64 * 1024
 
-    return dataStr
 
+def _identity(data: bytes) -> bytes:
+    return data
+
+
+class _Decompressor:
+    """ Incremental decoder of a response body according to its Content-Encoding
+
+        Like `retrieve_url()` does, bodies without Content-Encoding are still gunzipped when they start with
+        the gzip magic number.
+    """
+
+    def __init__(self, contentEncoding: str) -> None:
+        self._encoding = contentEncoding.strip().lower()
+        self._decode: Optional[Callable[[bytes], bytes]] = None
+        self._flush: Callable[[], bytes] = bytes
+        self._decompressor: Optional[Any] = None  # of zlib, whose output can be bounded
+        self._head = b''  # the first bytes until the decoder is chosen
+
+    def decompress(self, data: bytes, maxLength: int = 0) -> bytes:
+        """ Return the decoded data, at most `maxLength` bytes of gzip or deflate output when it is not 0
+
+            The input left over is decoded by `decompressChunks()`. Brotli output is not bounded,
+            "br" is only requested by `retrieve_url_chunks()`.
+        """
 
-def download_file(url: str, referer: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None) -> str:
-    """ Download file at url and write it to a file, return the path to the file and the url """
+        if self._decode is None:
+            self._head += data
+            if len(self._head) < 2:
+                return b''
+            data, self._head = self._head, b''
+            self._select(data)
+        if self._decompressor is not None:
+            return self._decompressor.decompress(data, maxLength)
+        return self._decode(data)  # type: ignore[misc]
+
+    def decompressChunks(self, data: bytes, chunkSize: int) -> Iterator[bytes]:
+        """ Yield the decoded data in pieces of at most `chunkSize` bytes, so a small input never inflates at once """
+
+        yield self.decompress(data, chunkSize)
+        while (self._decompressor is not None) and (len(self._decompressor.unconsumed_tail) > 0):
+            yield self._decompressor.decompress(self._decompressor.unconsumed_tail, chunkSize)
+
+    def flush(self) -> bytes:
+        if self._decode is None:
+            data, self._head = self._head, b''
+            self._select(data)
+            return self._decode(data) + self._flush()  # type: ignore[misc]
+        return self._flush()
+
+    def _select(self, head: bytes) -> None:
+        if (self._encoding in ('gzip', 'x-gzip')) or ((self._encoding in ('', 'identity')) and head.startswith(b'\x1f\x8b')):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self._encoding == 'deflate':
+            # servers send either zlib wrapped or raw deflate data
+            zlibWrapped = (len(head) >= 2) and ((head[0] & 0x0F) == 8) and ((((head[0] << 8) | head[1]) % 31) == 0)
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS if zlibWrapped else -zlib.MAX_WBITS)
+        elif (self._encoding == 'br') and (brotli is not None):
+            self._decode = brotli.Decompressor().process
+            return
+        else:
+            self._decode = _identity
+            return
+
+        self._decode = decompressor.decompress
+        self._flush = decompressor.flush
+        self._decompressor = decompressor
+
+
+def retrieve_url_chunks(url: str, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional['ssl.SSLContext'] = None, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """ Yield the content of the url page as strings while it is downloaded
+
+        The body is decompressed and decoded incrementally so the whole page is never held in memory.
+        Unlike `retrieve_url()` the response cache is not used and HTML entities are left as is,
+        see `IncrementalHTMLParser` which unescapes them.
+    """
+
+    import http.client
+    import httpclient
+    import urllib.error
+    import urllib.request
+
+    _setupNetwork()
+    acceptEncoding = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+    request = urllib.request.Request(url, request_data, {**headers, 'Accept-Encoding': acceptEncoding, **custom_headers})
+    with _hostSemaphore(url):
+        try:
+            response = httpclient.urlopen(request, context=ssl_context)
+        except urllib.error.URLError as errno:
+            print(f"Connection error: {errno.reason}", file=sys.stderr)
+            return
+
+        with response:
+            decompressor = _Decompressor(response.getheader('Content-Encoding', ''))
+            try:
+                decoder = codecs.getincrementaldecoder(_charset(response.getheader('Content-Type', '')))('replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            read = getattr(response, 'read1', response.read)
+
+            while True:
+                try:
+                    data = read(chunk_size)
+                except (OSError, http.client.HTTPException) as e:
+                    print(f"Connection error: {e}", file=sys.stderr)
+                    return
+                if len(data) == 0:
+                    cancellation.raise_if_cancelled()
+                    break
+
+                dataStr = decoder.decode(decompressor.decompress(data))
+                if len(dataStr) > 0:
+                    yield dataStr
+
+            dataStr = decoder.decode(decompressor.flush(), True)
+            if len(dataStr) > 0:
+                yield dataStr
+
+
+class IncrementalHTMLParser(HTMLParser):
+    """ HTML parser fed with pages while they download, so results are printed before the pages are complete
+
+        Subclasses implement the `handle_*()` methods of `HTMLParser` and call `parse_url(url)` where they
+        would call `feed(retrieve_url(url))`. Character references are converted by the parser.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+
+    def parse_url(self, url: str, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional['ssl.SSLContext'] = None) -> None:
+        """ Feed the parser with the content of the url page, chunk by chunk """
+
+        for dataStr in retrieve_url_chunks(url, custom_headers, request_data, ssl_context):
+            self.feed(dataStr)
+
+
+async def retrieve_url_async(url: str, custom_headers: Mapping[str, Any] = {}, request_data: Optional[Any] = None, ssl_context: Optional['ssl.SSLContext'] = None, unescape_html_entities: bool = True) -> str:
+    """ Same as `retrieve_url()`, for engines implementing `search_async()`
+
+        The request runs in a worker thread of the event loop, at most `MAX_CONNECTIONS_PER_HOST` at a time per host
+    """
+
+    import asyncio
+
+    return await asyncio.to_thread(retrieve_url, url, custom_headers, request_data, ssl_context, unescape_html_entities)
+
+
+# Limits of `download_file()`
+DOWNLOAD_MAX_SIZE: int = 100 * 1024 * 1024
+DOWNLOAD_TIMEOUT: float = 120
+# bytes read at once, and most bytes decompressed at once so the memory used by a compressed chunk is bounded
+DOWNLOAD_CHUNK_SIZE: int = 16 * 1024
+
+# When set, `download_file()` looks for the torrent in the HTML pages it gets instead of a torrent file,
+# i.e. description pages, and keeps those pages in `responseCache` when it is enabled
+resolveDescPages: bool = False
+# Default of the `expect_torrent` argument of `download_file()`, set by nova2dl so the downloads of the engines
+# implementing `download_torrent()` are checked as well
+expectTorrents: bool = False
+
+# info-hash of BitTorrent v1 in hex or base32, or v2 multihash in hex
+_infoHashRegex = re.compile(r'[0-9a-f]{40}|[a-z2-7]{32}|1220[0-9a-f]{64}', re.IGNORECASE)
+_magnetLinkRegex = re.compile(r'magnet:\?[^\s"\'<>]*?xt=urn:bt(?:ih|mh):[^\s"\'<>]+', re.IGNORECASE)
+_torrentLinkRegex = re.compile(r'href\s*=\s*["\']([^"\'<>]+?\.torrent(?:\?[^"\'<>]*)?)["\']', re.IGNORECASE)
+
+
+def magnet_link(download_param: str) -> Optional[str]:
+    """ Return the magnet link of a download parameter that is a magnet link or a bare info-hash, None otherwise """
+
+    param = download_param.strip()
+    if param[:7].lower() == 'magnet:':
+        return param
+    if _infoHashRegex.fullmatch(param) is not None:
+        return f"magnet:?xt=urn:{'btmh' if (len(param) == 68) else 'btih'}:{param}"
+    return None
+
+
+def find_magnet_link(page: str) -> Optional[str]:
+    """ Return the first magnet link found in the HTML page, None if there is none """
+
+    match = _magnetLinkRegex.search(page)
+    return html.unescape(match.group(0)) if (match is not None) else None
+
+
+def download_file(url: str, referer: Optional[str] = None, ssl_context: Optional['ssl.SSLContext'] = None, max_size: int = DOWNLOAD_MAX_SIZE, timeout: Optional[float] = DOWNLOAD_TIMEOUT, expect_torrent: Optional[bool] = None) -> str:
+    """ Download file at url and write it to a file, return the path to the file and the url
+
+        The response is decompressed and written chunk by chunk. With `expect_torrent`, `expectTorrents` by default,
+        the download stops at the first chunk when it is not a bencoded dictionary, e.g. an error or login page.
+        Raise `ValueError` when the file is not a torrent file that way, is larger than `max_size` bytes, or when
+        a description page links to no torrent, and `TimeoutError` when it is not downloaded within `timeout` seconds.
+        The file is removed when the download fails or is cancelled.
+        A magnet link or info-hash is returned as is, in place of the path, without any request. So is the magnet
+        link of a description page when `resolveDescPages` is set, otherwise the torrent file it links to is downloaded.
+    """
+
+    magnet = magnet_link(url)
+    if magnet is not None:
+        return f"{magnet} {url}"
+    _setupNetwork()
+    expectTorrent = expectTorrents if (expect_torrent is None) else expect_torrent
+    return _download_file(url, referer, ssl_context, max_size, timeout, resolveDescPages, expectTorrent)
+
+
+def _download_file(url: str, referer: Optional[str], ssl_context: Optional['ssl.SSLContext'], max_size: int, timeout: Optional[float], resolve: bool, expectTorrent: bool) -> str:
+    import httpclient
+    import urllib.request
 
     # Download url
     request = urllib.request.Request(url, headers=headers)
     if referer is not None:
         request.add_header('referer', referer)
-    response = urllib.request.urlopen(request, context=ssl_context)
-    data = response.read()
 
-    # Check if it is gzipped
-    if data[:2] == b'\x1f\x8b':
-        # Data is gzip encoded, decode it
-        with io.BytesIO(data) as compressedStream, gzip.GzipFile(fileobj=compressedStream) as gzipper:
-            data = gzipper.read()
+    cache = responseCache if resolve else None
+    if cache is not None:
+        cacheKey = cache.key(request.get_method(), request.full_url, request.data, dict(request.header_items()))
+        cached = cache.get(cacheKey)
+        if (cached is not None) and cached.fresh:
+            return _resolve_desc_page(url, cached.body, cached.content_type, ssl_context, max_size, timeout)
+
+    deadline = (time.monotonic() + timeout) if timeout is not None else None
+    response = httpclient.urlopen(request, context=ssl_context, timeout=timeout)
+
+    contentEncoding = response.getheader('Content-Encoding', '')
+    contentLength = response.getheader('Content-Length', '')
+    contentType = response.getheader('Content-Type', '')
+    if (contentEncoding in ('', 'identity')) and contentLength.isdigit() and (int(contentLength) > max_size):
+        response.close()
+        raise ValueError(f"{url} is larger than {max_size} bytes")
 
     # Write it to a file
+    import tempfile
+
     fileHandle, path = tempfile.mkstemp()
-    with os.fdopen(fileHandle, "wb") as file:
-        file.write(data)
+    page: Optional[bytearray] = None
+    try:
+        with response, os.fdopen(fileHandle, "wb") as file:
+            decompressor = _Decompressor(contentEncoding)
+            buffer = memoryview(bytearray(DOWNLOAD_CHUNK_SIZE))
+            size = 0
+            while True:
+                count = response.readinto(buffer)
+                chunks = decompressor.decompressChunks(buffer[:count], DOWNLOAD_CHUNK_SIZE) if count > 0 else (decompressor.flush(),)
+
+                for data in chunks:
+                    if (size == 0) and (data[:1] not in (b'', b'd')):
+                        if resolve and ('html' in contentType.lower()):
+                            # a description page rather than a bencoded dictionary, kept in memory to look for the torrent
+                            page = bytearray()
+                        elif expectTorrent:
+                            raise ValueError(f"{url} is not a torrent file")
+                    size += len(data)
+                    if size > max_size:
+                        raise ValueError(f"{url} is larger than {max_size} bytes")
+                    if page is not None:
+                        page += data
+                    else:
+                        file.write(data)
+
+                cancellation.raise_if_cancelled()
+                if count == 0:
+                    break
+                if (deadline is not None) and (time.monotonic() > deadline):
+                    raise TimeoutError(f"Download of {url} timed out")
+    except BaseException:
+        os.remove(path)
+        raise
+
+    if page is not None:
+        os.remove(path)
+        if (cache is not None) and (response.status == 200):
+            cache.put(cacheKey, url, bytes(page), response.headers)
+        return _resolve_desc_page(url, bytes(page), contentType, ssl_context, max_size, timeout)
 
     # return file path
     return f"{path} {url}"
+
+
+def _resolve_desc_page(url: str, page: bytes, contentType: str, ssl_context: Optional['ssl.SSLContext'], max_size: int, timeout: Optional[float]) -> str:
+    """ Return the magnet link of the description page, or download the torrent file it links to """
+
+    pageStr = page.decode(_charset(contentType), 'replace')
+    magnet = find_magnet_link(pageStr)
+    if magnet is not None:
+        return f"{magnet} {url}"
+
+    match = _torrentLinkRegex.search(pageStr)
+    if match is None:
+        raise ValueError(f"{url} is not a torrent file")
+    return _download_file(urllib.parse.urljoin(url, html.unescape(match.group(1))), url, ssl_context, max_size, timeout, False, True)
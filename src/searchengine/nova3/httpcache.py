@@ -0,0 +1,208 @@
+#VERSION: 1.01
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" On-disk cache of HTTP responses, stored in a SQLite database
+
+    Entries are fresh for the configured TTL, or less when the response says so with Cache-Control or Expires.
+    Stale entries having an ETag or Last-Modified header are revalidated with a conditional request, a
+    "304 Not Modified" response without freshness headers renews them for the lifetime of the stored response.
+    The database is shared by the processes of nova2 and is kept below a size cap by evicting the least recently
+    used entries.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from email.message import Message
+from email.utils import mktime_tz, parsedate_tz
+from typing import Any, NamedTuple, Optional
+
+# request headers that do not change the response, left out of the cache key
+_IGNORED_HEADERS = frozenset(('user-agent', 'referer', 'if-none-match', 'if-modified-since'))
+
+_maxAgeRegex = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl: float, max_size: int) -> None:
+        """ @param path     Database file
+            @param ttl      Seconds a response is served without contacting the server
+            @param max_size Cap on the total size in bytes of the cached bodies
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        # a connection must not be shared with a forked child process
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    @staticmethod
+    def key(method: str, url: str, data: Optional[Any], headers: Mapping[str, str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{method.upper()} {url}\n".encode())
+        for name, value in sorted((k.lower(), str(v)) for k, v in headers.items()):
+            if name not in _IGNORED_HEADERS:
+                digest.update(f"{name}: {value}\n".encode())
+        if data is not None:
+            digest.update(b"\n")
+            digest.update(data if isinstance(data, bytes) else str(data).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute("SELECT body, content_type, etag, last_modified, expires_at FROM responses WHERE key = ?",
+                                         (key,)).fetchone()
+                if row is None:
+                    return None
+                with connection:
+                    connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                return None
+
+        body, content_type, etag, last_modified, expires_at = row
+        return CachedResponse(body, content_type, etag, last_modified, now < expires_at)
+
+    def put(self, key: str, url: str, body: bytes, headers: Message) -> None:
+        """ Store the response unless its headers forbid it """
+
+        cache_control = headers.get('Cache-Control', '').lower()
+        if ('no-store' in cache_control) or (len(body) > self.max_size):
+            return
+
+        now = time.time()
+        lifetime = self._lifetime(headers, now)
+        expires_at = now + (lifetime if (lifetime is not None) else self.ttl)
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute("INSERT OR REPLACE INTO responses "
+                                       "(key, url, body, content_type, etag, last_modified, expires_at, last_access, size, "
+                                       "lifetime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       (key, url, body, headers.get('Content-Type', ''), headers.get('ETag'),
+                                        headers.get('Last-Modified'), expires_at, now, len(body), lifetime))
+                    # evict the least recently used entries exceeding the size cap
+                    connection.execute("DELETE FROM responses WHERE key IN ("
+                                       "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS total "
+                                       "FROM responses) WHERE total > ?)", (self.max_size,))
+            except sqlite3.Error:
+                pass
+
+    def refresh(self, key: str, headers: Message) -> None:
+        """ Renew the freshness of an entry the server confirmed with a "304 Not Modified" response
+
+            The headers of the 304 response update those of the stored one (RFC 9111 section 4.3.4), so without
+            freshness headers of its own the entry is renewed for the lifetime of the stored response.
+        """
+
+        now = time.time()
+        lifetime = self._lifetime(headers, now)
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute("UPDATE responses SET expires_at = ? + COALESCE(?, lifetime, ?), last_access = ?, "
+                                       "lifetime = COALESCE(?, lifetime), etag = COALESCE(?, etag), "
+                                       "last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                                       (now, lifetime, self.ttl, now, lifetime, headers.get('ETag'),
+                                        headers.get('Last-Modified'), key))
+            except sqlite3.Error:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute("DELETE FROM responses")
+            except sqlite3.Error:
+                pass
+
+    def _lifetime(self, headers: Message, now: float) -> Optional[float]:
+        """ Return the seconds the response is fresh for according to its headers, at most the TTL,
+            None when they do not say
+        """
+
+        cache_control = headers.get('Cache-Control', '').lower()
+        if 'no-cache' in cache_control:
+            return 0
+        match = _maxAgeRegex.search(cache_control)
+        if match is not None:
+            return min(float(match.group(1)), self.ttl)
+
+        expires = headers.get('Expires')
+        if expires is None:
+            return None
+        expires_date = parsedate_tz(expires)
+        if expires_date is None:
+            return 0  # an invalid date, e.g. "0", means already expired
+        # relative to the date of the server in case its clock differs
+        date = parsedate_tz(headers.get('Date', ''))
+        lifetime = mktime_tz(expires_date) - (mktime_tz(date) if (date is not None) else now)
+        return min(max(lifetime, 0), self.ttl)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # wait for the other processes instead of failing while they write
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                   "key TEXT PRIMARY KEY, url TEXT NOT NULL, body BLOB NOT NULL, "
+                                   "content_type TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                                   "expires_at REAL NOT NULL, last_access REAL NOT NULL, size INTEGER NOT NULL, "
+                                   "lifetime REAL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(responses)")]
+                if 'lifetime' not in columns:
+                    # database of a previous version, its entries fall back to the TTL
+                    connection.execute("ALTER TABLE responses ADD COLUMN lifetime REAL")
+            self._connection = connection
+        return self._connection
+
+    def _forget(self) -> None:
+        self._lock = threading.Lock()
+        self._connection = None
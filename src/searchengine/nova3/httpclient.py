@@ -0,0 +1,457 @@
+#VERSION: 1.04
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" HTTP/1.1 client keeping connections alive between requests
+
+    Connections are pooled per scheme, host, port, proxy and SSL context, so consecutive requests to the same
+    site skip the TCP, proxy and TLS handshakes. TLS sessions are cached per host to resume the handshake of new
+    connections. The pool is per process.
+
+    Requests made for a search that gets cancelled, see `cancellation`, have their socket shut down and raise
+    `cancellation.SearchCancelled`.
+"""
+
+import base64
+import http.client
+import io
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections.abc import Callable, Mapping
+from email.message import Message
+from functools import partial
+from typing import Any, NamedTuple, Optional, Union
+
+import cancellation
+import tracing
+
+# idle connections kept per pool key
+MAX_IDLE_CONNECTIONS: int = 4
+# seconds an idle connection is kept before it is discarded, servers usually close them soon after
+IDLE_TIMEOUT: float = 30.0
+MAX_REDIRECTIONS: int = 10
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+# methods sent again on a new connection when a reused one turns out to be closed
+_RETRIED_METHODS = ('GET', 'HEAD')
+
+
+class _PoolKey(NamedTuple):
+    scheme: str
+    host: str
+    port: int
+    proxy: str  # proxy url, empty for direct connections
+    # SSL context, None for plain HTTP. The key references it, an `id()` could be reused by another context
+    context: Optional[ssl.SSLContext]
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """ HTTPS connection resuming the TLS session of a previous connection to the same host """
+
+    def __init__(self, *args: Any, session: Optional[ssl.SSLSession] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._session = session
+
+    def connect(self) -> None:
+        with tracing.span('connect', 'connect', host=self.host, port=self.port):
+            http.client.HTTPConnection.connect(self)
+
+        server_hostname = self._tunnel_host if self._tunnel_host else self.host
+        with tracing.span('tls_handshake', 'tls', host=server_hostname) as span:
+            try:
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname, session=self._session)  # type: ignore[attr-defined]
+            except ssl.SSLError:
+                if self._session is None:
+                    raise
+                # the server may refuse to resume, retry with a full handshake
+                self._session = None
+                self.sock.close()
+                http.client.HTTPConnection.connect(self)
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)  # type: ignore[attr-defined]
+            span.set(resumed=self.sock.session_reused)
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    def connect(self) -> None:
+        with tracing.span('connect', 'connect', host=self.host, port=self.port):
+            super().connect()
+
+
+HTTPConnection = Union[_HTTPConnection, _HTTPSConnection]
+
+
+class PooledResponse(io.RawIOBase):
+    """ Response returning its connection to the pool once the body is fully read or the response is closed
+
+        Mimics the responses of `urllib.request.urlopen()`
+    """
+
+    def __init__(self, pool: 'ConnectionPool', key: _PoolKey, connection: HTTPConnection, response: http.client.HTTPResponse, url: str,
+                 unregister: Optional[Callable[[], None]] = None) -> None:
+        super().__init__()
+        self._pool = pool
+        self._key = key
+        self._connection: Optional[HTTPConnection] = connection
+        self._response = response
+        self._unregister = unregister  # stops aborting the connection on cancellation
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers: Message = response.headers
+        self.code = self.status
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, amt: Optional[int] = -1) -> bytes:
+        try:
+            if (amt is None) or (amt < 0):
+                data = self._response.read()
+            else:
+                data = self._response.read(amt)
+        except (OSError, http.client.HTTPException) as e:
+            _raise_if_cancelled(e)
+            raise
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def read1(self, amt: int = -1) -> bytes:
+        """ Return the body data available, at most `amt` bytes, waiting only when there is none """
+
+        try:
+            data = self._response.read1(amt)
+        except (OSError, http.client.HTTPException) as e:
+            _raise_if_cancelled(e)
+            raise
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        try:
+            count = self._response.readinto(buffer)
+        except (OSError, http.client.HTTPException) as e:
+            _raise_if_cancelled(e)
+            raise
+        if self._response.isclosed():
+            self._release()
+        return count
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self._response.getheader(name, default)
+
+    def getheaders(self) -> list[tuple[str, str]]:
+        return self._response.getheaders()
+
+    def info(self) -> Message:
+        return self.headers
+
+    def geturl(self) -> str:
+        return self.url
+
+    def getcode(self) -> int:
+        return self.status
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._stop_abort()
+            # a partially read body leaves the connection in an unusable state
+            reusable = self._response.isclosed()
+            self._response.close()
+            if reusable:
+                self._release()
+            else:
+                self._connection.close()
+                self._connection = None
+        super().close()
+
+    def _stop_abort(self) -> None:
+        if self._unregister is not None:
+            self._unregister()
+            self._unregister = None
+
+    def _release(self) -> None:
+        if self._connection is not None:
+            self._stop_abort()
+            self._pool.release(self._key, self._connection)
+            self._connection = None
+
+
+class ConnectionPool:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: dict[_PoolKey, list[tuple[HTTPConnection, float]]] = {}
+        self._sessions: dict[tuple[str, int, Optional[ssl.SSLContext]], ssl.SSLSession] = {}
+        self._default_context: Optional[ssl.SSLContext] = None
+
+    def forget(self) -> None:
+        """ Drop all connections without closing them, for use in a forked child process
+
+            The sockets are shared with the parent process and must only be used by one of them.
+        """
+
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def urlopen(self, request: urllib.request.Request, context: Optional[ssl.SSLContext] = None, timeout: Optional[float] = None) -> Any:
+        """ Same as `urllib.request.urlopen()` but reusing connections
+
+            Only `http` and `https` urls are pooled, other schemes are handed to urllib.
+            Raise `urllib.error.HTTPError` for error responses and `urllib.error.URLError` for connection failures.
+        """
+
+        scheme = urllib.parse.urlsplit(request.full_url).scheme.lower()
+        if scheme not in ('http', 'https'):
+            return urllib.request.urlopen(request, context=context)
+
+        url = request.full_url
+        method = request.get_method()
+        data = request.data
+        headers = {key.title(): value for key, value in request.header_items()}
+        if (data is not None) and ('Content-Type' not in headers):
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        for _ in range(MAX_REDIRECTIONS + 1):
+            response = self._request(method, url, data, headers, context, timeout)
+
+            location = response.getheader('Location')
+            if (response.status not in _REDIRECT_CODES) or (location is None):
+                break
+
+            # drain the body so the connection can be reused
+            response.read()
+            response.close()
+
+            url = urllib.parse.urljoin(url, location)
+            if (response.status in (301, 302, 303)) and (method not in ('GET', 'HEAD')):
+                method = 'GET'
+                data = None
+                headers = {key: value for key, value in headers.items()
+                           if key not in ('Content-Type', 'Content-Length')}
+        else:
+            raise urllib.error.HTTPError(url, response.status, "Too many redirections", response.headers, None)
+
+        if response.status >= 400:
+            body = response.read()
+            response.close()
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+
+        return response
+
+    def release(self, key: _PoolKey, connection: HTTPConnection) -> None:
+        """ Return `connection` to the pool if it can be reused """
+
+        sock = connection.sock
+        if sock is None:
+            return
+
+        if isinstance(sock, ssl.SSLSocket) and (sock.session is not None):
+            with self._lock:
+                self._sessions[(sock.server_hostname or key.host, key.port, key.context)] = sock.session
+
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_CONNECTIONS:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def clear(self) -> None:
+        """ Close all idle connections """
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def _request(self, method: str, url: str, data: Optional[Any], headers: Mapping[str, str],
+                 context: Optional[ssl.SSLContext], timeout: Optional[float]) -> PooledResponse:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = parts.hostname or ''
+        port = parts.port or (443 if scheme == 'https' else 80)
+        if scheme == 'https':
+            context = context or self._get_default_context()
+
+        proxy = _proxy_for(scheme, host)
+        key = _PoolKey(scheme, host, port, proxy, context if scheme == 'https' else None)
+
+        # plain HTTP through a proxy sends the absolute url, HTTPS is tunneled
+        selector = url if (proxy and scheme == 'http') else urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        request_headers = dict(headers)
+        if proxy and (scheme == 'http'):
+            request_headers.update(_proxy_auth_headers(proxy))
+
+        cancellation.raise_if_cancelled()
+        connection, reused = self._acquire(key, context, timeout)
+        try:
+            return self._send(key, connection, method, selector, data, request_headers, url)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            _raise_if_cancelled(e)
+            # a request that changes state may have been processed, only the caller can tell whether to send it again
+            if (not reused) or (method not in _RETRIED_METHODS):
+                raise urllib.error.URLError(e) from e
+
+        # the server closed the idle connection in the meantime, retry once on a new one
+        connection, _ = self._acquire(key, context, timeout, reuse=False)
+        try:
+            return self._send(key, connection, method, selector, data, request_headers, url)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            _raise_if_cancelled(e)
+            raise urllib.error.URLError(e) from e
+
+    def _send(self, key: _PoolKey, connection: HTTPConnection, method: str, selector: str, data: Optional[Any],
+              headers: Mapping[str, str], url: str) -> PooledResponse:
+        unregister = _abort_on_cancel(connection)
+        try:
+            with tracing.span('request', 'request', method=method, url=url) as span:
+                connection.request(method, selector, data, dict(headers))
+                response = connection.getresponse()
+                span.set(status=response.status)
+        except BaseException:
+            if unregister is not None:
+                unregister()
+            raise
+        return PooledResponse(self, key, connection, response, url, unregister)
+
+    def _acquire(self, key: _PoolKey, context: Optional[ssl.SSLContext], timeout: Optional[float], reuse: bool = True) -> tuple[HTTPConnection, bool]:
+        if reuse:
+            now = time.monotonic()
+            with self._lock:
+                idle = self._idle.get(key, [])
+                while len(idle) > 0:
+                    connection, since = idle.pop()
+                    if (now - since) < IDLE_TIMEOUT:
+                        if timeout is not None:
+                            connection.timeout = timeout
+                            if connection.sock is not None:
+                                connection.sock.settimeout(timeout)
+                        return connection, True
+                    connection.close()
+
+        return self._connect(key, context, timeout), False
+
+    def _connect(self, key: _PoolKey, context: Optional[ssl.SSLContext], timeout: Optional[float]) -> HTTPConnection:
+        connection_timeout = socket._GLOBAL_DEFAULT_TIMEOUT if timeout is None else timeout  # type: ignore[attr-defined]
+
+        host, port = key.host, key.port
+        if key.proxy:
+            proxy = urllib.parse.urlsplit(key.proxy)
+            host, port = proxy.hostname or '', proxy.port or 80
+
+        connection: HTTPConnection
+        if key.scheme == 'https':
+            with self._lock:
+                session = self._sessions.get((key.host, key.port, key.context))
+            connection = _HTTPSConnection(host, port, timeout=connection_timeout, context=context, session=session)
+            if key.proxy:
+                connection.set_tunnel(key.host, key.port, headers=_proxy_auth_headers(key.proxy))
+        else:
+            connection = _HTTPConnection(host, port, timeout=connection_timeout)
+        return connection
+
+    def _get_default_context(self) -> ssl.SSLContext:
+        # one shared context, TLS sessions can only be resumed by the context that created them
+        with self._lock:
+            if self._default_context is None:
+                self._default_context = ssl.create_default_context()
+            return self._default_context
+
+
+def _abort_on_cancel(connection: HTTPConnection) -> Optional[Callable[[], None]]:
+    """ Shut the socket of `connection` down when the search of the current context is cancelled,
+        which wakes up the thread blocked on it. Connections still being established are not aborted.
+
+        Return a function to call once the connection is no longer used for the request, `None` outside of a search.
+    """
+
+    token = cancellation.current()
+    if token is None:
+        return None
+    return token.register(partial(_shutdown, connection))
+
+
+def _shutdown(connection: HTTPConnection) -> None:
+    sock = connection.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _raise_if_cancelled(error: BaseException) -> None:
+    # the error was caused by the abort of the socket
+    token = cancellation.current()
+    if (token is not None) and token.cancelled:
+        raise cancellation.SearchCancelled() from error
+
+
+def _proxy_for(scheme: str, host: str) -> str:
+    """ Return the HTTP proxy url configured for `scheme` in the environment, empty when `host` bypasses it
+
+        SOCKS proxies are not handled here, they are installed process wide by replacing `socket.socket`
+        and keep working on pooled connections.
+    """
+
+    proxy = urllib.request.getproxies().get(scheme, '')
+    if (len(proxy) == 0) or urllib.request.proxy_bypass(host):
+        return ''
+    if '://' not in proxy:
+        proxy = f"http://{proxy}"
+    return proxy
+
+
+def _proxy_auth_headers(proxy: str) -> dict[str, str]:
+    parts = urllib.parse.urlsplit(proxy)
+    if parts.username is None:
+        return {}
+
+    credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+    return {'Proxy-Authorization': f"Basic {base64.b64encode(credentials.encode()).decode()}"}
+
+
+# shared by all requests of the process
+pool = ConnectionPool()
+
+# sockets inherited by forked worker processes must not be used by both processes
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pool.forget)
+
+
+def urlopen(request: urllib.request.Request, context: Optional[ssl.SSLContext] = None, timeout: Optional[float] = None) -> Any:
+    """ Open `request` using the connection pool of the process, see `ConnectionPool.urlopen()` """
+
+    return pool.urlopen(request, context, timeout)
@@ -1,4 +1,4 @@
-#VERSION: 1.48
+#VERSION: 1.66
 
 # Author:
 #  Fabien Devaux <fab AT gnux DOT info>
@@ -33,24 +33,53 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import contextvars
+import hashlib
 import importlib
-import pathlib
+import itertools
+import json
+import os
+import queue
+import signal
 import sys
+import threading
+import time
 import traceback
 import urllib.parse
-import xml.etree.ElementTree as ET
-from collections.abc import Iterable
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
 from enum import Enum
+from functools import partial
 from glob import glob
-from multiprocessing import Pool, cpu_count
 from os import path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from multiprocessing.pool import Pool as PoolType
+    from multiprocessing.queues import SimpleQueue as SimpleQueueType
+
+    import enginestats
+
+# qbt tend to run this script in 'isolate mode' so append the current path manually
+current_path = path.realpath(path.dirname(path.abspath(__file__)))
+if current_path not in sys.path:
+    sys.path.append(current_path)
+
+import cancellation
+import novaprinter
+import resultfilter
+import resultmerger
+import tracing
 
 THREADED: bool = True
-try:
-    MAX_THREADS: int = cpu_count()
-except NotImplementedError:
-    MAX_THREADS = 1
+# `multiprocessing.cpu_count()`, without importing multiprocessing before a search needs it
+MAX_THREADS: int = os.cpu_count() or 1
+# upper bound of threads running legacy engines and blocking requests with `--executor=async`
+MAX_ASYNC_THREADS: int = 32
+# outcomes of the recent searches of every engine, see `enginestats`
+ENGINE_STATS_PATH = path.join(path.dirname(path.abspath(__file__)), 'engine_stats.sqlite')
 
 Category = Enum('Category', ['all', 'anime', 'books', 'games', 'movies', 'music', 'pictures', 'software', 'tv'])
 
@@ -61,6 +90,10 @@ Category = Enum('Category', ['all', 'anime', 'books', 'games', 'movies', 'music'
 # it should call prettyPrinter() with a dict as parameter.
 # The keys in the dict must be: link,name,size,seeds,leech,engine_url
 # As a convention, try to list results by decreasing number of seeds or similar
+#
+# Engines may instead provide an "async def search_async()" method taking the
+# same parameters, it is preferred when running with `--executor=async`.
+# Use helpers.retrieve_url_async() to fetch pages from it.
 ################################################################################
 
 
@@ -78,6 +111,9 @@ class Engine:
     def search(self, what: str, cat: str = Category.all.name) -> None:
         pass
 
+    # optional
+    # async def search_async(self, what: str, cat: str = Category.all.name) -> None:
+
     def download_torrent(self, info: str) -> None:
         pass
 
@@ -121,6 +157,111 @@ def import_engine(engine_module_name: EngineModuleName) -> Optional[type[Engine]
     return engine_class
 
 
+EngineCapabilities = dict[str, str]  # "name", "url" and space separated "categories" of an engine
+
+# Capabilities of the engines along with the signature of their file, so that only changed engines are imported
+CAPABILITIES_MANIFEST = path.join(path.dirname(path.abspath(__file__)), 'capabilities.json')
+CAPABILITIES_MANIFEST_FORMAT = 1
+
+
+def engine_capabilities(engine_class: type[Engine]) -> EngineCapabilities:
+    supported_categories = ""
+    if hasattr(engine_class, "supported_categories"):
+        supported_categories = " ".join((key
+                                         for key in sorted(engine_class.supported_categories.keys())
+                                         if key != Category.all.name))
+    return {'name': engine_class.name, 'url': engine_class.url, 'categories': supported_categories}
+
+
+def _engine_path(engine_module_name: EngineModuleName) -> str:
+    return path.join(path.dirname(path.abspath(__file__)), 'engines', f"{engine_module_name}.py")
+
+
+def _file_digest(file_path: str) -> str:
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _manifest_environment() -> list[Any]:
+    """ Return what the capabilities of every engine depend on besides its own file:
+        the Python version and the nova3 modules engines import
+    """
+
+    environment: list[Any] = [sys.version]
+    for module_path in sorted(glob(path.join(path.dirname(path.abspath(__file__)), '*.py'))):
+        stat = os.stat(module_path)
+        environment.append([path.basename(module_path), stat.st_mtime_ns, stat.st_size])
+    return environment
+
+
+def load_capabilities(engines: Iterable[EngineModuleName]) -> dict[EngineModuleName, Optional[EngineCapabilities]]:
+    """ Return the capabilities of the engines, `None` for broken engines
+
+        Engines are only imported when their file changed since their capabilities were cached in
+        `CAPABILITIES_MANIFEST`, which is then updated.
+    """
+
+    environment = _manifest_environment()
+    cached_engines: dict[str, Any] = {}
+    try:
+        with open(CAPABILITIES_MANIFEST, encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        if (manifest.get('format') == CAPABILITIES_MANIFEST_FORMAT) and (manifest.get('environment') == environment):
+            cached_engines = manifest['engines']
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+
+    capabilities: dict[EngineModuleName, Optional[EngineCapabilities]] = {}
+    manifest_engines: dict[str, Any] = {}
+    changed = False
+    for engine_module_name in engines:
+        engine_path = _engine_path(engine_module_name)
+        try:
+            stat = os.stat(engine_path)
+        except OSError:
+            changed = True
+            continue
+
+        entry = cached_engines.get(engine_module_name)
+        if (not isinstance(entry, dict)) or ((entry.get('mtime_ns'), entry.get('size')) != (stat.st_mtime_ns, stat.st_size)):
+            # the file was touched, compare its content before importing it
+            changed = True
+            digest = _file_digest(engine_path)
+            if (not isinstance(entry, dict)) or (entry.get('sha256') != digest):
+                engine_class = import_engine(engine_module_name)
+                entry = {'sha256': digest,
+                         'capabilities': (engine_capabilities(engine_class) if engine_class is not None else None)}
+            entry = dict(entry, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+        capabilities[engine_module_name] = entry['capabilities']
+        manifest_engines[engine_module_name] = entry
+
+    if changed or (len(manifest_engines) != len(cached_engines)):
+        _write_manifest({'format': CAPABILITIES_MANIFEST_FORMAT, 'environment': environment, 'engines': manifest_engines})
+
+    return capabilities
+
+
+def _write_manifest(manifest: dict[str, Any]) -> None:
+    # replace the manifest atomically as several nova2 processes may run at once
+    import tempfile
+
+    manifest_dir = path.dirname(CAPABILITIES_MANIFEST)
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix='.capabilities-', suffix='.json', dir=manifest_dir)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
+            json.dump(manifest, temp_file)
+        os.replace(temp_path, CAPABILITIES_MANIFEST)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
 def get_capabilities(engines: Iterable[EngineModuleName]) -> str:
     """
     Return capabilities in XML format
@@ -133,60 +274,662 @@ def get_capabilities(engines: Iterable[EngineModuleName]) -> str:
     </capabilities>
     """
 
+    import xml.etree.ElementTree as ET
+
     capabilities_element = ET.Element('capabilities')
 
-    for engine_module_name in engines:
-        engine_class = import_engine(engine_module_name)
-        if engine_class is None:
+    for engine_module_name, capabilities in load_capabilities(engines).items():
+        if capabilities is None:
             continue
 
         engine_module_element = ET.SubElement(capabilities_element, engine_module_name)
 
-        ET.SubElement(engine_module_element, 'name').text = engine_class.name
-        ET.SubElement(engine_module_element, 'url').text = engine_class.url
-
-        supported_categories = ""
-        if hasattr(engine_class, "supported_categories"):
-            supported_categories = " ".join((key
-                                             for key in sorted(engine_class.supported_categories.keys())
-                                             if key != Category.all.name))
-        ET.SubElement(engine_module_element, 'categories').text = supported_categories
+        ET.SubElement(engine_module_element, 'name').text = capabilities['name']
+        ET.SubElement(engine_module_element, 'url').text = capabilities['url']
+        ET.SubElement(engine_module_element, 'categories').text = capabilities['categories']
 
     ET.indent(capabilities_element)
     return ET.tostring(capabilities_element, 'unicode')
 
 
-def run_search(search_params: tuple[type[Engine], str, Category]) -> bool:
+class SearchJob(NamedTuple):
+    engine_class: type[Engine]
+    what: str
+    cat: Category
+    search_id: Optional[str] = None  # only set when serving searches, see `SearchServer`
+    timeout: Optional[float] = None  # seconds the engine is given before its search is abandoned
+    output_format: novaprinter.OutputFormat = novaprinter.OutputFormat.Text
+    collect: bool = False  # pass the results to `_result_sink` instead of printing them, see `resultmerger`
+    result_filter: Optional[resultfilter.ResultFilter] = None
+    ranking: Optional[resultfilter.Ranking] = None  # only collect the best results of the engine
+    serial: int = 0  # identifies the search in `_CancelledSearches`, 0 when it can't be cancelled
+
+
+class SearchStatus(Enum):
+    OK = 'ok'
+    Error = 'error'
+    Timeout = 'timeout'
+    Skipped = 'skipped'  # the circuit breaker of the engine is open, see `enginestats`
+    Cancelled = 'cancelled'
+
+
+class EngineReport(NamedTuple):
+    engine: EngineModuleName
+    status: SearchStatus
+    results: int  # -1 when unknown, i.e. the search was abandoned
+    elapsed_ms: int
+    collected: tuple[novaprinter.ResultRecord, ...] = ()  # best results of the engine when ranked
+
+
+# Prefix of the completion records written to stderr, one line per engine:
+# nova2:completed {"engine": "engine1", "status": "ok", "results": 42, "elapsed_ms": 1234}
+COMPLETION_RECORD_PREFIX = "nova2:completed "
+
+
+def print_report(report: EngineReport) -> None:
+    record = {'engine': report.engine, 'status': report.status.value, 'results': report.results,
+              'elapsed_ms': report.elapsed_ms}
+    print(COMPLETION_RECORD_PREFIX + json.dumps(record), file=sys.stderr, flush=True)
+
+
+class EngineTimeout(BaseException):
+    """ Raised inside an engine search when its deadline passed.
+        Not an `Exception` so it is not swallowed by the error handling of the engine.
+    """
+
+
+def _raise_engine_timeout(signum: int, frame: Any) -> None:
+    raise EngineTimeout()
+
+
+# Signal notifying the pool workers of cancelled searches, not available on Windows
+CANCEL_SIGNAL: Optional[int] = getattr(signal, 'SIGUSR1', None)
+
+
+class _CancelledSearches:
+    """ Serials of the recently cancelled searches, in shared memory so the pool workers can read them
+
+        Once a serial is added, the workers are sent `CANCEL_SIGNAL` and abort their running search if it is
+        one of the cancelled ones. A serial is overwritten after `SLOTS` more cancellations, long after its
+        running jobs were aborted.
+    """
+
+    SLOTS = 64
+
+    def __init__(self) -> None:
+        from multiprocessing.sharedctypes import RawArray
+
+        self._serials = RawArray('q', self.SLOTS)
+        self._next = 0
+
+    def add(self, serial: int) -> None:
+        self._serials[self._next % self.SLOTS] = serial
+        self._next += 1
+
+    def __contains__(self, serial: int) -> bool:
+        return (serial != 0) and (serial in self._serials[:])
+
+    def notify_workers(self) -> None:
+        if CANCEL_SIGNAL is None:
+            return
+        from multiprocessing import active_children
+
+        for worker in active_children():
+            try:
+                os.kill(worker.pid, CANCEL_SIGNAL)  # type: ignore[arg-type]
+            except OSError:
+                pass
+
+
+class _ResultStream:
+    """ Sends the results collected by a pool worker to the main process, which merges them as they arrive
+
+        Results are sent in batches of at most `BATCH_SIZE`, at the latest `novaprinter.ResultWriter.FLUSH_INTERVAL`
+        after the previous batch and when the search completes, see `_receive_results()`.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self, results: 'SimpleQueueType[Optional[list[tuple[str, novaprinter.ResultRecord]]]]') -> None:
+        self._results = results
+        self._batch: list[tuple[str, novaprinter.ResultRecord]] = []
+        self._sent = time.monotonic()
+        # reentrant, the timeout of the search may interrupt the engine while it sends
+        self._lock = threading.RLock()
+
+    def __call__(self, engine: str, record: novaprinter.ResultRecord) -> None:
+        with self._lock:
+            self._batch.append((engine, record))
+            if ((len(self._batch) >= self.BATCH_SIZE)
+                    or ((time.monotonic() - self._sent) >= novaprinter.ResultWriter.FLUSH_INTERVAL)):
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if len(self._batch) > 0:
+                batch, self._batch = self._batch, []
+                self._results.put(batch)
+            self._sent = time.monotonic()
+
+
+def _receive_results(results: 'SimpleQueueType[Optional[list[tuple[str, novaprinter.ResultRecord]]]]',
+                     sink: Callable[[str, novaprinter.ResultRecord], None]) -> None:
+    """ Pass the results sent by the `_ResultStream` of the pool workers to `sink` until `None` is received """
+
+    while (batch := results.get()) is not None:
+        for engine, record in batch:
+            sink(engine, record)
+
+
+# set in the pool workers by `_init_worker()`, and in the main process
+_cancelled_searches: Optional[_CancelledSearches] = None
+# where the searches of the process pass the results they collect, see `SearchJob.collect`
+_result_sink: Optional[Callable[[str, novaprinter.ResultRecord], None]] = None
+# serial and cancellation token of the search running in the main thread of the process
+_running_search: Optional[tuple[int, cancellation.CancellationToken]] = None
+
+
+def _init_worker(cancelled_searches: _CancelledSearches,
+                 results: 'Optional[SimpleQueueType[Optional[list[tuple[str, novaprinter.ResultRecord]]]]]' = None
+                 ) -> None:
+    global _cancelled_searches, _result_sink
+    _cancelled_searches = cancelled_searches
+    _result_sink = _ResultStream(results) if (results is not None) else None
+    # forked workers inherit the handler of the main process, the pool terminates them with SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if CANCEL_SIGNAL is not None:
+        signal.signal(CANCEL_SIGNAL, _cancel_running_search)
+
+
+def create_pool(processes: int, engines: Iterable[EngineModuleName], cancelled_searches: _CancelledSearches,
+                start_method: Optional[str] = None,
+                results: 'Optional[SimpleQueueType[Optional[list[tuple[str, novaprinter.ResultRecord]]]]]' = None
+                ) -> 'PoolType':
+    """ Return a pool of `processes` workers to run the engine searches in
+
+        @param start_method  'fork', 'spawn' or 'forkserver', the default method of the platform when None
+        @param results       Queue of the same start method the workers send the results they collect to
+
+        'fork' workers inherit the engines imported by this process and 'spawn' workers import nova2 and the engines
+        of their jobs themselves. A 'forkserver' preloads nova2 and `engines` once, then forks every worker from that
+        state, which is also safe when this process runs threads, e.g. when the pool replaces a dead worker.
+        The fork server only finds them when nova3 is in its default import path though, which is not the case in
+        isolated mode (`python -I`), then its workers import them like 'spawn' workers do.
+        See tools/nova3_pool_bench.py for the costs of the methods.
+    """
+
+    from multiprocessing import get_context
+
+    context = get_context(start_method)
+    if context.get_start_method() == 'forkserver':
+        # '__main__' is not imported by the fork server of every Python version,
+        # preloading nova2 by name imports the modules it depends on in any case
+        context.set_forkserver_preload(['__main__', 'nova2'] + [f"engines.{engine}" for engine in engines])
+    return context.Pool(processes, initializer=_init_worker, initargs=(cancelled_searches, results))
+
+
+def _cancel_running_search(signum: int, frame: Any) -> None:
+    running = _running_search
+    if (running is not None) and (_cancelled_searches is not None) and (running[0] in _cancelled_searches):
+        running[1].cancel()
+        raise cancellation.SearchCancelled()
+
+
+def run_search(search_params: SearchJob, token: Optional[cancellation.CancellationToken] = None) -> EngineReport:
     """ Run search in engine
 
-        @param search_params Tuple with engine, query and category
+        @param search_params Engine, query, category, and optionally the search id and the timeout
+        @param token         Cancels the search, for searches run in other threads
 
-        @retval False if any exceptions occurred
-        @retval True  otherwise
+        On POSIX systems the timeout interrupts the engine when run in the main thread of the process,
+        otherwise the caller is responsible for abandoning the search. Likewise cancelling the search
+        through `_CancelledSearches` interrupts it in the main thread of a pool worker.
     """
 
-    engine_class, what, cat = search_params
+    global _running_search
+    engine_class, what, cat, search_id, timeout, *_ = search_params
+    context = _print_context(search_params)
+    novaprinter.printContext.set(context)
+    in_main_thread = (threading.current_thread() is threading.main_thread())
+    if in_main_thread:
+        # the only search of the process
+        novaprinter.defaultContext = context
+    if token is None:
+        token = cancellation.CancellationToken()
+    cancellation.currentToken.set(token)
+
+    use_alarm = ((timeout is not None) and hasattr(signal, 'setitimer') and in_main_thread)
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_engine_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    status = SearchStatus.OK
+    start = time.monotonic()
     try:
-        engine = engine_class()
-        # avoid exceptions due to invalid category
-        if hasattr(engine, 'supported_categories'):
-            if cat.name in engine.supported_categories:
-                engine.search(what, cat.name)
-        else:
-            engine.search(what)
-        return True
+        with tracing.search(engine_class.__name__):
+            if in_main_thread:
+                _running_search = (search_params.serial, token)
+                # cancelled before it started
+                if (_cancelled_searches is not None) and (search_params.serial in _cancelled_searches):
+                    raise cancellation.SearchCancelled()
+            engine = engine_class()
+            args = search_args(engine, what, cat)
+            if args is not None:
+                engine.search(*args)
+    except EngineTimeout:
+        # abort the requests of the threads the engine started
+        token.cancel()
+        status = SearchStatus.Timeout
+    except cancellation.SearchCancelled:
+        status = SearchStatus.Cancelled
     except Exception:
         traceback.print_exc()
-        return False
+        status = SearchStatus.Error
+    finally:
+        if in_main_thread:
+            _running_search = None
+            novaprinter.defaultContext = None
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        context.flush()
+        if search_params.collect and isinstance(_result_sink, _ResultStream):
+            _result_sink.flush()
+
+    return EngineReport(engine_class.__name__, status, context.resultCount, _elapsed_ms(start),
+                        tuple(context.collectedResults()))
+
+
+def _print_context(search_params: SearchJob) -> novaprinter.PrintContext:
+    """ Return the context the results of the search are printed in, see `_inherit_context_in_threads()` """
+
+    _inherit_context_in_threads()
+    if ((search_params.output_format != novaprinter.OutputFormat.Text) or search_params.collect
+            or (search_params.result_filter is not None) or (search_params.ranking is not None)):
+        novaprinter.textFallback = False
+    top = resultfilter.TopResults(search_params.ranking) if (search_params.ranking is not None) else None
+    sink = _result_sink if search_params.collect else None
+    return novaprinter.PrintContext(search_params.search_id, search_params.engine_class.__name__,
+                                    search_params.output_format, sink, search_params.result_filter, top)
+
+
+_thread_start = threading.Thread.start
+
+
+def _inherit_context_in_threads() -> None:
+    """ Start the threads in a copy of the context of the thread starting them, like Python 3.14 does with
+        `-X thread_inherit_context`
+
+        Engines fetch pages in threads of their own, e.g. with `ThreadPoolExecutor` or `multiprocessing.dummy`,
+        the results they print there must reach `novaprinter.printContext` and their requests
+        `cancellation.currentToken`.
+    """
+
+    if threading.Thread.start is not _thread_start:
+        return
+
+    def start(thread: threading.Thread) -> None:
+        thread.run = partial(contextvars.copy_context().run, thread.run)  # type: ignore[method-assign]
+        _thread_start(thread)
+
+    threading.Thread.start = start  # type: ignore[method-assign]
+
+
+def search_args(engine: Engine, what: str, cat: Category) -> Optional[tuple[str, ...]]:
+    """ Return the arguments to call the engine search method with,
+        `None` when the engine does not support the category
+    """
+
+    # avoid exceptions due to invalid category
+    if hasattr(engine, 'supported_categories'):
+        if cat.name in engine.supported_categories:
+            return (what, cat.name)
+        return None
+    return (what,)
+
+
+def _elapsed_ms(start: float) -> int:
+    return round((time.monotonic() - start) * 1000)
+
+
+def run_searches(pool: 'PoolType', processes: int, jobs: Iterable[SearchJob],
+                 token: Optional[cancellation.CancellationToken] = None) -> Iterator[EngineReport]:
+    """ Run searches in the pool and yield their reports as they complete
+
+        At most one job per worker is handed to the pool, so the deadline of a job counts from its start.
+        Jobs still running after their deadline (plus a grace period for the worker to interrupt them)
+        are abandoned and reported as timed out.
+        Once `token` is cancelled, the jobs not started yet are reported as cancelled and the running ones
+        are given the grace period to abort, see `_CancelledSearches`.
+    """
+
+    grace_period = 1.0
+    pending = deque(enumerate(jobs))
+    running: dict[int, tuple[SearchJob, float, float]] = {}  # job index -> job, start time, deadline
+    completed: queue.SimpleQueue[tuple[int, Optional[EngineReport]]] = queue.SimpleQueue()
+
+    def failed(index: int, job: SearchJob, error: BaseException) -> None:
+        print(f"Search in {job.engine_class.__name__} failed: {error!r}", file=sys.stderr)
+        completed.put((index, EngineReport(job.engine_class.__name__, SearchStatus.Error, 0, 0)))
+
+    if token is not None:
+        # wake up on cancellation, `SimpleQueue.put()` may be called from a signal handler
+        token.register(lambda: completed.put((-1, None)))
+
+    while (len(pending) > 0) or (len(running) > 0):
+        if (token is not None) and token.cancelled:
+            while len(pending) > 0:
+                _, job = pending.popleft()
+                yield EngineReport(job.engine_class.__name__, SearchStatus.Cancelled, 0, 0)
+            now = time.monotonic()
+            for index, (job, start, deadline) in list(running.items()):
+                running[index] = (job, start, min(deadline, now + grace_period))
+            if len(running) == 0:
+                break
+
+        while (len(pending) > 0) and (len(running) < processes):
+            index, job = pending.popleft()
+            start = time.monotonic()
+            deadline = (start + job.timeout + grace_period) if (job.timeout is not None) else float('inf')
+            running[index] = (job, start, deadline)
+            pool.apply_async(run_search, (job,),
+                             callback=partial(lambda i, report: completed.put((i, report)), index),
+                             error_callback=partial(failed, index, job))
+
+        next_deadline = min(deadline for _, _, deadline in running.values())
+        try:
+            wait = None if (next_deadline == float('inf')) else max(next_deadline - time.monotonic(), 0)
+            index, report = completed.get(timeout=wait)
+        except queue.Empty:
+            now = time.monotonic()
+            for index, (job, start, deadline) in list(running.items()):
+                if deadline <= now:
+                    del running[index]
+                    status = SearchStatus.Cancelled if ((token is not None) and token.cancelled) else SearchStatus.Timeout
+                    yield EngineReport(job.engine_class.__name__, status, -1, _elapsed_ms(start))
+            continue
+
+        if report is None:
+            continue  # woken up by the cancellation
+        # reports of abandoned jobs are ignored
+        if running.pop(index, None) is not None:
+            yield report
+
+
+async def run_search_async(search_params: SearchJob, executor: 'Executor') -> EngineReport:
+    """ Run search in engine on the running event loop, abandoning it after its timeout or when the task is cancelled
+
+        Engines without a `search_async` method are run by `run_search` in `executor`
+    """
+
+    import asyncio
+
+    engine_class, what, cat, search_id, timeout, *_ = search_params
+    start = time.monotonic()
+    # aborts the requests of the engine, even those running in threads
+    token = cancellation.CancellationToken()
+
+    async def search() -> EngineReport:
+        if not asyncio.iscoroutinefunction(getattr(engine_class, 'search_async', None)):
+            # in a context of its own, the threads of `executor` run the searches of several engines
+            return await asyncio.get_running_loop().run_in_executor(executor, contextvars.copy_context().run,
+                                                                    run_search, search_params, token)
+
+        context = _print_context(search_params)
+        novaprinter.printContext.set(context)
+        cancellation.currentToken.set(token)
+        status = SearchStatus.OK
+        try:
+            with tracing.search(engine_class.__name__):
+                engine = engine_class()
+                args = search_args(engine, what, cat)
+                if args is not None:
+                    await engine.search_async(*args)  # type: ignore[attr-defined]
+        except cancellation.SearchCancelled:
+            status = SearchStatus.Cancelled
+        except Exception:
+            traceback.print_exc()
+            status = SearchStatus.Error
+        context.flush()
+        return EngineReport(engine_class.__name__, status, context.resultCount, _elapsed_ms(start),
+                            tuple(context.collectedResults()))
+
+    try:
+        return await asyncio.wait_for(search(), timeout)
+    except asyncio.TimeoutError:
+        token.cancel()
+        return EngineReport(engine_class.__name__, SearchStatus.Timeout, -1, _elapsed_ms(start))
+    except asyncio.CancelledError:
+        token.cancel()
+        return EngineReport(engine_class.__name__, SearchStatus.Cancelled, -1, _elapsed_ms(start))
+
+
+async def run_searches_async(jobs: Iterable[SearchJob], on_completed: Callable[[EngineReport], None]) -> list[EngineReport]:
+    """ Run all searches concurrently on one event loop
+
+        `on_completed` is called with the report of every search as soon as it completes.
+        Legacy engines that timed out can't be interrupted and are left running in their thread, their requests
+        are aborted though. On POSIX systems SIGTERM cancels all searches.
+    """
+
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    # also serves `asyncio.to_thread()`, which `helpers.retrieve_url_async()` relies on
+    executor = ThreadPoolExecutor(max_workers=MAX_ASYNC_THREADS, thread_name_prefix='nova2')
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(executor)
+
+    tasks = [asyncio.ensure_future(run_search_async(job, executor)) for job in jobs]
+
+    def cancel_all() -> None:
+        for task in tasks:
+            task.cancel()
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, cancel_all)
+    except NotImplementedError:  # Windows
+        pass
+
+    reports = []
+    for next_completed in asyncio.as_completed(tasks):
+        report = await next_completed
+        on_completed(report)
+        reports.append(report)
+    return reports
+
+
+@dataclass
+class _ServedSearch:
+    remaining: int
+    serial: int  # see `_CancelledSearches`
+    success: bool = True
+    cancelled: bool = False
+
+
+class SearchServer:
+    """ Serve searches from one long-lived process so engines stay imported and the worker pool stays warm
+
+        Commands are read from stdin, one JSON object per line:
+          {"cmd": "search", "id": "1", "engines": "all" | ["engine1", ...], "category": "all", "query": "keywords",
+           "filter": {"min_seeds": 1, ...}}  ("filter" is optional, see `resultfilter.ResultFilter` for its fields)
+          {"cmd": "cancel", "id": "1"}
+          {"cmd": "quit"}
+
+        Everything written to stdout is a JSON object per line as well:
+          {"event": "ready", "engines": ["engine1", ...]}
+          {"id": "1", "event": "results", "engine": "engine1", "results": [{...}, ...]}  (see `novaprinter.OutputFormat`)
+          {"id": "1", "event": "engine_finished", "engine": "engine1", "status": "ok", "results": 42, "elapsed_ms": 1234}
+          {"id": "1", "event": "finished", "success": true, "cancelled": false}
+          {"id": "1", "event": "error", "message": "..."}
+
+        Cancelling a search drops its engines that have not started yet. Engines that are already running are
+        interrupted when the pool workers were created with `_init_worker()` on POSIX systems, and report the
+        "cancelled" status, otherwise they are left to complete. Their results may still arrive until the
+        "finished" event of the search.
+    """
+
+    def __init__(self, engines: list[EngineModuleName], pool: 'PoolType', processes: int,
+                 stats: Optional['enginestats.StatsStore'] = None,
+                 cancelled_searches: Optional[_CancelledSearches] = None) -> None:
+        self._engines = engines
+        self._pool = pool
+        self._processes = processes
+        self._stats = stats
+        self._cancelled_searches = cancelled_searches
+        self._lock = threading.RLock()
+        self._pending: deque[SearchJob] = deque()
+        self._inflight = 0
+        self._searches: dict[str, _ServedSearch] = {}
+        self._serials = itertools.count(1)
+
+    def serve(self) -> None:
+        self._emit({'event': 'ready', 'engines': self._engines})
+
+        # fd 0 is stdin
+        with open(0, 'r', encoding='utf-8', closefd=False) as commands:
+            for line in commands:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+
+                try:
+                    command = json.loads(line)
+                    if not isinstance(command, dict):
+                        raise ValueError("command must be a JSON object")
+                except ValueError as e:
+                    self._emit({'event': 'error', 'message': f"Invalid command: {e}"})
+                    continue
+
+                name = command.get('cmd')
+                if name == 'quit':
+                    break
+                if name == 'search':
+                    self._search(command)
+                elif name == 'cancel':
+                    self._cancel(command)
+                else:
+                    self._emit({'id': command.get('id'), 'event': 'error', 'message': f"Unknown command: {name}"})
+
+    def _search(self, command: dict[str, Any]) -> None:
+        search_id = command.get('id')
+        engines = command.get('engines', 'all')
+        query = command.get('query')
+        cat = command.get('category', Category.all.name)
+
+        if not isinstance(search_id, str) or len(search_id) == 0:
+            self._emit({'id': search_id, 'event': 'error', 'message': "Missing search id"})
+            return
+        if not isinstance(query, str) or len(query.strip()) == 0:
+            self._emit({'id': search_id, 'event': 'error', 'message': "Missing query"})
+            return
+        try:
+            category = Category[str(cat).lower()]
+        except KeyError:
+            self._emit({'id': search_id, 'event': 'error', 'message': f"Invalid category: {cat}"})
+            return
+        result_filter = None
+        if command.get('filter') is not None:
+            try:
+                if not isinstance(command['filter'], dict):
+                    raise ValueError("filter must be a JSON object")
+                result_filter = resultfilter.ResultFilter(**command['filter'])
+                result_filter.validate()
+            except (TypeError, ValueError) as e:
+                self._emit({'id': search_id, 'event': 'error', 'message': f"Invalid filter: {e}"})
+                return
+
+        if isinstance(engines, str):
+            engines = engines.split(',')
+        engs = set(str(e).strip().lower() for e in engines)
+        selected = self._engines if 'all' in engs else [e for e in self._engines if e in engs]
+        if self._stats is not None:
+            import enginestats
+            selected = enginestats.schedule(selected, self._stats.stats())
+
+        what = urllib.parse.quote(query.strip())
+        serial = next(self._serials)
+        jobs = [SearchJob(engine_class, what, category, search_id, output_format=novaprinter.OutputFormat.NDJSON,
+                          result_filter=result_filter, serial=serial)
+                for e in selected if (engine_class := import_engine(e)) is not None]
+
+        with self._lock:
+            if search_id in self._searches:
+                self._emit({'id': search_id, 'event': 'error', 'message': "Search id is already in use"})
+                return
+
+            self._searches[search_id] = _ServedSearch(remaining=len(jobs), serial=serial)
+            if len(jobs) == 0:
+                self._finish(search_id)
+                return
+
+            self._pending.extend(jobs)
+            self._dispatch()
+
+    def _cancel(self, command: dict[str, Any]) -> None:
+        search_id = command.get('id')
+
+        with self._lock:
+            search = self._searches.get(search_id)  # type: ignore[arg-type]
+            if search is None:
+                self._emit({'id': search_id, 'event': 'error', 'message': "Unknown search id"})
+                return
+
+            search.cancelled = True
+            pending = len(self._pending)
+            self._pending = deque(job for job in self._pending if job.search_id != search_id)
+            search.remaining -= pending - len(self._pending)
+            if search.remaining == 0:
+                self._finish(search_id)
+            elif self._cancelled_searches is not None:
+                # interrupt the running engines of the search
+                self._cancelled_searches.add(search.serial)
+                self._cancelled_searches.notify_workers()
+
+    def _dispatch(self) -> None:
+        # keep at most one job per worker in the pool, so the rest can still be dropped on cancellation
+        with self._lock:
+            while (self._inflight < self._processes) and (len(self._pending) > 0):
+                job = self._pending.popleft()
+                self._inflight += 1
+                self._pool.apply_async(run_search, (job,),
+                                       callback=partial(self._jobDone, job.search_id),
+                                       error_callback=partial(self._jobFailed, job.search_id, job))
+
+    def _jobDone(self, search_id: str, report: EngineReport) -> None:
+        # called from the result handler thread of the pool
+        if (self._stats is not None) and (report.status != SearchStatus.Cancelled):
+            self._stats.record(report.engine, report.status.value, report.results, report.elapsed_ms)
+
+        with self._lock:
+            self._emit({'id': search_id, 'event': 'engine_finished', 'engine': report.engine,
+                        'status': report.status.value, 'results': report.results, 'elapsed_ms': report.elapsed_ms})
+
+            self._inflight -= 1
+            search = self._searches[search_id]
+            search.remaining -= 1
+            search.success = search.success and (report.status == SearchStatus.OK)
+            if search.remaining == 0:
+                self._finish(search_id)
+            self._dispatch()
+
+    def _jobFailed(self, search_id: str, job: SearchJob, error: BaseException) -> None:
+        print(f"Search {search_id} failed: {error!r}", file=sys.stderr)
+        self._jobDone(search_id, EngineReport(job.engine_class.__name__, SearchStatus.Error, 0, 0))
+
+    def _finish(self, search_id: str) -> None:
+        search = self._searches.pop(search_id)
+        self._emit({'id': search_id, 'event': 'finished', 'success': search.success, 'cancelled': search.cancelled})
+
+    def _emit(self, message: dict[str, Any]) -> None:
+        # stdout is shared with the pool workers which print the results
+        with self._lock:
+            novaprinter.outputWriter.write(json.dumps(message, ensure_ascii=False))
+            novaprinter.outputWriter.flush()
 
 
 if __name__ == "__main__":
     def main() -> int:
-        # qbt tend to run this script in 'isolate mode' so append the current path manually
-        current_path = str(pathlib.Path(__file__).parent.resolve())
-        if current_path not in sys.path:
-            sys.path.append(current_path)
-
         # https://docs.python.org/3/library/sys.html#sys.exit
         class ExitCode(Enum):
             OK = 0
@@ -195,44 +938,252 @@ if __name__ == "__main__":
 
         found_engines = list_engines()
 
+        # options precede the positional arguments, so keywords starting with "--" are left alone
+        args = sys.argv[1:]
+        options: dict[str, str] = {}
+        while (len(args) > 0) and args[0].startswith('--'):
+            key, _, value = args.pop(0)[2:].partition('=')
+            options[key] = value
+
         prog_name = sys.argv[0]
-        prog_usage = (f"Usage: {prog_name} all|engine1[,engine2]* <category> <keywords>\n"
+        prog_usage = (f"Usage: {prog_name} [--executor=pool|async|serial] [--start-method=fork|spawn|forkserver] "
+                      "[--timeout=<seconds>] [--format=text|ndjson] [--merge[=<max results>]] [--skip-failing] "
+                      "[--top=<count>[:seeds|relevance]] [--min-seeds=<n>] [--min-size=<size>] [--max-size=<size>] "
+                      "[--min-pub-date=<unix time>] [--max-pub-date=<unix time>] [--include=<regex>] [--exclude=<regex>] "
+                      "all|engine1[,engine2]* <category> <keywords>\n"
                       f"To list available engines: {prog_name} --capabilities [--names]\n"
+                      f"To serve searches read from stdin: {prog_name} --serve [--start-method=fork|spawn|forkserver]\n"
+                      f"To show the health statistics of the engines: {prog_name} --stats\n"
                       f"Found engines: {','.join(found_engines)}")
 
-        if "--capabilities" in sys.argv:
-            if "--names" in sys.argv:
-                print(",".join((e for e in found_engines if import_engine(e) is not None)))
+        # method starting the pool workers, see `create_pool()`
+        start_method = options.get('start-method') or None
+        if start_method is not None:
+            from multiprocessing import get_all_start_methods
+            if start_method not in get_all_start_methods():
+                print(f"Invalid start method: {start_method}", file=sys.stderr)
+                return ExitCode.ArgError.value
+
+        if "capabilities" in options:
+            if "names" in options:
+                capabilities = load_capabilities(found_engines)
+                print(",".join((e for e in found_engines if capabilities.get(e) is not None)))
                 return ExitCode.OK.value
 
             print(get_capabilities(found_engines))
             return ExitCode.OK.value
-        elif len(sys.argv) < 4:
+        elif "serve" in options:
+            import enginestats
+            # import engines before the pool is created so forked workers inherit them
+            served_engines = [e for e in found_engines if import_engine(e) is not None]
+            processes = max(MAX_THREADS, 1) if THREADED else 1
+            cancelled_searches = _CancelledSearches()
+            tracing.start_trace()
+            with create_pool(processes, served_engines, cancelled_searches, start_method) as pool:
+                SearchServer(served_engines, pool, processes, enginestats.StatsStore(ENGINE_STATS_PATH),
+                             cancelled_searches).serve()
+            return ExitCode.OK.value
+        elif "stats" in options:
+            import enginestats
+            engine_stats = enginestats.StatsStore(ENGINE_STATS_PATH).stats()
+            print(json.dumps({e: engine_stats[e]._asdict() for e in found_engines if e in engine_stats}, indent=2))
+            return ExitCode.OK.value
+        elif len(args) < 3:
             print(prog_usage, file=sys.stderr)
             return ExitCode.ArgError.value
 
+        executor = options.get('executor', 'pool')
+        if executor not in ('pool', 'async', 'serial'):
+            print(f"Invalid executor: {executor}", file=sys.stderr)
+            return ExitCode.ArgError.value
+
+        try:
+            output_format = novaprinter.OutputFormat(options.get('format', novaprinter.OutputFormat.Text.value))
+        except ValueError:
+            print(f"Invalid format: {options['format']}", file=sys.stderr)
+            return ExitCode.ArgError.value
+
+        timeout = None
+        if "timeout" in options:
+            try:
+                timeout = float(options["timeout"])
+                if timeout <= 0:
+                    raise ValueError
+            except ValueError:
+                print(f"Invalid timeout: {options['timeout']}", file=sys.stderr)
+                return ExitCode.ArgError.value
+
+        max_entries = None
+        if "merge" in options:
+            try:
+                max_entries = int(options["merge"]) if options["merge"] else 10000
+                if max_entries <= 0:
+                    raise ValueError
+            except ValueError:
+                print(f"Invalid merge limit: {options['merge']}", file=sys.stderr)
+                return ExitCode.ArgError.value
+
+        # filters are applied by the engines' processes, so the dropped results are never printed
+        filter_options: dict[str, Callable[[str], Any]] = {
+            'min-seeds': int, 'min-size': novaprinter.anySizeToBytes, 'max-size': novaprinter.anySizeToBytes,
+            'min-pub-date': int, 'max-pub-date': int, 'include': str, 'exclude': str}
+        result_filter = None
+        try:
+            filter_fields = {option.replace('-', '_'): parse(options[option])
+                             for option, parse in filter_options.items() if option in options}
+            if (filter_fields.get('min_size', 0) < 0) or (filter_fields.get('max_size', 0) < 0):
+                raise ValueError("Invalid size")
+            if len(filter_fields) > 0:
+                result_filter = resultfilter.ResultFilter(**filter_fields)
+                result_filter.validate()
+        except ValueError as e:
+            print(f"Invalid filter: {e}", file=sys.stderr)
+            return ExitCode.ArgError.value
+
+        ranking = None
+        if "top" in options:
+            count, _, order = options["top"].partition(':')
+            try:
+                ranking = resultfilter.Ranking(int(count), (order or 'seeds'),
+                                               tuple(term.lower() for term in ' '.join(args[2:]).split()))
+                if (ranking.count <= 0) or (ranking.order not in ('seeds', 'relevance')):
+                    raise ValueError
+            except ValueError:
+                print(f"Invalid top: {options['top']}", file=sys.stderr)
+                return ExitCode.ArgError.value
+
         # get unique engines
-        engs = set(arg.strip().lower() for arg in sys.argv[1].split(','))
+        engs = set(arg.strip().lower() for arg in args[0].split(','))
         engines = found_engines if 'all' in engs else [e for e in found_engines if e in engs]
 
-        cat = sys.argv[2].lower()
+        cat = args[1].lower()
         try:
             category = Category[cat]
         except KeyError:
             print(f"Invalid category: {cat}", file=sys.stderr)
             return ExitCode.ArgError.value
 
-        what = urllib.parse.quote(' '.join(sys.argv[3:]))
-        params = ((engine_class, what, category) for e in engines if (engine_class := import_engine(e)) is not None)
+        # start the fast and reliable engines first
+        import enginestats
+        stats_store = enginestats.StatsStore(ENGINE_STATS_PATH)
+        engine_stats = stats_store.stats()
+        engines = enginestats.schedule(engines, engine_stats)
+        skipped = []
+        if "skip-failing" in options:
+            skipped = [e for e in engines if (e in engine_stats) and engine_stats[e].circuit_open]
+            engines = [e for e in engines if e not in skipped]
+
+        what = urllib.parse.quote(' '.join(args[2:]))
+        serial = 1  # the only search of the process
+        jobs = [SearchJob(engine_class, what, category, timeout=timeout, output_format=output_format,
+                          collect=((max_entries is not None) or (ranking is not None)),
+                          result_filter=result_filter, ranking=ranking, serial=serial)
+                for e in engines if (engine_class := import_engine(e)) is not None]
+
+        # collected results are merged, then ranked, then printed
+        outputs: dict[str, novaprinter.PrintContext] = {}
 
-        search_success = False
-        if THREADED:
-            processes = max(min(len(engines), MAX_THREADS), 1)
-            with Pool(processes) as pool:
-                search_success = all(pool.map(run_search, params))
+        def output(engine: str, record: novaprinter.ResultRecord) -> None:
+            if engine not in outputs:
+                outputs[engine] = novaprinter.PrintContext(None, engine, output_format)
+            outputs[engine].emit(record)
+
+        top = resultfilter.TopResults(ranking) if (ranking is not None) else None
+        ranked = top.push if (top is not None) else output
+        merger = resultmerger.ResultMerger(ranked, max_entries) if (max_entries is not None) else None
+        merged = merger.add if (merger is not None) else ranked
+        merged_lock = threading.Lock()
+        merging = True
+
+        def collected(engine: str, record: novaprinter.ResultRecord) -> None:
+            # results arrive as the engines find them, from the threads of the engines or from `_receive_results()`,
+            # those of abandoned engines still running once the output is finished are dropped
+            with merged_lock:
+                if merging:
+                    merged(engine, record)
+
+        def finish_output() -> None:
+            nonlocal merging
+            with merged_lock:
+                merging = False
+            if merger is not None:
+                merger.finish()
+            if top is not None:
+                for engine, record in top.results():
+                    output(engine, record)
+            for context in outputs.values():
+                context.flush()
+
+        reports: list[EngineReport] = []
+
+        def completed(report: EngineReport) -> None:
+            print_report(report)
+            if report.status not in (SearchStatus.Skipped, SearchStatus.Cancelled):
+                stats_store.record(report.engine, report.status.value, report.results, report.elapsed_ms)
+            for record in report.collected:
+                collected(report.engine, record)
+            reports.append(report._replace(collected=()))
+
+        for engine in skipped:
+            completed(EngineReport(engine, SearchStatus.Skipped, 0, 0))
+
+        # see `tracing`, the search spans are reported by the processes running the engines
+        tracing.start_trace()
+
+        global _result_sink
+        _result_sink = collected
+
+        if executor == 'async':
+            import asyncio
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(run_searches_async(jobs, completed))
+            finish_output()
+            if any((report.status in (SearchStatus.Timeout, SearchStatus.Cancelled)) for report in reports):
+                # abandoned engines still running in worker threads would keep the interpreter from exiting
+                novaprinter.outputWriter.flush()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(ExitCode.AppError.value)
+            loop.close()
         else:
-            search_success = all(map(run_search, params))
+            # SIGTERM stops the search within moments, the results found so far are still printed
+            global _cancelled_searches
+            cancelled_searches = _cancelled_searches = _CancelledSearches()
+            search_token = cancellation.CancellationToken()
+
+            def cancel_search(signum: int, frame: Any) -> None:
+                cancelled_searches.add(serial)
+                search_token.cancel()
+                cancelled_searches.notify_workers()
+                # the engine running in this process, without pool
+                _cancel_running_search(signum, frame)
+
+            signal.signal(signal.SIGTERM, cancel_search)
+
+            if THREADED and (executor == 'pool'):
+                processes = max(min(len(jobs), MAX_THREADS), 1)
+                imported_engines = [e for e in engines if import_engine(e) is not None]
+                from multiprocessing import get_context
+
+                results = get_context(start_method).SimpleQueue() if (max_entries is not None) else None
+                with create_pool(processes, imported_engines, cancelled_searches, start_method, results) as pool:
+                    receiver = None
+                    if results is not None:
+                        receiver = threading.Thread(target=_receive_results, args=(results, collected),
+                                                    name='nova2-results', daemon=True)
+                        receiver.start()
+                    for report in run_searches(pool, processes, jobs, search_token):
+                        completed(report)
+                    if receiver is not None:
+                        results.put(None)  # type: ignore[union-attr]
+                        receiver.join()
+            else:
+                # the remaining jobs find their serial cancelled
+                for report in map(run_search, jobs):
+                    completed(report)
+            finish_output()
 
+        search_success = all((report.status in (SearchStatus.OK, SearchStatus.Skipped)) for report in reports)
         return ExitCode.OK.value if search_success else ExitCode.AppError.value
 
     sys.exit(main())
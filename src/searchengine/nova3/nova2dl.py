@@ -1,4 +1,4 @@
-#VERSION: 1.24
+#VERSION: 1.31
 
 # Author:
 #  Christophe DUMEZ (chris@qbittorrent.org)
@@ -29,35 +29,216 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import contextvars
 import importlib
 import pathlib
+import signal
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import FrameType
+from typing import Iterable, NoReturn, Optional, TextIO
 
 # qbt tend to run this script in 'isolate mode' so append the current path manually
 current_path = str(pathlib.Path(__file__).parent.resolve())
 if current_path not in sys.path:
     sys.path.append(current_path)
 
-from helpers import download_file
+import cancellation
+import helpers
+from helpers import MAX_CONNECTIONS_PER_HOST, download_file, magnet_link
 
-if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        raise SystemExit('./nova2dl.py engine_name download_parameter')
+USAGE = ('./nova2dl.py [--resolve] engine_name download_parameter\n'
+         './nova2dl.py --batch [--workers=N] [--resolve] [engine_name:download_parameter ...]')
 
-    engine_name = sys.argv[1].strip()
-    download_param = sys.argv[2].strip()
+# cache of the description pages with `--resolve`
+DESC_PAGE_CACHE_TTL: float = 600
+DESC_PAGE_CACHE_SIZE: int = 4 * 1024 * 1024
 
-    try:
-        module = importlib.import_module("engines." + engine_name)
-        engine_class = getattr(module, engine_name)
-        engine = engine_class()
-    except Exception as e:
-        print(repr(e))
-        raise SystemExit('./nova2dl.py: this engine_name was not recognized')
 
+def raise_cancelled(signum: int, frame: Optional[FrameType]) -> NoReturn:
+    raise cancellation.SearchCancelled()
+
+
+_engines: dict[str, type] = {}
+_enginesLock = threading.Lock()
+
+
+def load_engine(engine_name: str) -> type:
+    """ Return the class of the engine, engines are imported once
+
+        Only the class is shared: engines keep the state of a download on `self`, so every download creates
+        its own instance.
+    """
+
+    with _enginesLock:
+        engine_class = _engines.get(engine_name)
+        if engine_class is None:
+            module = importlib.import_module("engines." + engine_name)
+            engine_class = _engines[engine_name] = getattr(module, engine_name)
+        return engine_class
+
+
+def is_magnet_uri(download_param: str) -> bool:
+    return download_param.strip()[:7].lower() == 'magnet:'
+
+
+def download(engine_name: str, download_param: str) -> None:
+    # magnet links need neither the engine nor a request
+    if is_magnet_uri(download_param):
+        print(f"{download_param.strip()} {download_param}")
+        return
+
+    engine = load_engine(engine_name)()
     if hasattr(engine, 'download_torrent'):
+        # engines may use info-hashes as the ids of their torrents
         engine.download_torrent(download_param)
+    elif (magnet := magnet_link(download_param)) is not None:
+        print(f"{magnet} {download_param}")
     else:
-        print(download_file(download_param))
+        print(download_file(download_param, expect_torrent=True))
+
+
+class LineOutput:
+    """ Stand-in for `sys.stdout` when downloading on several threads
+
+        The text printed by every thread is written out line by line, so the `path url` lines of concurrent
+        downloads are never mixed up, and flushed at once, so qbt sees every download as soon as it completes.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+
+    def write(self, text: str) -> int:
+        lines, newline, rest = (getattr(self._pending, 'text', '') + text).rpartition('\n')
+        self._pending.text = rest
+        if newline:
+            with self._lock:
+                self._stream.write(lines + newline)
+                self._stream.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        """ Write out the unterminated line printed by the current thread """
+
+        rest = getattr(self._pending, 'text', '')
+        if rest:
+            self.write('\n')
+
+
+def download_batch(downloads: Iterable[str], workers: int = MAX_CONNECTIONS_PER_HOST) -> bool:
+    """ Download the `engine_name:download_parameter` pairs, `workers` at a time
+
+        The downloads share the keep-alive connections of `httpclient`, so the downloads from the same site
+        reuse the connection of the previous ones. Every engine prints the `path url` line of its downloads as
+        usual, the downloads that fail are reported on stderr.
+        Returns whether all the downloads succeeded.
+    """
+
+    output = LineOutput(sys.stdout)
+    succeeded = True
+
+    def run(engine_name: str, download_param: str) -> None:
+        try:
+            download(engine_name, download_param)
+        finally:
+            output.flush()
+
+    token = cancellation.CancellationToken()
+    cancellation.currentToken.set(token)
+    stdout = sys.stdout
+    sys.stdout = output  # type: ignore[assignment]
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='nova2dl')
+    try:
+        futures = {}
+        for pair in downloads:
+            engine_name, _, download_param = pair.strip().partition(':')
+            if (not engine_name) or (not download_param):
+                print(f"nova2dl: invalid download '{pair.strip()}', expected engine_name:download_parameter", file=sys.stderr)
+                succeeded = False
+                continue
+            future = executor.submit(contextvars.copy_context().run, run, engine_name.strip(), download_param.strip())
+            futures[future] = pair.strip()
+
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                print(f"nova2dl: {futures[future]}: {error!r}", file=sys.stderr)
+                succeeded = False
+    except cancellation.SearchCancelled:
+        token.cancel()
+        raise
+    finally:
+        # waits for the running downloads to remove their files when cancelled
+        executor.shutdown(wait=True, cancel_futures=True)
+        sys.stdout = stdout
+    return succeeded
+
+
+def enable_desc_page_resolution() -> None:
+    """ Look for the torrents in the description pages the engines download, see `helpers.resolveDescPages`
+
+        The pages are cached, so adding another result of the same page needs no request.
+    """
+
+    helpers.resolveDescPages = True
+    if helpers.responseCache is None:
+        helpers.enable_response_cache(DESC_PAGE_CACHE_TTL, DESC_PAGE_CACHE_SIZE,
+                                      str(pathlib.Path(current_path) / 'desc_page_cache.sqlite'))
+
+
+if __name__ == '__main__':
+    # unwind on termination so `download_file()` removes the partially written file
+    signal.signal(signal.SIGTERM, raise_cancelled)
+    # qbt adds whatever is downloaded, an error page must not get to it as a torrent
+    helpers.expectTorrents = True
+
+    args = sys.argv[1:]
+    options = []
+    while (len(args) > 0) and args[0].startswith('--'):
+        options.append(args.pop(0))
+
+    batch = False
+    workers = MAX_CONNECTIONS_PER_HOST
+    for option in options:
+        if option == '--batch':
+            batch = True
+        elif option == '--resolve':
+            enable_desc_page_resolution()
+        elif option.startswith('--workers='):
+            try:
+                workers = int(option.partition('=')[2])
+            except ValueError:
+                raise SystemExit(USAGE)
+        else:
+            raise SystemExit(USAGE)
+
+    if batch:
+        # the pairs are read from stdin when none is given
+        pairs = args if (len(args) > 0) else (line for line in sys.stdin if line.strip())
+        try:
+            sys.exit(0 if download_batch(pairs, workers) else 1)
+        except cancellation.SearchCancelled:
+            sys.exit(1)
+
+    if len(args) < 2:
+        raise SystemExit(USAGE)
+
+    engine_name = args[0].strip()
+    download_param = args[1].strip()
+
+    if not is_magnet_uri(download_param):
+        try:
+            load_engine(engine_name)
+        except Exception as e:
+            print(repr(e))
+            raise SystemExit('./nova2dl.py: this engine_name was not recognized')
+
+    try:
+        download(engine_name, download_param)
+    except cancellation.SearchCancelled:
+        sys.exit(1)
 
     sys.exit(0)
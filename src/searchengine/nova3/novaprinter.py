@@ -1,4 +1,4 @@
-#VERSION: 1.52
+#VERSION: 1.66
 
 # Redistribution and use in source and binary forms, with or without
 # modification, are permitted provided that the following conditions are met:
@@ -24,8 +24,27 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import atexit
+import json
+import os
 import re
-from typing import TypedDict, Union
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, TypedDict, Union
+
+import cancellation
+import tracing
+
+if TYPE_CHECKING:
+    from resultfilter import ResultFilter, TopResults
+
+try:
+    from select import PIPE_BUF
+except ImportError:  # not available on Windows
+    PIPE_BUF = 4096
 
 SearchResults = TypedDict('SearchResults', {
     'link': str,
@@ -39,7 +58,212 @@ SearchResults = TypedDict('SearchResults', {
 })
 
 
+class ResultWriter:
+    """ Buffers the lines written to stdout and writes them in batches
+
+        The buffer is written out when it would exceed `PIPE_BUF`, at the latest `FLUSH_INTERVAL` after a line was
+        buffered, by a timer when no other line follows, and on `flush()`, which nova2 calls when an engine completes.
+        Each write only contains whole lines and is at most `PIPE_BUF` bytes unless a single line is longer,
+        so lines of processes sharing the stdout pipe are never interleaved.
+    """
+
+    PIPE_BUF: int = PIPE_BUF
+    FLUSH_INTERVAL: float = 0.1  # seconds
+
+    def __init__(self, fd: int = 1) -> None:
+        self._fd = fd
+        # reentrant as nova2 may interrupt a write with a timeout signal and flush from the handler
+        self._lock = threading.RLock()
+        self._clear()
+
+    def write(self, line: str) -> None:
+        data = (line + '\n').encode('utf-8')
+        with self._lock:
+            if (self._size + len(data)) > self.PIPE_BUF:
+                self._write()
+            self._buffer.append(data)
+            self._size += len(data)
+            if (self._size >= self.PIPE_BUF) or ((time.monotonic() - self._lastWrite) >= self.FLUSH_INTERVAL):
+                self._write()
+            elif self._timer is None:
+                # the engine may not print another line for a while, e.g. while it fetches its next page
+                self._timer = _flushTimer(self._flushFromTimer)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def _flushFromTimer(self) -> None:
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+                self._write()
+
+    def _write(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._size > 0:
+            data = memoryview(b''.join(self._buffer))
+            self._buffer.clear()
+            self._size = 0
+            with tracing.span('write', 'output', bytes=len(data)):
+                while len(data) > 0:
+                    data = data[os.write(self._fd, data):]
+        self._lastWrite = time.monotonic()
+
+    def _clear(self) -> None:
+        self._buffer: list[bytes] = []
+        self._size = 0
+        self._lastWrite = time.monotonic()
+        # the timer thread of a parent process does not exist in its forked children
+        self._timer: Optional[threading.Timer] = None
+
+
+def _flushTimer(flush: Callable[[], None]) -> threading.Timer:
+    """ Start a timer calling `flush` after `ResultWriter.FLUSH_INTERVAL` """
+
+    timer = threading.Timer(ResultWriter.FLUSH_INTERVAL, flush)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+# fd 1 is stdout
+outputWriter = ResultWriter(1)
+atexit.register(outputWriter.flush)
+# a forked child process must not write the lines buffered by its parent again
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=outputWriter._clear)
+
+
+class OutputFormat(Enum):
+    # one result per line, fields separated by `|`
+    Text = 'text'
+    # one JSON object per line, holding a batch of results of one engine with typed fields:
+    # {"event": "results", "engine": "engine1", "results": [{"link": "...", "name": "...", "size": 1024, ...}, ...]}
+    # `nova2.py --serve` also adds the search id as "id"
+    NDJSON = 'ndjson'
+
+
+ResultRecord = dict[str, Any]  # see `resultRecord()`
+
+
+class PrintContext:
+    """ State of the engine search that results are printed for, see `printContext` """
+
+    def __init__(self, searchTag: Optional[str] = None, engine: str = '', outputFormat: OutputFormat = OutputFormat.Text,
+                 sink: Optional[Callable[[str, ResultRecord], None]] = None,
+                 resultFilter: Optional['ResultFilter'] = None, top: Optional['TopResults'] = None) -> None:
+        # Set by `nova2.py --serve` to the id of the search the running engine belongs to
+        self.searchTag = searchTag
+        self.engine = engine
+        self.outputFormat = outputFormat
+        self.resultCount = 0
+        # when set, results are passed to `sink` with the engine name for nova2 to merge them instead of being printed
+        self.sink = sink
+        # results not matching the filter are dropped, when `top` is set only the best results are collected
+        self.resultFilter = resultFilter
+        self.top = top
+
+        # serialized results of the current NDJSON batch, written out by `_timer` if the engine prints no other result
+        # in time. Reentrant as nova2 flushes from a timeout signal handler.
+        self._batch: list[str] = []
+        self._batchSize = 0
+        self._batchStart = 0.0
+        self._batchLock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        head = {'id': searchTag} if (searchTag is not None) else {}
+        head.update({'event': 'results', 'engine': engine})
+        self._batchHead = json.dumps(head, ensure_ascii=False)[:-1] + ', "results": ['
+
+    def emit(self, record: ResultRecord) -> None:
+        """ Print the result in the output format """
+
+        if self.outputFormat == OutputFormat.Text:
+            outputWriter.write(textLine(record))
+            return
+
+        serialized = json.dumps(record, ensure_ascii=False)
+        recordSize = len(serialized.encode('utf-8')) + 2  # with the separator
+        with self._batchLock:
+            # keep batches within a single atomic write
+            if (self._batchSize + recordSize) > (ResultWriter.PIPE_BUF - len(self._batchHead.encode('utf-8')) - 3):
+                self.flush()
+            if len(self._batch) == 0:
+                self._batchStart = time.monotonic()
+                self._timer = _flushTimer(self._flushFromTimer)
+            self._batch.append(serialized)
+            self._batchSize += recordSize
+            if (time.monotonic() - self._batchStart) >= ResultWriter.FLUSH_INTERVAL:
+                self.flush()
+
+    def collectedResults(self) -> list[ResultRecord]:
+        """ Return the best results of the engine when `top` is set """
+
+        if self.top is not None:
+            return [record for _, record in self.top.results()]
+        return []
+
+    def flush(self) -> None:
+        """ Write out the pending batch of results, nova2 calls it when the engine completes """
+
+        with self._batchLock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(self._batch) > 0:
+                outputWriter.write(self._batchHead + ', '.join(self._batch) + ']}')
+                self._batch.clear()
+                self._batchSize = 0
+            outputWriter.flush()
+
+    def _flushFromTimer(self) -> None:
+        with self._batchLock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+                self.flush()
+
+
+# Set by nova2 for every engine search it runs. A context variable rather than a plain global
+# as several engines may share one process when they run on threads or an event loop.
+printContext: ContextVar[PrintContext] = ContextVar('printContext')
+# The context of the search run by the main thread of the process, for the threads an engine started before its
+# search that do not inherit `printContext`. Set by nova2 where a process runs one engine at a time.
+defaultContext: Optional[PrintContext] = None
+# Whether results printed without any context are written as text lines, cleared by nova2 when the output is not
+# plain text as such lines would break it
+textFallback: bool = True
+_droppedResults = 0
+
+
 def prettyPrinter(dictionary: SearchResults) -> None:
+    global _droppedResults
+    context = printContext.get(None)
+    if context is None:
+        context = defaultContext
+    if context is not None:
+        # stops engines parsing on after their search was cancelled
+        cancellation.raise_if_cancelled()
+        record = resultRecord(dictionary)
+        if (context.resultFilter is not None) and (not context.resultFilter.matches(record)):
+            return
+        context.resultCount += 1
+        if context.top is not None:
+            context.top.push(context.engine, record)
+        elif context.sink is not None:
+            context.sink(context.engine, record)
+        else:
+            context.emit(record)
+        return
+
+    if not textFallback:
+        _droppedResults += 1
+        if _droppedResults == 1:
+            print("Result printed outside of any search dropped, the search results are not plain text",
+                  file=sys.stderr)
+        return
+
     outtext = "|".join((
         dictionary["link"],
         dictionary["name"].replace("|", " "),
@@ -50,13 +274,67 @@ def prettyPrinter(dictionary: SearchResults) -> None:
         dictionary.get("desc_link", ""),  # Optional
         str(dictionary.get("pub_date", -1))  # Optional
     ))
+    outputWriter.write(outtext)
+
+
+def textLine(record: ResultRecord) -> str:
+    """ Format the result record as a line of `|` separated fields """
+
+    return "|".join((
+        record["link"],
+        record["name"].replace("|", " "),
+        str(record["size"]),
+        str(record["seeds"]),
+        str(record["leech"]),
+        record["engine_url"],
+        record["desc_link"],
+        str(record["pub_date"])
+    ))
+
+
+def resultRecord(dictionary: SearchResults) -> ResultRecord:
+    """ Return the result as a dict with normalized, typed values """
+
+    return {
+        'link': dictionary["link"],
+        'name': dictionary["name"],
+        'size': anySizeToBytes(dictionary['size']),
+        'seeds': _toInt(dictionary["seeds"]),
+        'leech': _toInt(dictionary["leech"]),
+        'engine_url': dictionary["engine_url"],
+        'desc_link': dictionary.get("desc_link", ""),  # Optional
+        'pub_date': _toInt(dictionary.get("pub_date", -1))  # Optional
+    }
 
-    # fd 1 is stdout
-    with open(1, 'w', encoding='utf-8', closefd=False) as utf8stdout:
-        print(outtext, file=utf8stdout)
 
+def _toInt(value: object) -> int:
+    try:
+        return int(value)  # type: ignore[call-overload]
+    except (TypeError, ValueError):
+        return -1
+
+
+# A number followed by an optional unit. The number is either a plain decimal number (`size`)
+# or has thousands separators and a comma or dot as decimal mark (`grouped`).
+sizeUnitRegex: re.Pattern[str] = re.compile(r"\s*(?:(?P<size>\d*\.?\d+)(?!\d|[,.' \u00a0\u202f]\d)"
+                                            r"|(?P<grouped>\d+(?:[,.' \u00a0\u202f]\d+)+|,\d+)) *(?P<unit>[a-z]+)?",
+                                            re.IGNORECASE)
+# separators that never are a decimal mark
+_groupSeparators = str.maketrans('', '', "' \u00a0\u202f")
+
+# Multipliers of the units, by lower case unit. The SI symbols (KB, MB, ...) are binary multiples like the IEC ones
+# (KiB, MiB, ...), see `anySizeToBytes()`.
+sizeUnits: dict[str, int] = {'b': 1, 'byte': 1, 'bytes': 1, 'o': 1, 'octets': 1}
+for _exponent, (_prefix, _name) in enumerate((('k', 'kilo'), ('m', 'mega'), ('g', 'giga'), ('t', 'tera'), ('p', 'peta')), 1):
+    for _unit in (_prefix, f'{_prefix}b', f'{_prefix}ib', f'{_prefix}o', f'{_name}byte', f'{_name}bytes',
+                  f'{_name[:2]}bibyte', f'{_name[:2]}bibytes', f'{_name}octets'):
+        sizeUnits[_unit] = 2**(10 * _exponent)
+# unknown units are looked up by their first letter, as in 'Kbytes'
+_sizeUnitsByLetter: dict[str, int] = {unit: multiplier for unit, multiplier in sizeUnits.items() if len(unit) == 1}
 
-sizeUnitRegex: re.Pattern[str] = re.compile(r"^(?P<size>\d*\.?\d+) *(?P<unit>[a-z]+)?", re.IGNORECASE)
+# The same sizes recur a lot in the results of a search, the parsed ones are kept until there are too many
+_sizeCache: dict[str, int] = {}
+SIZE_CACHE_SIZE = 16384
 
 
 # TODO: use `float | int | str` when using Python >= 3.10
@@ -66,6 +344,11 @@ def anySizeToBytes(size_string: Union[float, int, str]) -> int:
 
     The canonical type for `size_string` is `str`. However numeric types are also accepted in order to
     accommodate poorly written plugins.
+    KB, MB, GB, ... are read as 1024-based like KiB, MiB, GiB, ... rather than as the 1000-based SI multiples:
+    it is what they always meant here, and the sizes of most sites are binary multiples whatever their symbol.
+    Both '1,234.5 MB' and '1.234,5 MB' are 1234.5 MB. A single comma or dot is a decimal mark, so '1,234 MB' and
+    '1.234 MB' are both 1.234 MB, except in sizes of bytes where '1,234 B' and '1.234 B' are 1234 bytes.
+    Returns -1 when the size is not recognized.
     """
 
     if isinstance(size_string, int):
@@ -73,16 +356,58 @@ def anySizeToBytes(size_string: Union[float, int, str]) -> int:
     if isinstance(size_string, float):
         return round(size_string)
 
-    match = sizeUnitRegex.match(size_string.strip())
+    size = _sizeCache.get(size_string)
+    if size is None:
+        if len(_sizeCache) >= SIZE_CACHE_SIZE:
+            _sizeCache.clear()
+        size = _sizeCache[size_string] = _parseSize(size_string)
+    return size
+
+
+# TODO: use `float | int | str` when using Python >= 3.10
+def anySizesToBytes(size_strings: Iterable[Union[float, int, str]]) -> list[int]:
+    """ Convert all the sizes like `anySizeToBytes()` does """
+
+    cache = _sizeCache
+    return [(cache[size] if (size in cache) else anySizeToBytes(size)) for size in size_strings]
+
+
+def _parseSize(size_string: str) -> int:
+    match = sizeUnitRegex.match(size_string)
     if match is None:
         return -1
 
-    size = float(match.group('size'))  # need to match decimals
-    unit = match.group('unit')
-
+    number, grouped, unit = match.groups()
+    multiplier = 1
     if unit is not None:
-        units_exponents = {'T': 40, 'G': 30, 'M': 20, 'K': 10}
-        exponent = units_exponents.get(unit[0].upper(), 0)
-        size *= 2**exponent
+        multiplier = sizeUnits.get(unit.lower()) or _sizeUnitsByLetter.get(unit[0].lower(), 1)
+    if grouped is not None:
+        number = _normalizeNumber(grouped, multiplier == 1)
+    elif (multiplier == 1) and ('.' in number):
+        number = _normalizeNumber(number, True)
+    return round(float(number) * multiplier)
+
+
+def _normalizeNumber(number: str, integral: bool) -> str:
+    """ Return the number with a dot as decimal mark and without thousands separators
+
+        A single comma or dot followed by three digits is ambiguous, it is a thousands separator when the number is
+        `integral`, i.e. of bytes, and a decimal mark otherwise.
+    """
 
-    return round(size)
+    number = number.translate(_groupSeparators)
+    commas = number.count(',')
+    dots = number.count('.')
+    if (commas + dots) == 0:
+        return number
+    if (commas + dots) == 1:
+        if integral and ((len(number) - max(number.find(','), number.find('.'))) == 4):
+            return number.replace(',', '').replace('.', '')
+        return number.replace(',', '.')
+    if (commas > 0) and (dots > 0):
+        # the last of both marks is the decimal one
+        if number.rfind(',') > number.rfind('.'):
+            return number.replace('.', '').replace(',', '.')
+        return number.replace(',', '')
+    # several of the same mark
+    return number.replace(',', '').replace('.', '')
@@ -0,0 +1,120 @@
+#VERSION: 1.00
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Filtering and ranking of the results, applied where the engines run so dropped results are never printed """
+
+import heapq
+import itertools
+import re
+from typing import NamedTuple, Optional
+
+from novaprinter import ResultRecord
+
+
+class ResultFilter(NamedTuple):
+    """ Bounds the results must satisfy, results whose value is unknown (-1) fail the bounds on it """
+
+    min_seeds: Optional[int] = None
+    min_size: Optional[int] = None  # bytes
+    max_size: Optional[int] = None
+    min_pub_date: Optional[int] = None  # Unix time
+    max_pub_date: Optional[int] = None
+    include: Optional[str] = None  # regular expression the name must match, case insensitive
+    exclude: Optional[str] = None  # regular expression the name must not match, case insensitive
+
+    def validate(self) -> None:
+        """ Raise `ValueError` when a field is invalid """
+
+        for field in ('min_seeds', 'min_size', 'max_size', 'min_pub_date', 'max_pub_date'):
+            value = getattr(self, field)
+            if (value is not None) and ((not isinstance(value, int)) or isinstance(value, bool)):
+                raise ValueError(f"{field} must be an integer")
+        for field in ('include', 'exclude'):
+            value = getattr(self, field)
+            if value is not None:
+                try:
+                    re.compile(value)
+                except (re.error, TypeError) as e:
+                    raise ValueError(f"Invalid {field} expression: {e}")
+
+    def matches(self, record: ResultRecord) -> bool:
+        if (self.min_seeds is not None) and (record['seeds'] < self.min_seeds):
+            return False
+        size = record['size']
+        if ((self.min_size is not None) or (self.max_size is not None)) and (size < 0):
+            return False
+        if ((self.min_size is not None) and (size < self.min_size)) or ((self.max_size is not None) and (size > self.max_size)):
+            return False
+        pub_date = record['pub_date']
+        if ((self.min_pub_date is not None) or (self.max_pub_date is not None)) and (pub_date < 0):
+            return False
+        if (((self.min_pub_date is not None) and (pub_date < self.min_pub_date))
+                or ((self.max_pub_date is not None) and (pub_date > self.max_pub_date))):
+            return False
+        # `re` caches the compiled expressions
+        if (self.include is not None) and (re.search(self.include, record['name'], re.IGNORECASE) is None):
+            return False
+        if (self.exclude is not None) and (re.search(self.exclude, record['name'], re.IGNORECASE) is not None):
+            return False
+        return True
+
+
+class Ranking(NamedTuple):
+    """ Keep only the `count` best results, by seeds or by relevance to the search terms """
+
+    count: int
+    order: str = 'seeds'  # or 'relevance'
+    terms: tuple[str, ...] = ()  # lower case search terms, for the relevance order
+
+    def key(self, record: ResultRecord) -> tuple[int, ...]:
+        if self.order == 'relevance':
+            name = record['name'].lower()
+            return (sum(1 for term in self.terms if term in name), record['seeds'], record['leech'])
+        return (record['seeds'], record['leech'])
+
+
+class TopResults:
+    """ Bounded heap of the best results according to a `Ranking` """
+
+    def __init__(self, ranking: Ranking) -> None:
+        self._ranking = ranking
+        # the worst result on top, later results lose ties
+        self._heap: list[tuple[tuple[int, ...], int, str, ResultRecord]] = []
+        self._order = itertools.count(0, -1)
+
+    def push(self, engine: str, record: ResultRecord) -> None:
+        if self._ranking.count <= 0:
+            return
+        item = (self._ranking.key(record), next(self._order), engine, record)
+        if len(self._heap) < self._ranking.count:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    def results(self) -> list[tuple[str, ResultRecord]]:
+        """ Return the engines and records of the kept results, best first """
+
+        return [(engine, record) for _, _, engine, record in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
@@ -0,0 +1,136 @@
+#VERSION: 1.00
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import base64
+import binascii
+import re
+import urllib.parse
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Optional
+
+from novaprinter import ResultRecord
+
+_btihRegex = re.compile(r"xt=urn:btih:([0-9a-f]{40}|[a-z2-7]{32})(?![0-9a-z])", re.IGNORECASE)
+_btmhRegex = re.compile(r"xt=urn:btmh:1220([0-9a-f]{64})(?![0-9a-f])", re.IGNORECASE)
+# a bare SHA-1 info-hash in an url, e.g. https://example.com/torrent/<info-hash>
+_hexHashRegex = re.compile(r"(?<![0-9a-z])([0-9a-f]{40})(?![0-9a-z])", re.IGNORECASE)
+
+
+def info_hash(record: ResultRecord) -> Optional[str]:
+    """ Return the info-hash of the result found in its magnet or description link, `None` if there is none
+
+        v1 info-hashes are returned as lower case hex, v2 ones are prefixed with "v2:"
+    """
+
+    for url in (record['link'], record['desc_link']):
+        if '%' in url:
+            url = urllib.parse.unquote(url)
+
+        match = _btihRegex.search(url)
+        if match is not None:
+            value = match.group(1)
+            if len(value) == 40:
+                return value.lower()
+            try:
+                return base64.b32decode(value.upper()).hex()
+            except binascii.Error:
+                continue
+
+        match = _btmhRegex.search(url)
+        if match is not None:
+            return f"v2:{match.group(1).lower()}"
+
+        if not url.startswith('magnet:'):
+            match = _hexHashRegex.search(url)
+            if match is not None:
+                return match.group(1).lower()
+
+    return None
+
+
+class _MergedResult:
+    def __init__(self, engine: str, record: ResultRecord) -> None:
+        self.engine = engine  # engine of `record`
+        self.record = record
+        self.sources = [_source(engine, record)]
+
+
+def _source(engine: str, record: ResultRecord) -> dict[str, str]:
+    return {'engine': engine, 'link': record['link'], 'desc_link': record['desc_link']}
+
+
+class ResultMerger:
+    """ Merge the results of several engines describing the same torrent
+
+        Torrents are identified by the info-hash in their links, results without one are emitted right away.
+        A merged result keeps the fields of the result with the most seeds, the highest leechers count and the
+        links of all its sources. It is emitted when it is evicted from the index, which holds at most `max_entries`
+        results and evicts the least recently updated one, or by `finish()`.
+    """
+
+    def __init__(self, emit: Callable[[str, ResultRecord], None], max_entries: int = 10000) -> None:
+        """ @param emit Called with the engine and the record of every result to print """
+
+        self._emit = emit
+        self._max_entries = max(max_entries, 1)
+        self._index: OrderedDict[str, _MergedResult] = OrderedDict()
+
+    def add(self, engine: str, record: ResultRecord) -> None:
+        key = info_hash(record)
+        if key is None:
+            self._emit(engine, record)
+            return
+
+        merged = self._index.get(key)
+        if merged is None:
+            if len(self._index) >= self._max_entries:
+                self._emit_merged(*self._index.popitem(last=False))
+            self._index[key] = _MergedResult(engine, record)
+            return
+
+        self._index.move_to_end(key)
+        source = _source(engine, record)
+        if source not in merged.sources:
+            merged.sources.append(source)
+
+        leech = max(merged.record['leech'], record['leech'])
+        if record['seeds'] > merged.record['seeds']:
+            merged.engine = engine
+            merged.record = record
+        merged.record['leech'] = leech
+
+    def finish(self) -> None:
+        """ Emit all results still in the index """
+
+        while len(self._index) > 0:
+            self._emit_merged(*self._index.popitem(last=False))
+
+    def _emit_merged(self, key: str, merged: _MergedResult) -> None:
+        record = dict(merged.record)
+        record['info_hash'] = key
+        record['sources'] = merged.sources
+        self._emit(merged.engine, record)
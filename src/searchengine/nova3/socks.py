@@ -1,5 +1,16 @@
 """PySocks - A SOCKS proxy client and wrapper for Python.
-Version 1.7.1
+Version 1.7.1+qbittorrent.1
+
+Fork of PySocks 1.7.1 for the search engines of qBittorrent, which replaces
+this file on every update, so do not overwrite it with an upstream release.
+Changes from 1.7.1:
+- The SOCKS4, SOCKS5 and HTTP CONNECT negotiations are generators without
+  I/O, run by a blocking driver for socksocket and an asyncio one for
+  open_connection().
+- open_connection(), the asyncio equivalent of create_connection(). asyncio
+  is only imported when it is called.
+- socksocket.connect() accepts IPv6 destinations through SOCKS5 and HTTP
+  proxies, and HTTP CONNECT reads the whole response header.
 
 Copyright 2006 Dan-Haim. All rights reserved.
 
@@ -45,7 +56,7 @@ import socket
 import struct
 import sys
 
-__version__ = "1.7.1"
+__version__ = "1.7.1+qbittorrent.1"
 
 
 if os.name == "nt" and sys.version_info < (3, 0):
@@ -243,6 +254,325 @@ def create_connection(dest_pair,
     raise socket.error("gai returned empty list.")
 
 
+# The proxy protocols are implemented as generators independent of the I/O, so
+# that socksocket and open_connection() share them. A handshake yields either
+# bytes to send, the number of bytes to receive or _READ_LINE to receive a
+# line. The received bytes are sent back into the generator, which returns the
+# result of the negotiation.
+_READ_LINE = -1
+
+
+def _is_ip_address(host):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except socket.error:
+            continue
+    return False
+
+
+def _pack_SOCKS5_address(addr, rdns):
+    """
+    Return the host and port packed for the SOCKS5 protocol,
+    and the resolved address as a tuple object.
+    """
+    host, port = addr
+    family_to_byte = {socket.AF_INET: b"\x01", socket.AF_INET6: b"\x04"}
+
+    # If the given destination address is an IP address, we'll
+    # use the IP address request even if remote resolving was specified.
+    # Detect whether the address is IPv4/6 directly.
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            addr_bytes = socket.inet_pton(family, host)
+            host = socket.inet_ntop(family, addr_bytes)
+            return (family_to_byte[family] + addr_bytes
+                    + struct.pack(">H", port)), (host, port)
+        except socket.error:
+            continue
+
+    # Well it's not an IP number, so it's probably a DNS name.
+    if rdns:
+        # Resolve remotely
+        host_bytes = host.encode("idna")
+        packed = b"\x03" + chr(len(host_bytes)).encode() + host_bytes
+    else:
+        # Resolve locally
+        addresses = socket.getaddrinfo(host, port, socket.AF_UNSPEC,
+                                       socket.SOCK_STREAM,
+                                       socket.IPPROTO_TCP,
+                                       socket.AI_ADDRCONFIG)
+        # We can't really work out what IP is reachable, so just pick the
+        # first.
+        target_addr = addresses[0]
+        family = target_addr[0]
+        host = target_addr[4][0]
+
+        addr_bytes = socket.inet_pton(family, host)
+        packed = family_to_byte[family] + addr_bytes
+        host = socket.inet_ntop(family, addr_bytes)
+    return packed + struct.pack(">H", port), (host, port)
+
+
+def _read_SOCKS5_address():
+    """Handshake reading an address, returns it as a (host, port) tuple."""
+    atyp = yield 1
+    if atyp == b"\x01":
+        addr = socket.inet_ntoa((yield 4))
+    elif atyp == b"\x03":
+        length = yield 1
+        addr = yield ord(length)
+    elif atyp == b"\x04":
+        addr = socket.inet_ntop(socket.AF_INET6, (yield 16))
+    else:
+        raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
+
+    port = struct.unpack(">H", (yield 2))[0]
+    return addr, port
+
+
+def _SOCKS5_auth(username, password):
+    """Handshake of the SOCKS5 username/password authentication (RFC 1929)."""
+    yield (b"\x01" + chr(len(username)).encode() + username
+           + chr(len(password)).encode() + password)
+    auth_status = yield 2
+    if auth_status[0:1] != b"\x01":
+        # Bad response
+        raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
+    if auth_status[1:2] != b"\x00":
+        # Authentication failed
+        raise SOCKS5AuthError("SOCKS5 authentication failed")
+
+
+def _SOCKS5_handshake(cmd, dst, rdns, username, password):
+    """
+    Handshake sending a SOCKS5 request with given command (CMD field) and
+    address (DST field). Returns resolved DST address that was used and the
+    bound address.
+    """
+    # First we'll send the authentication packages we support.
+    if username and password:
+        # The username/password details were supplied to the
+        # set_proxy method so we support the USERNAME/PASSWORD
+        # authentication (in addition to the standard none).
+        yield b"\x05\x02\x00\x02"
+    else:
+        # No username/password were entered, therefore we
+        # only support connections with no authentication.
+        yield b"\x05\x01\x00"
+
+    # We'll receive the server's response to determine which
+    # method was selected
+    chosen_auth = yield 2
+
+    if chosen_auth[0:1] != b"\x05":
+        # Note: string[i:i+1] is used because indexing of a bytestring
+        # via bytestring[i] yields an integer in Python 3
+        raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
+
+    # Check the chosen authentication method
+
+    if chosen_auth[1:2] == b"\x02":
+        # Okay, we need to perform a basic username/password
+        # authentication.
+        if not (username and password):
+            # Although we said we don't support authentication, the
+            # server may still request basic username/password
+            # authentication
+            raise SOCKS5AuthError("No username/password supplied. "
+                                  "Server requested username/password"
+                                  " authentication")
+        yield from _SOCKS5_auth(username, password)
+
+    # No authentication is required if 0x00
+    elif chosen_auth[1:2] != b"\x00":
+        # Reaching here is always bad
+        if chosen_auth[1:2] == b"\xFF":
+            raise SOCKS5AuthError(
+                "All offered SOCKS5 authentication methods were"
+                " rejected")
+        else:
+            raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
+
+    # Now we can request the actual connection
+    packed, resolved = _pack_SOCKS5_address(dst, rdns)
+    yield b"\x05" + cmd + b"\x00" + packed
+
+    # Get the response
+    resp = yield 3
+    if resp[0:1] != b"\x05":
+        raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
+
+    status = ord(resp[1:2])
+    if status != 0x00:
+        # Connection failed: server returned an error
+        error = SOCKS5_ERRORS.get(status, "Unknown error")
+        raise SOCKS5Error("{:#04x}: {}".format(status, error))
+
+    # Get the bound address/port
+    bnd = yield from _read_SOCKS5_address()
+    return (resolved, bnd)
+
+
+def _SOCKS4_handshake(dest_addr, dest_port, rdns, username):
+    """Handshake of a SOCKS4 connection, returns the bound and peer
+    addresses."""
+    if ":" in dest_addr:
+        raise GeneralProxyError("SOCKS4 doesn't support IPv6: {}".format(
+            dest_addr))
+
+    # Check if the destination address provided is an IP address
+    remote_resolve = False
+    try:
+        addr_bytes = socket.inet_aton(dest_addr)
+    except socket.error:
+        # It's a DNS name. Check where it should be resolved.
+        if rdns:
+            addr_bytes = b"\x00\x00\x00\x01"
+            remote_resolve = True
+        else:
+            addr_bytes = socket.inet_aton(socket.gethostbyname(dest_addr))
+
+    # Construct the request packet
+    request = struct.pack(">BBH", 0x04, 0x01, dest_port) + addr_bytes
+
+    # The username parameter is considered userid for SOCKS4
+    if username:
+        request += username
+    request += b"\x00"
+
+    # DNS name if remote resolving is required
+    # NOTE: This is actually an extension to the SOCKS4 protocol
+    # called SOCKS4A and may not be supported in all cases.
+    if remote_resolve:
+        request += dest_addr.encode("idna") + b"\x00"
+    yield request
+
+    # Get the response from the server
+    resp = yield 8
+    if resp[0:1] != b"\x00":
+        # Bad data
+        raise GeneralProxyError("SOCKS4 proxy server sent invalid data")
+
+    status = ord(resp[1:2])
+    if status != 0x5A:
+        # Connection failed: server returned an error
+        error = SOCKS4_ERRORS.get(status, "Unknown error")
+        raise SOCKS4Error("{:#04x}: {}".format(status, error))
+
+    # Get the bound address/port
+    proxy_sockname = (socket.inet_ntoa(resp[4:]),
+                      struct.unpack(">H", resp[2:4])[0])
+    if remote_resolve:
+        proxy_peername = socket.inet_ntoa(addr_bytes), dest_port
+    else:
+        proxy_peername = dest_addr, dest_port
+    return proxy_sockname, proxy_peername
+
+
+def _proxy_authorization(username, password):
+    """Value of the Proxy-Authorization header of HTTP proxies."""
+    return b"basic " + b64encode(username + b":" + password)
+
+
+def _HTTP_handshake(dest_addr, dest_port, rdns, username, password):
+    """Handshake of an HTTP CONNECT tunnel, returns the bound and peer
+    addresses."""
+    # If we need to resolve locally, we do this now
+    addr = dest_addr
+    if not (rdns or _is_ip_address(dest_addr)):
+        addr = socket.gethostbyname(dest_addr)
+    authority = "[{}]".format(addr) if ":" in addr else addr
+    host = "[{}]".format(dest_addr) if ":" in dest_addr else dest_addr
+
+    http_headers = [
+        (b"CONNECT " + authority.encode("idna") + b":"
+         + str(dest_port).encode() + b" HTTP/1.1"),
+        b"Host: " + host.encode("idna")
+    ]
+
+    if username and password:
+        http_headers.append(b"Proxy-Authorization: "
+                            + _proxy_authorization(username, password))
+
+    http_headers.append(b"\r\n")
+
+    yield b"\r\n".join(http_headers)
+
+    # We just need the first line to check if the connection was successful
+    status_line = (yield _READ_LINE).decode("iso-8859-1")
+
+    if not status_line:
+        raise GeneralProxyError("Connection closed unexpectedly")
+
+    try:
+        proto, status_code, status_msg = status_line.split(" ", 2)
+    except ValueError:
+        raise GeneralProxyError("HTTP proxy server sent invalid response")
+
+    if not proto.startswith("HTTP/"):
+        raise GeneralProxyError(
+            "Proxy server does not appear to be an HTTP proxy")
+
+    try:
+        status_code = int(status_code)
+    except ValueError:
+        raise HTTPError(
+            "HTTP proxy server did not return a valid HTTP status")
+
+    if status_code != 200:
+        error = "{}: {}".format(status_code, status_msg)
+        if status_code in (400, 403, 405):
+            # It's likely that the HTTP proxy server does not support the
+            # CONNECT tunneling method
+            error += ("\n[*] Note: The HTTP proxy server may not be"
+                      " supported by PySocks (must be a CONNECT tunnel"
+                      " proxy)")
+        raise HTTPError(error)
+
+    # Skip the rest of the response header, the tunnel starts after it
+    while (yield _READ_LINE) not in (b"\r\n", b"\n", b""):
+        pass
+
+    return (b"0.0.0.0", 0), (addr, dest_port)
+
+
+def _connect_handshake(proxy_type, dest_addr, dest_port, rdns, username,
+                       password):
+    """Handshake connecting to the destination through a proxy, returns the
+    bound and peer addresses."""
+    if proxy_type == SOCKS5:
+        CONNECT = b"\x01"
+        peername, sockname = yield from _SOCKS5_handshake(
+            CONNECT, (dest_addr, dest_port), rdns, username, password)
+        return sockname, peername
+    if proxy_type == SOCKS4:
+        return (yield from _SOCKS4_handshake(dest_addr, dest_port, rdns,
+                                             username))
+    if proxy_type == HTTP:
+        return (yield from _HTTP_handshake(dest_addr, dest_port, rdns,
+                                           username, password))
+    raise GeneralProxyError("Invalid proxy type")
+
+
+def _run_handshake(handshake, send, receive, receive_line):
+    """Drive a handshake with blocking I/O, returns its result."""
+    try:
+        request = next(handshake)
+        while True:
+            if isinstance(request, bytes):
+                send(request)
+                response = None
+            elif request == _READ_LINE:
+                response = receive_line()
+            else:
+                response = receive(request)
+            request = handshake.send(response)
+    except StopIteration as result:
+        return result.value
+
+
 class _BaseSocket(socket.socket):
     """Allows Python 2 delegated methods such as send() to be overridden."""
     def __init__(self, *pos, **kw):
@@ -303,13 +633,26 @@ class socksocket(_BaseSocket):
         """Receive EXACTLY the number of bytes requested from the file object.
 
         Blocks until the required number of bytes have been received."""
-        data = b""
-        while len(data) < count:
-            d = file.read(count - len(data))
-            if not d:
+        data = bytearray(count)
+        view = memoryview(data)
+        received = 0
+        while received < count:
+            n = file.readinto(view[received:])
+            if not n:
                 raise GeneralProxyError("Connection closed unexpectedly")
-            data += d
-        return data
+            received += n
+        return bytes(data)
+
+    def _handshake(self, handshake, conn=None):
+        """Drive a handshake over the connection to the proxy."""
+        conn = conn or self
+        reader = conn.makefile("rb", 0)  # buffering=0 renamed in Python 3
+        try:
+            return _run_handshake(handshake, conn.sendall,
+                                  functools.partial(self._readall, reader),
+                                  reader.readline)
+        finally:
+            reader.close()
 
     def settimeout(self, timeout):
         self._timeout = timeout
@@ -482,216 +825,30 @@ class socksocket(_BaseSocket):
         """
         proxy_type, addr, port, rdns, username, password = self.proxy
 
-        writer = conn.makefile("wb")
-        reader = conn.makefile("rb", 0)  # buffering=0 renamed in Python 3
-        try:
-            # First we'll send the authentication packages we support.
-            if username and password:
-                # The username/password details were supplied to the
-                # set_proxy method so we support the USERNAME/PASSWORD
-                # authentication (in addition to the standard none).
-                writer.write(b"\x05\x02\x00\x02")
-            else:
-                # No username/password were entered, therefore we
-                # only support connections with no authentication.
-                writer.write(b"\x05\x01\x00")
-
-            # We'll receive the server's response to determine which
-            # method was selected
-            writer.flush()
-            chosen_auth = self._readall(reader, 2)
-
-            if chosen_auth[0:1] != b"\x05":
-                # Note: string[i:i+1] is used because indexing of a bytestring
-                # via bytestring[i] yields an integer in Python 3
-                raise GeneralProxyError(
-                    "SOCKS5 proxy server sent invalid data")
-
-            # Check the chosen authentication method
-
-            if chosen_auth[1:2] == b"\x02":
-                # Okay, we need to perform a basic username/password
-                # authentication.
-                if not (username and password):
-                    # Although we said we don't support authentication, the
-                    # server may still request basic username/password
-                    # authentication
-                    raise SOCKS5AuthError("No username/password supplied. "
-                                          "Server requested username/password"
-                                          " authentication")
-
-                writer.write(b"\x01" + chr(len(username)).encode()
-                             + username
-                             + chr(len(password)).encode()
-                             + password)
-                writer.flush()
-                auth_status = self._readall(reader, 2)
-                if auth_status[0:1] != b"\x01":
-                    # Bad response
-                    raise GeneralProxyError(
-                        "SOCKS5 proxy server sent invalid data")
-                if auth_status[1:2] != b"\x00":
-                    # Authentication failed
-                    raise SOCKS5AuthError("SOCKS5 authentication failed")
-
-                # Otherwise, authentication succeeded
-
-            # No authentication is required if 0x00
-            elif chosen_auth[1:2] != b"\x00":
-                # Reaching here is always bad
-                if chosen_auth[1:2] == b"\xFF":
-                    raise SOCKS5AuthError(
-                        "All offered SOCKS5 authentication methods were"
-                        " rejected")
-                else:
-                    raise GeneralProxyError(
-                        "SOCKS5 proxy server sent invalid data")
-
-            # Now we can request the actual connection
-            writer.write(b"\x05" + cmd + b"\x00")
-            resolved = self._write_SOCKS5_address(dst, writer)
-            writer.flush()
-
-            # Get the response
-            resp = self._readall(reader, 3)
-            if resp[0:1] != b"\x05":
-                raise GeneralProxyError(
-                    "SOCKS5 proxy server sent invalid data")
-
-            status = ord(resp[1:2])
-            if status != 0x00:
-                # Connection failed: server returned an error
-                error = SOCKS5_ERRORS.get(status, "Unknown error")
-                raise SOCKS5Error("{:#04x}: {}".format(status, error))
-
-            # Get the bound address/port
-            bnd = self._read_SOCKS5_address(reader)
-
-            super(socksocket, self).settimeout(self._timeout)
-            return (resolved, bnd)
-        finally:
-            reader.close()
-            writer.close()
+        result = self._handshake(
+            _SOCKS5_handshake(cmd, dst, rdns, username, password), conn)
+        super(socksocket, self).settimeout(self._timeout)
+        return result
 
     def _write_SOCKS5_address(self, addr, file):
         """
         Return the host and port packed for the SOCKS5 protocol,
         and the resolved address as a tuple object.
         """
-        host, port = addr
-        proxy_type, _, _, rdns, username, password = self.proxy
-        family_to_byte = {socket.AF_INET: b"\x01", socket.AF_INET6: b"\x04"}
-
-        # If the given destination address is an IP address, we'll
-        # use the IP address request even if remote resolving was specified.
-        # Detect whether the address is IPv4/6 directly.
-        for family in (socket.AF_INET, socket.AF_INET6):
-            try:
-                addr_bytes = socket.inet_pton(family, host)
-                file.write(family_to_byte[family] + addr_bytes)
-                host = socket.inet_ntop(family, addr_bytes)
-                file.write(struct.pack(">H", port))
-                return host, port
-            except socket.error:
-                continue
-
-        # Well it's not an IP number, so it's probably a DNS name.
-        if rdns:
-            # Resolve remotely
-            host_bytes = host.encode("idna")
-            file.write(b"\x03" + chr(len(host_bytes)).encode() + host_bytes)
-        else:
-            # Resolve locally
-            addresses = socket.getaddrinfo(host, port, socket.AF_UNSPEC,
-                                           socket.SOCK_STREAM,
-                                           socket.IPPROTO_TCP,
-                                           socket.AI_ADDRCONFIG)
-            # We can't really work out what IP is reachable, so just pick the
-            # first.
-            target_addr = addresses[0]
-            family = target_addr[0]
-            host = target_addr[4][0]
-
-            addr_bytes = socket.inet_pton(family, host)
-            file.write(family_to_byte[family] + addr_bytes)
-            host = socket.inet_ntop(family, addr_bytes)
-        file.write(struct.pack(">H", port))
-        return host, port
+        packed, resolved = _pack_SOCKS5_address(addr, self.proxy[3])
+        file.write(packed)
+        return resolved
 
     def _read_SOCKS5_address(self, file):
-        atyp = self._readall(file, 1)
-        if atyp == b"\x01":
-            addr = socket.inet_ntoa(self._readall(file, 4))
-        elif atyp == b"\x03":
-            length = self._readall(file, 1)
-            addr = self._readall(file, ord(length))
-        elif atyp == b"\x04":
-            addr = socket.inet_ntop(socket.AF_INET6, self._readall(file, 16))
-        else:
-            raise GeneralProxyError("SOCKS5 proxy server sent invalid data")
-
-        port = struct.unpack(">H", self._readall(file, 2))[0]
-        return addr, port
+        return _run_handshake(_read_SOCKS5_address(), None,
+                              functools.partial(self._readall, file), None)
 
     def _negotiate_SOCKS4(self, dest_addr, dest_port):
         """Negotiates a connection through a SOCKS4 server."""
         proxy_type, addr, port, rdns, username, password = self.proxy
 
-        writer = self.makefile("wb")
-        reader = self.makefile("rb", 0)  # buffering=0 renamed in Python 3
-        try:
-            # Check if the destination address provided is an IP address
-            remote_resolve = False
-            try:
-                addr_bytes = socket.inet_aton(dest_addr)
-            except socket.error:
-                # It's a DNS name. Check where it should be resolved.
-                if rdns:
-                    addr_bytes = b"\x00\x00\x00\x01"
-                    remote_resolve = True
-                else:
-                    addr_bytes = socket.inet_aton(
-                        socket.gethostbyname(dest_addr))
-
-            # Construct the request packet
-            writer.write(struct.pack(">BBH", 0x04, 0x01, dest_port))
-            writer.write(addr_bytes)
-
-            # The username parameter is considered userid for SOCKS4
-            if username:
-                writer.write(username)
-            writer.write(b"\x00")
-
-            # DNS name if remote resolving is required
-            # NOTE: This is actually an extension to the SOCKS4 protocol
-            # called SOCKS4A and may not be supported in all cases.
-            if remote_resolve:
-                writer.write(dest_addr.encode("idna") + b"\x00")
-            writer.flush()
-
-            # Get the response from the server
-            resp = self._readall(reader, 8)
-            if resp[0:1] != b"\x00":
-                # Bad data
-                raise GeneralProxyError(
-                    "SOCKS4 proxy server sent invalid data")
-
-            status = ord(resp[1:2])
-            if status != 0x5A:
-                # Connection failed: server returned an error
-                error = SOCKS4_ERRORS.get(status, "Unknown error")
-                raise SOCKS4Error("{:#04x}: {}".format(status, error))
-
-            # Get the bound address/port
-            self.proxy_sockname = (socket.inet_ntoa(resp[4:]),
-                                   struct.unpack(">H", resp[2:4])[0])
-            if remote_resolve:
-                self.proxy_peername = socket.inet_ntoa(addr_bytes), dest_port
-            else:
-                self.proxy_peername = dest_addr, dest_port
-        finally:
-            reader.close()
-            writer.close()
+        self.proxy_sockname, self.proxy_peername = self._handshake(
+            _SOCKS4_handshake(dest_addr, dest_port, rdns, username))
 
     def _negotiate_HTTP(self, dest_addr, dest_port):
         """Negotiates a connection through an HTTP server.
@@ -699,58 +856,8 @@ class socksocket(_BaseSocket):
         NOTE: This currently only supports HTTP CONNECT-style proxies."""
         proxy_type, addr, port, rdns, username, password = self.proxy
 
-        # If we need to resolve locally, we do this now
-        addr = dest_addr if rdns else socket.gethostbyname(dest_addr)
-
-        http_headers = [
-            (b"CONNECT " + addr.encode("idna") + b":"
-             + str(dest_port).encode() + b" HTTP/1.1"),
-            b"Host: " + dest_addr.encode("idna")
-        ]
-
-        if username and password:
-            http_headers.append(b"Proxy-Authorization: basic "
-                                + b64encode(username + b":" + password))
-
-        http_headers.append(b"\r\n")
-
-        self.sendall(b"\r\n".join(http_headers))
-
-        # We just need the first line to check if the connection was successful
-        fobj = self.makefile()
-        status_line = fobj.readline()
-        fobj.close()
-
-        if not status_line:
-            raise GeneralProxyError("Connection closed unexpectedly")
-
-        try:
-            proto, status_code, status_msg = status_line.split(" ", 2)
-        except ValueError:
-            raise GeneralProxyError("HTTP proxy server sent invalid response")
-
-        if not proto.startswith("HTTP/"):
-            raise GeneralProxyError(
-                "Proxy server does not appear to be an HTTP proxy")
-
-        try:
-            status_code = int(status_code)
-        except ValueError:
-            raise HTTPError(
-                "HTTP proxy server did not return a valid HTTP status")
-
-        if status_code != 200:
-            error = "{}: {}".format(status_code, status_msg)
-            if status_code in (400, 403, 405):
-                # It's likely that the HTTP proxy server does not support the
-                # CONNECT tunneling method
-                error += ("\n[*] Note: The HTTP proxy server may not be"
-                          " supported by PySocks (must be a CONNECT tunnel"
-                          " proxy)")
-            raise HTTPError(error)
-
-        self.proxy_sockname = (b"0.0.0.0", 0)
-        self.proxy_peername = addr, dest_port
+        self.proxy_sockname, self.proxy_peername = self._handshake(
+            _HTTP_handshake(dest_addr, dest_port, rdns, username, password))
 
     _proxy_negotiators = {
                            SOCKS4: _negotiate_SOCKS4,
@@ -765,14 +872,20 @@ class socksocket(_BaseSocket):
         Uses the same API as socket's connect().
         To select the proxy server, use set_proxy().
 
-        dest_pair - 2-tuple of (IP/hostname, port).
+        dest_pair - 2-tuple of (IP/hostname, port), or 4-tuple IPv6 address.
+        IPv6 destinations are supported through SOCKS5 and HTTP proxies.
         """
-        if len(dest_pair) != 2 or dest_pair[0].startswith("["):
-            # Probably IPv6, not supported -- raise an error, and hope
-            # Happy Eyeballs (RFC6555) makes sure at least the IPv4
-            # connection works...
-            raise socket.error("PySocks doesn't support IPv6: %s"
-                               % str(dest_pair))
+        if (isinstance(dest_pair, (list, tuple)) and len(dest_pair) == 4
+                and ":" in dest_pair[0]):
+            # IPv6 socket address, flow info and scope id are not relayed
+            dest_pair = tuple(dest_pair[:2])
+        if (isinstance(dest_pair, (list, tuple)) and len(dest_pair) == 2
+                and isinstance(dest_pair[0], str)
+                and dest_pair[0].startswith("[")):
+            dest_pair = (dest_pair[0].strip("[]"), dest_pair[1])
+        if not isinstance(dest_pair, (list, tuple)) or len(dest_pair) != 2:
+            raise GeneralProxyError(
+                "Invalid destination-connection (host, port) pair")
 
         dest_addr, dest_port = dest_pair
 
@@ -877,3 +990,204 @@ class socksocket(_BaseSocket):
         if not proxy_port:
             raise GeneralProxyError("Invalid proxy type")
         return proxy_addr, proxy_port
+
+
+# asyncio support, asyncio is imported by the functions using it as socks is
+# loaded by every search worker when a proxy is set
+
+HAPPY_EYEBALLS_DELAY = 0.25  # seconds, as recommended by RFC 8305
+
+
+async def _run_handshake_async(handshake, sock):
+    """Drive a handshake over a non-blocking socket, returns its result."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+
+    async def receive(count):
+        data = bytearray(count)
+        view = memoryview(data)
+        received = 0
+        while received < count:
+            n = await loop.sock_recv_into(sock, view[received:])
+            if not n:
+                raise GeneralProxyError("Connection closed unexpectedly")
+            received += n
+        return bytes(data)
+
+    async def receive_line():
+        # byte by byte so no byte of the tunnel is consumed
+        line = bytearray()
+        while not line.endswith(b"\n"):
+            byte = await loop.sock_recv(sock, 1)
+            if not byte:
+                break
+            line += byte
+        return bytes(line)
+
+    try:
+        request = next(handshake)
+        while True:
+            if isinstance(request, bytes):
+                await loop.sock_sendall(sock, request)
+                response = None
+            elif request == _READ_LINE:
+                response = await receive_line()
+            else:
+                response = await receive(request)
+            request = handshake.send(response)
+    except StopIteration as result:
+        return result.value
+
+
+def _interleave_families(addresses):
+    """Alternate address families, starting with the first one (RFC 8305)."""
+    families = []
+    by_family = {}
+    for address in addresses:
+        if address[0] not in by_family:
+            families.append(address[0])
+            by_family[address[0]] = []
+        by_family[address[0]].append(address)
+
+    interleaved = []
+    while any(by_family.values()):
+        for family in families:
+            if by_family[family]:
+                interleaved.append(by_family[family].pop(0))
+    return interleaved
+
+
+async def _connect_socket(host, port, happy_eyeballs_delay):
+    """Return a non-blocking socket connected to host.
+
+    With a happy_eyeballs_delay, a connection attempt to the next address is
+    started when the previous one did not succeed within the delay, the first
+    established connection wins. Otherwise addresses are tried in turn."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if not addresses:
+        raise socket.error("gai returned empty list.")
+
+    async def attempt(address):
+        family, socket_type, proto, _, sockaddr = address
+        sock = socket.socket(family, socket_type, proto)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, sockaddr)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    remaining = _interleave_families(addresses)
+    pending = set()
+    errors = []
+    winner = None
+    try:
+        while winner is None and (remaining or pending):
+            if remaining:
+                pending.add(loop.create_task(attempt(remaining.pop(0))))
+            # a failed attempt starts the next one right away
+            timeout = happy_eyeballs_delay if remaining else None
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                elif winner is None:
+                    winner = task.result()
+                else:
+                    task.result().close()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if winner is None:
+        raise errors[0]
+    return winner
+
+
+async def open_connection(dest_pair, proxy_type=None, proxy_addr=None,
+                          proxy_port=None, proxy_rdns=True,
+                          proxy_username=None, proxy_password=None,
+                          happy_eyeballs_delay=HAPPY_EYEBALLS_DELAY,
+                          **kwargs):
+    """open_connection(dest_pair, **proxy_args) -> (reader, writer)
+
+    asyncio equivalent of create_connection(), returning the streams of
+    asyncio.open_connection() once the proxy connected to the destination.
+
+    dest_pair - 2-tuple of (IP/hostname, port), IPv6 destinations are
+    supported through SOCKS5 and HTTP proxies.
+    **proxy_args - Same args passed to socksocket.set_proxy() if present,
+    otherwise the default proxy is used, if any.
+    happy_eyeballs_delay - Delay before racing a connection to the next
+    address of the proxy, or None to try the addresses in turn.
+    **kwargs - Passed to asyncio.open_connection(), e.g. ssl and
+    server_hostname to establish TLS through the tunnel.
+    """
+    import asyncio
+
+    remote_host, remote_port = dest_pair[:2]
+    if remote_host.startswith("["):
+        remote_host = remote_host.strip("[]")
+
+    if proxy_type:
+        proxy = (proxy_type, proxy_addr, proxy_port, proxy_rdns,
+                 proxy_username, proxy_password)
+    else:
+        proxy = socksocket.default_proxy or (None, None, None, None, None,
+                                             None)
+    proxy_type, proxy_addr, proxy_port, rdns, username, password = proxy
+    if isinstance(username, str):
+        username = username.encode()
+    if isinstance(password, str):
+        password = password.encode()
+
+    if proxy_type is None:
+        sock = await _connect_socket(remote_host, remote_port,
+                                     happy_eyeballs_delay)
+        return await asyncio.open_connection(sock=sock, **kwargs)
+
+    proxy_port = proxy_port or DEFAULT_PORTS.get(proxy_type)
+    if not proxy_port:
+        raise GeneralProxyError("Invalid proxy type")
+    if proxy_addr.startswith("["):
+        proxy_addr = proxy_addr.strip("[]")
+
+    try:
+        sock = await _connect_socket(proxy_addr, proxy_port,
+                                     happy_eyeballs_delay)
+    except socket.error as error:
+        msg = "Error connecting to {} proxy {}:{}".format(
+            PRINTABLE_PROXY_TYPES[proxy_type], proxy_addr, proxy_port)
+        log.debug("%s due to: %s", msg, error)
+        raise ProxyConnectionError(msg, error)
+
+    try:
+        if not (rdns or _is_ip_address(remote_host)):
+            # Resolve locally without blocking the event loop
+            family = socket.AF_INET if proxy_type == SOCKS4 else 0
+            addresses = await asyncio.get_running_loop().getaddrinfo(
+                remote_host, remote_port, family=family,
+                type=socket.SOCK_STREAM)
+            remote_host = addresses[0][4][0]
+
+        await _run_handshake_async(
+            _connect_handshake(proxy_type, remote_host, remote_port, rdns,
+                               username, password), sock)
+    except ProxyError:
+        sock.close()
+        raise
+    except socket.error as error:
+        sock.close()
+        raise GeneralProxyError("Socket error", error)
+    except BaseException:
+        sock.close()
+        raise
+
+    return await asyncio.open_connection(sock=sock, **kwargs)
@@ -0,0 +1,232 @@
+#VERSION: 1.00
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the author nor the names of its contributors may be
+#      used to endorse or promote products derived from this software without
+#      specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+""" Tracing of the engine searches, enabled with the `nova_trace` environment variable
+
+    nova_trace=summary        print where the time of every engine search went on stderr, one line per engine
+    nova_trace=<file>.json    append the spans to the file as Chrome trace events, to load in chrome://tracing
+                              or https://ui.perfetto.dev, `nova2.py` starts the file anew when it starts
+
+    Spans cover the engine search, the requests of `helpers.retrieve_url()` and their phases: DNS resolution,
+    TCP connection, TLS handshake, request until the response headers, body download, decompression and the
+    output of results. The summary reports the time spent in every phase itself, the time left to the engine
+    is its parsing. When tracing is disabled `span()` returns a shared object doing nothing.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+TRACE = os.environ.get('nova_trace', '').strip()
+enabled = (len(TRACE) > 0)
+# path of the Chrome trace file, `None` for the summary
+tracePath = TRACE if (enabled and (TRACE.lower() != 'summary')) else None
+
+
+class Span:
+    """ Timed section of code, used as a context manager """
+
+    __slots__ = ('name', 'category', 'args', 'start', 'children', 'thread', 'parent', '_token')
+
+    def __init__(self, name: str, category: str, args: dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+        self.children = 0  # nanoseconds spent in child spans of the same thread
+        self.thread = 0
+        self.parent: Optional[Span] = None
+
+    def __enter__(self) -> 'Span':
+        self.parent = _currentSpan.get(None)
+        self._token = _currentSpan.set(self)
+        self.thread = threading.get_ident()
+        self.start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, *excinfo: Any) -> None:
+        duration = time.monotonic_ns() - self.start
+        try:
+            _currentSpan.reset(self._token)
+        except ValueError:  # exited in another context
+            _currentSpan.set(self.parent)  # type: ignore[arg-type]
+        if (self.parent is not None) and (self.parent.thread == self.thread):
+            self.parent.children += duration
+        _record(self, duration)
+
+    def set(self, **args: Any) -> None:
+        """ Add arguments to the span, e.g. its outcome """
+
+        self.args.update(args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *excinfo: Any) -> None:
+        pass
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_nullSpan = _NullSpan()
+_currentSpan: ContextVar[Span] = ContextVar('currentSpan')
+
+
+def span(name: str, category: str, **args: Any) -> Any:
+    """ Return a context manager timing the code it wraps, see `Span` """
+
+    if not enabled:
+        return _nullSpan
+    return Span(name, category, args)
+
+
+class SearchSpan(Span):
+    """ Span of an engine search, summing the time spent in every category of the spans it contains """
+
+    __slots__ = ('totals', '_lock', '_searchToken')
+
+    def __init__(self, engine: str) -> None:
+        super().__init__(engine, 'engine', {})
+        self.totals: dict[str, list[int]] = {}  # category -> nanoseconds, count
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'SearchSpan':
+        self._searchToken = _currentSearch.set(self)
+        super().__enter__()
+        return self
+
+    def __exit__(self, *excinfo: Any) -> None:
+        super().__exit__(*excinfo)
+        _currentSearch.reset(self._searchToken)
+        if tracePath is None:
+            print(self.summary(), file=sys.stderr, flush=True)
+        else:
+            flush()
+
+    def add(self, category: str, nanoseconds: int) -> None:
+        with self._lock:
+            total = self.totals.setdefault(category, [0, 0])
+            total[0] += nanoseconds
+            total[1] += 1
+
+    def summary(self) -> str:
+        engine = self.totals.get('engine', [0, 0])
+        parts = [f"engine {engine[0] // 1000000}"]
+        parts += [f"{category} {total[0] // 1000000} ({total[1]})"
+                  for category, total in self.totals.items() if category != 'engine']
+        return f"nova2:trace {self.name}: {(engine[0] + self.children) // 1000000} ms = {' | '.join(parts)}"
+
+
+_currentSearch: ContextVar[SearchSpan] = ContextVar('currentSearch')
+
+
+def search(engine: str) -> Any:
+    """ Return the span of the search of `engine`, the other spans opened during it are summed up in its summary """
+
+    if not enabled:
+        return _nullSpan
+    return SearchSpan(engine)
+
+
+# Chrome trace events not written yet
+_events: list[str] = []
+_eventsLock = threading.Lock()
+
+
+def _record(span: Span, duration: int) -> None:
+    search = _currentSearch.get(None)
+    if search is not None:
+        search.add(span.category, duration - span.children)
+
+    if tracePath is not None:
+        event = {'name': span.name, 'cat': span.category, 'ph': 'X', 'ts': span.start / 1000, 'dur': duration / 1000,
+                 'pid': os.getpid(), 'tid': span.thread, 'args': span.args}
+        with _eventsLock:
+            _events.append(json.dumps(event, default=str))
+
+
+def start_trace() -> None:
+    """ Start the trace file anew, called by nova2 before it starts the engines """
+
+    if tracePath is not None:
+        try:
+            with open(tracePath, 'w', encoding='utf-8') as traceFile:
+                traceFile.write('[\n')
+        except OSError as e:
+            print(f"Can't write the trace file: {e}", file=sys.stderr)
+
+
+def flush() -> None:
+    """ Append the pending events to the trace file
+
+        The processes of a search append to the same file, the closing bracket of the JSON array is left out
+        as the trace viewers allow.
+    """
+
+    with _eventsLock:
+        if (tracePath is None) or (len(_events) == 0):
+            return
+        data = ''.join(f"{event},\n" for event in _events).encode('utf-8')
+        _events.clear()
+
+    try:
+        fd = os.open(tracePath, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    except OSError:
+        return
+    try:
+        if os.fstat(fd).st_size == 0:
+            data = b'[\n' + data
+        view = memoryview(data)
+        while len(view) > 0:
+            view = view[os.write(fd, view):]
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _forget() -> None:
+    global _eventsLock
+    _eventsLock = threading.Lock()
+    _events.clear()
+
+
+if enabled:
+    atexit.register(flush)
+    # a forked child process must not write the events of its parent again
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_forget)
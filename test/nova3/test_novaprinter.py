@@ -0,0 +1,166 @@
+""" Tests of novaprinter, run with `python -m unittest discover -s test/nova3` """
+
+import contextlib
+import io
+import json
+import os
+import select
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'src' / 'searchengine' / 'nova3'))
+
+import novaprinter  # noqa: E402
+from novaprinter import OutputFormat, PrintContext, ResultWriter  # noqa: E402
+
+RECORD: novaprinter.ResultRecord = {
+    'link': 'magnet:?xt=urn:btih:0', 'name': 'name', 'size': 1, 'seeds': 2, 'leech': 3,
+    'engine_url': 'https://example.com', 'desc_link': '-1', 'pub_date': -1,
+}
+
+
+class PipeTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.readFd, self.writeFd = os.pipe()
+        self.addCleanup(os.close, self.readFd)
+        self.addCleanup(os.close, self.writeFd)
+
+    def readLines(self, timeout: float) -> list[str]:
+        """ Wait up to `timeout` seconds for output and return the lines written so far """
+
+        readable, _, _ = select.select([self.readFd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+        return os.read(self.readFd, 65536).decode('utf-8').splitlines()
+
+
+class TestResultWriter(PipeTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.writer = ResultWriter(self.writeFd)
+        # no timer must outlive the pipe
+        self.addCleanup(self.writer.flush)
+
+    def test_line_is_written_after_flush_interval(self) -> None:
+        start = time.monotonic()
+        self.writer.write('line')
+
+        # the engine prints nothing more, e.g. while it waits for a page
+        self.assertEqual(self.readLines(ResultWriter.FLUSH_INTERVAL * 10), ['line'])
+        self.assertLess(time.monotonic() - start, ResultWriter.FLUSH_INTERVAL * 5)
+
+    def test_flush_cancels_the_timer(self) -> None:
+        self.writer.write('first')
+        self.writer.write('second')
+        self.writer.flush()
+        self.assertEqual(self.readLines(0), ['first', 'second'])
+        self.assertEqual(self.readLines(ResultWriter.FLUSH_INTERVAL * 3), [])
+
+
+class TestPrintContext(PipeTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        outputWriter = novaprinter.outputWriter
+        novaprinter.outputWriter = ResultWriter(self.writeFd)
+        self.addCleanup(setattr, novaprinter, 'outputWriter', outputWriter)
+        self.addCleanup(novaprinter.outputWriter.flush)
+
+    def test_batch_is_written_after_flush_interval(self) -> None:
+        context = PrintContext(searchTag='1', engine='engine', outputFormat=OutputFormat.NDJSON)
+        self.addCleanup(context.flush)
+        start = time.monotonic()
+        context.emit(RECORD)
+        context.emit(RECORD)
+
+        lines = self.readLines(ResultWriter.FLUSH_INTERVAL * 10)
+        self.assertLess(time.monotonic() - start, ResultWriter.FLUSH_INTERVAL * 5)
+        self.assertEqual(len(lines), 1)
+        event = json.loads(lines[0])
+        self.assertEqual((event['id'], event['event'], event['engine']), ('1', 'results', 'engine'))
+        self.assertEqual(event['results'], [RECORD, RECORD])
+
+
+class TestPrettyPrinter(PipeTestCase):
+    RESULT: novaprinter.SearchResults = {
+        'link': 'magnet:?xt=urn:btih:0', 'name': 'name', 'size': '1 KiB', 'seeds': 2, 'leech': 3,
+        'engine_url': 'https://example.com',
+    }
+
+    def setUp(self) -> None:
+        super().setUp()
+        outputWriter = novaprinter.outputWriter
+        novaprinter.outputWriter = ResultWriter(self.writeFd)
+        self.addCleanup(setattr, novaprinter, 'outputWriter', outputWriter)
+        self.addCleanup(novaprinter.outputWriter.flush)
+        self.addCleanup(setattr, novaprinter, 'defaultContext', None)
+        self.addCleanup(setattr, novaprinter, 'textFallback', True)
+
+    def printInThread(self) -> None:
+        # a new thread does not inherit `printContext`
+        thread = threading.Thread(target=novaprinter.prettyPrinter, args=(self.RESULT,))
+        thread.start()
+        thread.join()
+
+    def test_default_context(self) -> None:
+        context = PrintContext(engine='engine', outputFormat=OutputFormat.NDJSON)
+        novaprinter.defaultContext = context
+        self.printInThread()
+        context.flush()
+        self.assertEqual(context.resultCount, 1)
+        self.assertEqual(json.loads(self.readLines(0)[0])['results'][0]['size'], 1024)
+
+    def test_no_text_without_context(self) -> None:
+        novaprinter.textFallback = False
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.printInThread()
+        novaprinter.outputWriter.flush()
+        self.assertEqual(self.readLines(0), [])
+
+    def test_text_without_context(self) -> None:
+        self.printInThread()
+        novaprinter.outputWriter.flush()
+        self.assertEqual(self.readLines(0), ['magnet:?xt=urn:btih:0|name|1024|2|3|https://example.com||-1'])
+
+
+class TestAnySizeToBytes(unittest.TestCase):
+    def test_units(self) -> None:
+        self.assertEqual(novaprinter.anySizeToBytes('2 GB'), 2 * 1024**3)
+        self.assertEqual(novaprinter.anySizeToBytes('0.5 KiB'), 512)
+        self.assertEqual(novaprinter.anySizeToBytes('3 Kbytes'), 3 * 1024)
+        self.assertEqual(novaprinter.anySizeToBytes('1234'), 1234)
+        self.assertEqual(novaprinter.anySizeToBytes(1234), 1234)
+        self.assertEqual(novaprinter.anySizeToBytes('unknown'), -1)
+
+    def test_decimal_mark(self) -> None:
+        for size in ('1.5 GB', '1,5 GB'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), round(1.5 * 1024**3))
+        for size in ('1,234.5 MB', '1.234,5 MB', "1'234.5 MB", '1 234,5 MB'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), round(1234.5 * 1024**2))
+
+    def test_single_separator_followed_by_three_digits(self) -> None:
+        # ambiguous, comma and dot are read the same way
+        for size in ('1,234 MB', '1.234 MB'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), round(1.234 * 1024**2))
+        for size in ('1,234 GB', '1.234 GB'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), round(1.234 * 1024**3))
+        # a size in bytes has no fraction
+        for size in ('1,234 B', '1.234 B', '1,234', '1.234'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), 1234)
+
+    def test_thousands_separators(self) -> None:
+        for size in ('1,234,567 B', '1.234.567 B', '1 234 567 B'):
+            with self.subTest(size=size):
+                self.assertEqual(novaprinter.anySizeToBytes(size), 1234567)
+        self.assertEqual(novaprinter.anySizesToBytes(['1,234 MB', '1.234 MB']), [round(1.234 * 1024**2)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+""" Tests of tools/bencode.py, run with `python -m unittest discover -s test/tools` """
+
+import io
+import sys
+import unittest
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'tools'))
+
+import bencode  # noqa: E402
+from bencode import BencodedDict, BencodedList, BencodeError  # noqa: E402
+
+TORRENT = {
+    b'announce': b'http://tracker.example/announce',
+    b'info': {
+        b'files': [{b'length': 1024, b'path': [b'dir', b'a.bin']}, {b'length': 0, b'path': [b'b.txt']}],
+        b'name': 'name é'.encode('utf-8'),
+        b'piece length': 16384,
+        b'pieces': bytes(range(256)) * 2,
+        b'private': 0,
+    },
+    b'url-list': [],
+    b'x': {},
+}
+
+# malformed data and the offset of the error, None when it depends on the parser
+MALFORMED: dict[bytes, Optional[int]] = {
+    b'i-0e': 0,
+    b'i03e': 0,
+    b'i-03e': 0,
+    b'ie': 0,
+    b'i1.5e': 0,
+    b'03:abc': 0,
+    b'00:': 0,
+    b'l03:abce': 1,
+    b'd1:a03:abce': 4,
+    b'li1ei01ee': 4,
+    b'3:ab': 4,
+    b'i12': None,
+    b'l': 1,
+    b'li1e': 4,
+    b'd1:a': 4,
+    b'd1:ae': 4,
+    b'di1ei2ee': None,
+    b'i1ei2e': 3,
+    b'': 0,
+}
+
+
+def events(data: bytes, chunk_size: int = bencode.DEFAULT_CHUNK_SIZE) -> list[tuple[str, Any]]:
+    return list(bencode.iterparse(io.BytesIO(data), chunk_size))
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_values(self) -> None:
+        for value in (0, -1, 2**70, b'', b'spam', [], {}, [1, [b'a', [2, {}]]], {b'a': {b'b': [b'c', {b'd': 1}]}},
+                      TORRENT):
+            with self.subTest(value=value):
+                data = bencode.encode(value)
+                self.assertEqual(bencode.decode(data), value)
+                self.assertEqual(bencode.encode(bencode.decode(data)), data)
+
+    def test_encoding(self) -> None:
+        self.assertEqual(bencode.encode({'b': 1, 'a': ['x', b'\xff', (2,)]}), b'd1:al1:x1:\xffli2eee1:bi1ee')
+        self.assertEqual(bencode.encode(-42), b'i-42e')
+
+    def test_keys_are_sorted(self) -> None:
+        data = bencode.encode({b'b': 1, b'a': 2, b'ab': 3, b'B': 4})
+        self.assertEqual(data, b'd1:Bi4e1:ai2e2:abi3e1:bi1ee')
+        # unsorted keys are accepted and sorted back
+        self.assertEqual(bencode.encode(bencode.decode(b'd1:bi1e1:ai2ee')), b'd1:ai2e1:bi1ee')
+
+    def test_non_utf8_strings(self) -> None:
+        value = {b'\xff\xfe': [b'\x80\x00\xc3', 'café'.encode('latin-1')]}
+        data = bencode.encode(value)
+        self.assertEqual(bencode.decode(data), value)
+        self.assertEqual(bencode.load(data)[b'\xff\xfe'][0], b'\x80\x00\xc3')
+        self.assertIn(('key', b'\xff\xfe'), events(data))
+
+    def test_encode_rejects_other_types(self) -> None:
+        with self.assertRaises(TypeError):
+            bencode.encode(1.5)
+        with self.assertRaises(TypeError):
+            bencode.encode({1: 2})
+
+
+class TestLoad(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = bencode.encode(TORRENT)
+        self.torrent = bencode.load(self.data)
+
+    def test_views(self) -> None:
+        self.assertIsInstance(self.torrent, BencodedDict)
+        info = self.torrent[b'info']
+        self.assertIsInstance(info, BencodedDict)
+        files = info[b'files']
+        self.assertIsInstance(files, BencodedList)
+        self.assertEqual(len(files), 2)
+        self.assertEqual(files[-1][b'path'][0], b'b.txt')
+        self.assertEqual([file[b'length'] for file in files[:2]], [1024, 0])
+        self.assertEqual(list(info), sorted(TORRENT[b'info']))  # type: ignore[call-overload]
+        self.assertEqual(self.torrent.get(b'comment', b''), b'')
+        self.assertEqual(len(self.torrent[b'x']), 0)
+        with self.assertRaises(IndexError):
+            files[2]
+
+    def test_decode(self) -> None:
+        self.assertEqual(self.torrent.decode(), TORRENT)
+        self.assertEqual(self.torrent[b'info'][b'files'].decode(), TORRENT[b'info'][b'files'])  # type: ignore[index]
+
+    def test_raw(self) -> None:
+        self.assertEqual(bytes(self.torrent.raw()), self.data)
+        info = self.torrent[b'info']
+        self.assertEqual(bytes(info.raw()), bencode.encode(TORRENT[b'info']))
+        self.assertEqual(bytes(self.torrent.raw_value(b'info')), bytes(info.raw()))
+        self.assertEqual(bytes(info.raw_value(b'piece length')), b'i16384e')
+        # views are encoded as they are
+        self.assertEqual(bencode.encode({b'info': info}), b'd4:info' + bytes(info.raw()) + b'e')
+
+    def test_view(self) -> None:
+        info = self.torrent[b'info']
+        pieces = info.view(b'pieces')
+        self.assertIsInstance(pieces, memoryview)
+        self.assertEqual(pieces.tobytes(), TORRENT[b'info'][b'pieces'])  # type: ignore[index]
+        self.assertIs(pieces.obj, self.data)
+        self.assertEqual(info[b'files'][0][b'path'].view(-1).tobytes(), b'a.bin')
+        with self.assertRaises(TypeError):
+            info.view(b'piece length')
+
+    def test_scalars(self) -> None:
+        self.assertEqual(bencode.load(b'i7e'), 7)
+        self.assertEqual(bencode.load(memoryview(b'3:abc')), b'abc')
+
+
+class TestIterparse(unittest.TestCase):
+    def test_events(self) -> None:
+        self.assertEqual(events(b'd1:ali1e2:bce1:di0ee'), [
+            ('dict', None), ('key', b'a'), ('list', None), ('int', 1), ('bytes', b'bc'), ('end', None),
+            ('key', b'd'), ('int', 0), ('end', None)])
+
+    def test_chunks(self) -> None:
+        data = bencode.encode(TORRENT)
+        expected = events(data)
+        for chunk_size in (1, 2, 7, 100):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(events(data, chunk_size), expected)
+
+
+class TestMalformed(unittest.TestCase):
+    def test_rejected(self) -> None:
+        for data, offset in MALFORMED.items():
+            for name, parse in (('decode', bencode.decode), ('load', bencode.load), ('iterparse', events)):
+                with self.subTest(data=data, parser=name):
+                    with self.assertRaises(BencodeError) as raised:
+                        parse(data)
+                    if offset is not None:
+                        self.assertEqual(raised.exception.offset, offset)
+
+    def test_truncated(self) -> None:
+        data = bencode.encode(TORRENT)
+        for end in range(len(data)):
+            for name, parse in (('decode', bencode.decode), ('load', bencode.load), ('iterparse', events)):
+                with self.subTest(end=end, parser=name):
+                    with self.assertRaises(BencodeError):
+                        parse(data[:end])
+
+    def test_trailing_data(self) -> None:
+        for name, parse in (('decode', bencode.decode), ('load', bencode.load), ('iterparse', events)):
+            with self.subTest(parser=name):
+                with self.assertRaises(BencodeError) as raised:
+                    parse(b'le0:')
+                self.assertEqual(raised.exception.offset, 2)
+
+    def test_error_is_value_error(self) -> None:
+        with self.assertRaises(ValueError):
+            bencode.decode(b'i-0e')
+
+
+if __name__ == '__main__':
+    unittest.main()
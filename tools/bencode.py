@@ -0,0 +1,535 @@
+""" Bencode decoder and encoder, without dependencies
+
+    Three ways of reading bencoded data, from the simplest to the most frugal:
+
+        decode(data)        the whole value as dict, list, int and bytes objects, like `bencodepy.decode()`
+        load(data)          a read-only view of the value, its dicts and lists are only decoded as far as they are
+                            accessed and byte strings can be read as memoryview slices of `data`
+        iterparse(file)     events of the value read from a file object, for files too large to be read at once
+
+    A view skips the values it is not asked for by their length, a byte string is not read however long it is:
+
+        with open(path, 'rb') as file:
+            resume = bencode.load(file.read())
+        name = resume.get(b'name', b'')         # b'peers' is neither decoded nor copied
+        pieces = resume.view(b'pieces')         # memoryview of the data, without copy
+
+    `encode()` writes values back, views included. Integers and string lengths are decoded strictly, leading zeros and
+    -0 are errors, while dict keys are accepted in any order.
+"""
+
+import re
+from collections.abc import Iterator, Mapping, Sequence
+from mmap import mmap
+from typing import Any, BinaryIO, Callable, Optional, Union, overload
+
+Buffer = Union[bytes, bytearray, memoryview, mmap]
+# what the buffers are decoded from, see `_buffer()`
+_Buf = Union[bytes, bytearray, mmap]
+
+# first bytes of the encoded values
+_INT = ord('i')
+_LIST = ord('l')
+_DICT = ord('d')
+_END = ord('e')
+_ZERO = ord('0')
+_DIGITS = range(ord('0'), ord('9') + 1)
+
+# integers without leading zeros nor -0, and runs of them, which lists of priorities or indexes are made of
+_intRegex = re.compile(rb'i(0|-?[1-9][0-9]*)e')
+_intsRegex = re.compile(rb'(?:i(?:0|-?[1-9][0-9]*)e)+')
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# longest string length accepted, and integer in `iterparse()`, so a malformed one is not looked for in all the data
+MAX_NUMBER_LENGTH = 64
+
+
+class BencodeError(ValueError):
+    """ Malformed bencoded data """
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(f"{message} at offset {offset}")
+        self.offset = offset
+
+
+def _buffer(data: Buffer) -> _Buf:
+    """ Return a buffer supporting `find()`, the object of `data` if it is a memoryview of a whole buffer """
+
+    if isinstance(data, memoryview):
+        if isinstance(data.obj, (bytes, bytearray, mmap)) and data.contiguous and (data.nbytes == len(data.obj)):
+            return data.obj
+        return data.tobytes()
+    return data
+
+
+def _parse_int(digits: bytes, offset: int) -> int:
+    match = _intRegex.fullmatch(b'i%se' % digits)
+    if match is None:
+        raise BencodeError(f"invalid integer {digits!r}", offset)
+    return int(digits)
+
+
+def _string_bounds(buf: _Buf, pos: int) -> tuple[int, int]:
+    """ Return where the content of the byte string at `pos` starts and ends, inlined in `_decode()` and `_skip()` """
+
+    colon = buf.find(b':', pos, pos + MAX_NUMBER_LENGTH)
+    length = buf[pos:colon]
+    if (colon < 0) or not length.isdigit() or ((length[0] == _ZERO) and (len(length) > 1)):
+        raise _string_error(buf, pos)
+    end = colon + 1 + int(length)
+    if end > len(buf):
+        raise BencodeError("unexpected end of data", len(buf))
+    return colon + 1, end
+
+
+def _string_error(buf: _Buf, pos: int) -> BencodeError:
+    colon = buf.find(b':', pos, pos + MAX_NUMBER_LENGTH)
+    if colon < 0:
+        return BencodeError("invalid string length", pos)
+    return BencodeError(f"invalid string length {bytes(buf[pos:colon])!r}", pos)
+
+
+def _int_match(buf: _Buf, pos: int, regex: re.Pattern[bytes]) -> re.Match[bytes]:
+    match = regex.match(buf, pos)
+    if match is None:
+        end = buf.find(b'e', pos)
+        raise BencodeError(f"invalid integer {bytes(buf[pos + 1:end if (end >= 0) else len(buf)])!r}", pos)
+    return match
+
+
+_NO_KEY = object()
+
+
+def _decode(buf: _Buf, pos: int) -> tuple[Any, int]:
+    """ Decode the value at `pos`, return it with the position following it """
+
+    # the containers being decoded and, in parallel, None for lists, the key of dicts or `_NO_KEY` before it
+    containers: list[Any] = []
+    keys: list[Any] = []
+    find = buf.find
+    size = len(buf)
+    try:
+        while True:
+            first = buf[pos]
+            if first in _DIGITS:
+                colon = find(b':', pos, pos + MAX_NUMBER_LENGTH)
+                length = buf[pos:colon]
+                if (colon < 0) or not length.isdigit() or ((first == _ZERO) and (colon > pos + 1)):
+                    raise _string_error(buf, pos)
+                pos = colon + 1 + int(length)
+                if pos > size:
+                    raise BencodeError("unexpected end of data", size)
+                value: Any = bytes(buf[colon + 1:pos])
+            elif first == _INT:
+                if (len(containers) > 0) and (keys[-1] is None):
+                    # all the integers following in the list at once
+                    end = _int_match(buf, pos, _intsRegex).end()
+                    containers[-1].extend(map(int, _intRegex.findall(buf, pos, end)))
+                    pos = end
+                    continue
+                match = _int_match(buf, pos, _intRegex)
+                value = int(match[1])
+                pos = match.end()
+            elif first == _LIST:
+                containers.append([])
+                keys.append(None)
+                pos += 1
+                continue
+            elif first == _DICT:
+                containers.append({})
+                keys.append(_NO_KEY)
+                pos += 1
+                continue
+            elif (first == _END) and (len(containers) > 0):
+                if (keys[-1] is not None) and (keys[-1] is not _NO_KEY):
+                    raise BencodeError("missing dict value", pos)
+                value = containers.pop()
+                keys.pop()
+                pos += 1
+            else:
+                raise BencodeError(f"unexpected {chr(first)!r}", pos)
+
+            if len(containers) == 0:
+                return value, pos
+            key = keys[-1]
+            if key is None:
+                containers[-1].append(value)
+            elif key is _NO_KEY:
+                if not isinstance(value, bytes):
+                    raise BencodeError("dict key is not a byte string", pos)
+                keys[-1] = value
+            else:
+                containers[-1][key] = value
+                keys[-1] = _NO_KEY
+    except IndexError:
+        raise BencodeError("unexpected end of data", len(buf)) from None
+
+
+def _skip(buf: _Buf, pos: int) -> int:
+    """ Return the position following the value at `pos`, only reading the lengths of its byte strings """
+
+    depth = 0
+    find = buf.find
+    size = len(buf)
+    try:
+        while True:
+            first = buf[pos]
+            if first in _DIGITS:
+                colon = find(b':', pos, pos + MAX_NUMBER_LENGTH)
+                length = buf[pos:colon]
+                if (colon < 0) or not length.isdigit() or ((first == _ZERO) and (colon > pos + 1)):
+                    raise _string_error(buf, pos)
+                pos = colon + 1 + int(length)
+                if pos > size:
+                    raise BencodeError("unexpected end of data", size)
+            elif first == _INT:
+                # a run of integers is only skipped at once in a container, they would be the next values otherwise
+                pos = _int_match(buf, pos, _intsRegex if (depth > 0) else _intRegex).end()
+            elif (first == _LIST) or (first == _DICT):
+                depth += 1
+                pos += 1
+                continue
+            elif (first == _END) and (depth > 0):
+                depth -= 1
+                pos += 1
+            else:
+                raise BencodeError(f"unexpected {chr(first)!r}", pos)
+            if depth == 0:
+                return pos
+    except IndexError:
+        raise BencodeError("unexpected end of data", len(buf)) from None
+
+
+def decode(data: Buffer) -> Any:
+    """ Decode the bencoded value of `data`, as dict, list, int and bytes objects """
+
+    buf = _buffer(data)
+    value, end = _decode(buf, 0)
+    if end != len(buf):
+        raise BencodeError("trailing data", end)
+    return value
+
+
+def load(data: Buffer) -> Any:
+    """ Return a view of the bencoded value of `data`, or the value itself for an int or a byte string
+
+        The views, `BencodedDict` and `BencodedList`, refer to `data` rather than copying it.
+    """
+
+    buf = _buffer(data)
+    if len(buf) == 0:
+        raise BencodeError("unexpected end of data", 0)
+    value = _load(buf, 0)
+    end = value._end if isinstance(value, _BencodedView) else _skip(buf, 0)
+    if end != len(buf):
+        raise BencodeError("trailing data", end)
+    return value
+
+
+def _load(buf: _Buf, start: int) -> Any:
+    first = buf[start]
+    if first == _DICT:
+        return BencodedDict(buf, start)
+    if first == _LIST:
+        return BencodedList(buf, start)
+    return _decode(buf, start)[0]
+
+
+class _BencodedView:
+    __slots__ = ('_buf', '_start', '_end')
+
+    def __init__(self, buf: _Buf, start: int) -> None:
+        self._buf = buf
+        self._start = start
+        self._end = start  # set by the subclasses once they found it
+
+    def raw(self) -> memoryview:
+        """ Return the encoded value, without copy """
+
+        return memoryview(self._buf)[self._start:self._end]
+
+    def decode(self) -> Any:
+        """ Decode the whole value, like `decode()` """
+
+        return _decode(self._buf, self._start)[0]
+
+    def _view(self, start: int) -> memoryview:
+        if self._buf[start] not in _DIGITS:
+            raise TypeError("not a byte string")
+        return memoryview(self._buf)[slice(*_string_bounds(self._buf, start))]
+
+
+class BencodedDict(_BencodedView, Mapping[bytes, Any]):
+    """ Read-only dict of bencoded data, its values are decoded on first access
+
+        Iterates over the keys in the order of the data.
+    """
+
+    __slots__ = ('_offsets', '_values')
+
+    def __init__(self, buf: _Buf, start: int) -> None:
+        super().__init__(buf, start)
+        self._offsets: dict[bytes, tuple[int, int]] = {}
+        self._values: dict[bytes, Any] = {}
+        pos = start + 1
+        try:
+            while buf[pos] != _END:
+                if buf[pos] not in _DIGITS:
+                    raise BencodeError("dict key is not a byte string", pos)
+                keyStart, keyEnd = _string_bounds(buf, pos)
+                valueEnd = _skip(buf, keyEnd)
+                self._offsets[bytes(buf[keyStart:keyEnd])] = (keyEnd, valueEnd)
+                pos = valueEnd
+        except IndexError:
+            raise BencodeError("unexpected end of data", len(buf)) from None
+        self._end = pos + 1
+
+    def __getitem__(self, key: bytes) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = _load(self._buf, self._offsets[key][0])
+        self._values[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __repr__(self) -> str:
+        return f"BencodedDict({list(self._offsets)!r})"
+
+    def view(self, key: bytes) -> memoryview:
+        """ Return the content of the byte string of `key`, without copy """
+
+        return self._view(self._offsets[key][0])
+
+    def raw_value(self, key: bytes) -> memoryview:
+        """ Return the encoded value of `key`, without copy """
+
+        return memoryview(self._buf)[slice(*self._offsets[key])]
+
+
+class BencodedList(_BencodedView, Sequence[Any]):
+    """ Read-only list of bencoded data, its items are decoded on first access """
+
+    __slots__ = ('_offsets', '_items')
+
+    def __init__(self, buf: _Buf, start: int) -> None:
+        super().__init__(buf, start)
+        self._offsets: list[int] = []
+        self._items: dict[int, Any] = {}
+        pos = start + 1
+        try:
+            while buf[pos] != _END:
+                self._offsets.append(pos)
+                pos = _skip(buf, pos)
+        except IndexError:
+            raise BencodeError("unexpected end of data", len(buf)) from None
+        self._offsets.append(pos)  # end of the last item
+        self._end = pos + 1
+
+    @overload
+    def __getitem__(self, index: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Any]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not (0 <= index < len(self)):
+            raise IndexError("BencodedList index out of range")
+        try:
+            return self._items[index]
+        except KeyError:
+            pass
+        item = _load(self._buf, self._offsets[index])
+        self._items[index] = item
+        return item
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __repr__(self) -> str:
+        return f"BencodedList(<{len(self)} items>)"
+
+    def view(self, index: int) -> memoryview:
+        """ Return the content of the byte string at `index`, without copy """
+
+        return self._view(self._offsets[range(len(self))[index]])
+
+
+def encode(value: Any) -> bytes:
+    """ Encode `value`, made of mappings, lists, tuples, ints, bytes-like objects and str, the latter in UTF-8 """
+
+    parts: list[bytes] = []
+    _encode(value, parts.append)
+    return b''.join(parts)
+
+
+def _encode(value: Any, write: Callable[[bytes], Any]) -> None:
+    if isinstance(value, _BencodedView):
+        write(bytes(value.raw()))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        write(b'%d:' % len(data))
+        write(data)
+    elif isinstance(value, str):
+        _encode(value.encode('utf-8'), write)
+    elif isinstance(value, int):
+        write(b'i%de' % value)
+    elif isinstance(value, (list, tuple)):
+        write(b'l')
+        for item in value:
+            _encode(item, write)
+        write(b'e')
+    elif isinstance(value, Mapping):
+        items = []
+        for key, item in value.items():
+            if isinstance(key, str):
+                key = key.encode('utf-8')
+            elif not isinstance(key, (bytes, bytearray)):
+                raise TypeError(f"dict key {key!r} is not a byte string")
+            items.append((bytes(key), item))
+        items.sort(key=lambda keyItem: keyItem[0])
+        write(b'd')
+        for key, item in items:
+            _encode(key, write)
+            _encode(item, write)
+        write(b'e')
+    else:
+        raise TypeError(f"cannot bencode {type(value).__name__}")
+
+
+class _Reader:
+    """ Buffered reading of a file object, keeping track of the offset for the errors """
+
+    def __init__(self, file: BinaryIO, chunk_size: int) -> None:
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buf = bytearray()
+        self._pos = 0
+        self._base = 0  # offset of `_buf` in the file
+
+    @property
+    def offset(self) -> int:
+        return self._base + self._pos
+
+    def _fill(self) -> bool:
+        if self._pos >= self._chunk_size:
+            del self._buf[:self._pos]
+            self._base += self._pos
+            self._pos = 0
+        chunk = self._file.read(self._chunk_size)
+        self._buf += chunk
+        return len(chunk) > 0
+
+    def peek(self) -> Optional[int]:
+        """ Return the next byte without consuming it, None at the end of the file """
+
+        if (self._pos >= len(self._buf)) and not self._fill():
+            return None
+        return self._buf[self._pos]
+
+    def read_until(self, terminator: bytes) -> bytes:
+        """ Consume and return the bytes before `terminator`, consuming `terminator` as well """
+
+        while True:
+            end = self._buf.find(terminator, self._pos, self._pos + MAX_NUMBER_LENGTH)
+            if end >= 0:
+                token = bytes(self._buf[self._pos:end])
+                self._pos = end + 1
+                return token
+            if (len(self._buf) - self._pos) >= MAX_NUMBER_LENGTH:
+                raise BencodeError("number too long", self.offset)
+            if not self._fill():
+                raise BencodeError("unexpected end of data", self.offset + len(self._buf) - self._pos)
+
+    def read(self, size: int) -> bytes:
+        available = len(self._buf) - self._pos
+        if available >= size:
+            data = bytes(self._buf[self._pos:self._pos + size])
+            self._pos += size
+            return data
+        # long strings are read at once rather than through the buffer
+        parts = [bytes(self._buf[self._pos:])]
+        self._base += len(self._buf)
+        self._buf.clear()
+        self._pos = 0
+        missing = size - available
+        while missing > 0:
+            chunk = self._file.read(missing)
+            if len(chunk) == 0:
+                raise BencodeError("unexpected end of data", self._base)
+            parts.append(chunk)
+            self._base += len(chunk)
+            missing -= len(chunk)
+        return b''.join(parts)
+
+
+def iterparse(file: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[str, Any]]:
+    """ Yield the events of the bencoded value read from the binary file object `file`, as (event, value) tuples:
+
+          ('dict', None) and ('list', None) start a container, ('end', None) ends it
+          ('key', bytes) precedes the value of a dict entry
+          ('int', int) and ('bytes', bytes) are the other values
+
+        The file is read by chunks of `chunk_size` bytes, only byte strings longer than that are read at once.
+        Raises `BencodeError` when the data is malformed, after the events of the values preceding the error.
+    """
+
+    reader = _Reader(file, chunk_size)
+    # per open container: True for dicts expecting a key, False for dicts expecting a value and None for lists
+    expectKey: list[Optional[bool]] = []
+    while True:
+        offset = reader.offset
+        first = reader.peek()
+        if first is None:
+            raise BencodeError("unexpected end of data", offset)
+
+        if first in _DIGITS:
+            length = reader.read_until(b':')
+            if not length.isdigit() or ((first == _ZERO) and (len(length) > 1)):
+                raise BencodeError(f"invalid string length {length!r}", offset)
+            value = reader.read(int(length))
+            if (len(expectKey) > 0) and expectKey[-1]:
+                expectKey[-1] = False
+                yield 'key', value
+                continue
+            yield 'bytes', value
+        elif (len(expectKey) > 0) and expectKey[-1] and (first != _END):
+            raise BencodeError("dict key is not a byte string", offset)
+        elif first == _INT:
+            reader.read(1)
+            digits = reader.read_until(b'e')
+            yield 'int', _parse_int(digits, offset)
+        elif (first == _LIST) or (first == _DICT):
+            reader.read(1)
+            expectKey.append(True if (first == _DICT) else None)
+            yield ('dict' if (first == _DICT) else 'list'), None
+            continue
+        elif (first == _END) and (len(expectKey) > 0):
+            if expectKey[-1] is False:
+                raise BencodeError("missing dict value", offset)
+            reader.read(1)
+            expectKey.pop()
+            yield 'end', None
+        else:
+            raise BencodeError(f"unexpected {chr(first)!r}", offset)
+
+        if len(expectKey) == 0:
+            break
+        if expectKey[-1] is False:
+            expectKey[-1] = True
+
+    if reader.peek() is not None:
+        raise BencodeError("trailing data", reader.offset)
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+
+""" Benchmark of the nova3 search engine framework, replaying recorded HTTP responses
+
+    A scenario is one `nova2.py` search together with the HTTP responses its engines received. It is recorded once
+    against the real sites, then replayed as often as needed by a local proxy serving the recorded responses, so
+    the measurements only depend on nova3 and the engines:
+
+        nova3_bench.py record --engines-dir ~/search-plugins/nova3/engines -o scenarios/ubuntu.json \\
+            eztv,limetorrents all ubuntu
+        nova3_bench.py replay --engines-dir ~/search-plugins/nova3/engines scenarios/*.json \\
+            --executors pool,serial,async --repeat 5 --save results.json
+        nova3_bench.py replay ... --baseline results.json    # compare with a previous run
+
+    Every run of `nova2.py` is measured end to end: wall time, time to the first result, results per second and
+    the peak RSS of its largest process. `--syscalls` counts the system calls of an additional run with strace.
+    By default the responses are delayed by the latency recorded for them, `--latency=none` serves them at once
+    to measure the processing overhead only.
+
+    Both plain HTTP and HTTPS are replayed through the proxy. HTTPS tunnels are terminated with certificates of
+    a throwaway CA made with the `openssl` command, which `nova2.py` trusts through `SSL_CERT_FILE`.
+    POSIX only, as the peak RSS comes from `os.wait4()`.
+"""
+
+import argparse
+import base64
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import shutil
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Optional
+
+NOVA3_DIR = Path(__file__).resolve().parent.parent / 'src' / 'searchengine' / 'nova3'
+SCENARIO_FORMAT = 1
+# not forwarded, the proxy recomputes them
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'proxy-connection',
+                      'te', 'trailer', 'transfer-encoding', 'upgrade', 'content-length'}
+
+
+class CertificateAuthority:
+    """ Throwaway CA issuing the certificates of the hosts whose HTTPS tunnels the proxy terminates """
+
+    def __init__(self, directory: Path) -> None:
+        if shutil.which('openssl') is None:
+            raise RuntimeError("the openssl command is required to replay HTTPS")
+
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._contexts: dict[str, ssl.SSLContext] = {}
+        self.cert_path = directory / 'ca.pem'
+        self._key_path = directory / 'ca.key'
+        _openssl('req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+                 '-keyout', self._key_path, '-out', self.cert_path, '-days', '2', '-subj', '/CN=nova3 benchmark CA',
+                 '-addext', 'basicConstraints=critical,CA:TRUE', '-addext', 'keyUsage=critical,keyCertSign,cRLSign')
+
+    def server_context(self, host: str) -> ssl.SSLContext:
+        with self._lock:
+            context = self._contexts.get(host)
+            if context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.load_cert_chain(*self._issue(host))
+                self._contexts[host] = context
+            return context
+
+    def _issue(self, host: str) -> tuple[Path, Path]:
+        name = hashlib.sha1(host.encode()).hexdigest()
+        key_path = self._directory / f'{name}.key'
+        request_path = self._directory / f'{name}.csr'
+        cert_path = self._directory / f'{name}.pem'
+        extensions_path = self._directory / f'{name}.ext'
+
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in host else socket.AF_INET, host)
+            alt_name = f'IP:{host}'
+        except OSError:
+            alt_name = f'DNS:{host}'
+        extensions_path.write_text(f"basicConstraints=CA:FALSE\nsubjectAltName={alt_name}\n"
+                                   "keyUsage=critical,digitalSignature\nextendedKeyUsage=serverAuth\n"
+                                   "subjectKeyIdentifier=hash\nauthorityKeyIdentifier=keyid\n")
+        _openssl('req', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes', '-keyout', key_path,
+                 '-out', request_path, '-subj', f'/CN={host[:64]}')
+        _openssl('x509', '-req', '-in', request_path, '-CA', self.cert_path, '-CAkey', self._key_path,
+                 '-set_serial', str(int(name[:15], 16)), '-out', cert_path, '-days', '2', '-extfile', extensions_path)
+        return cert_path, key_path
+
+
+def _openssl(*args: Any) -> None:
+    subprocess.run(['openssl', *map(str, args)], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def _request_key(method: str, url: str, body: bytes) -> str:
+    return json.dumps([method, url, hashlib.sha256(body).hexdigest() if len(body) > 0 else ''])
+
+
+class ReplayProxy(http.server.ThreadingHTTPServer):
+    """ HTTP proxy answering with the recorded responses, or recording them from the real sites """
+
+    daemon_threads = True
+
+    def __init__(self, ca: Optional[CertificateAuthority], responses: list[dict[str, Any]], record: bool = False,
+                 latency: bool = True) -> None:
+        super().__init__(('127.0.0.1', 0), _ProxyHandler)
+        self.ca = ca
+        self.record = record
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.responses = responses  # in the order they were recorded
+        # several identical requests are answered with their recorded responses in turn, then with the last one
+        self._replay: dict[str, list[dict[str, Any]]] = {}
+        for response in responses:
+            self._replay.setdefault(_request_key(response['method'], response['url'], _body(response, 'request_body')),
+                                    []).append(response)
+        self._served: dict[str, int] = {}
+        self.misses: list[str] = []
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def rewind(self) -> None:
+        with self.lock:
+            self._served.clear()
+            self.misses.clear()
+
+    def lookup(self, method: str, url: str, body: bytes) -> Optional[dict[str, Any]]:
+        key = _request_key(method, url, body)
+        with self.lock:
+            candidates = self._replay.get(key)
+            if candidates is None:
+                self.misses.append(f'{method} {url}')
+                return None
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            return candidates[min(index, len(candidates) - 1)]
+
+
+class _ProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle's algorithm would delay the body until the client's ACK
+    disable_nagle_algorithm = True
+    server: ReplayProxy
+    tunnel: Optional[str] = None  # scheme and authority of the terminated HTTPS tunnel
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_CONNECT(self) -> None:
+        if self.server.ca is None:
+            self.send_error(501, "HTTPS needs the openssl command")
+            return
+        host, _, port = self.path.rpartition(':')
+        self.send_response(200, 'Connection established')
+        self.end_headers()
+        self.wfile.flush()
+
+        # serve the requests of the tunnel on this connection, decrypted
+        self.connection = self.request = self.server.ca.server_context(host.strip('[]')).wrap_socket(
+            self.connection, server_side=True)
+        self.setup()
+        self.tunnel = f'https://{self.path}' if port != '443' else f'https://{host}'
+        self.close_connection = False
+
+    def do_GET(self) -> None:
+        self._proxy()
+
+    do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = do_GET
+
+    def _proxy(self) -> None:
+        url = (self.tunnel + self.path) if (self.tunnel is not None) else self.path
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+
+        if self.server.record:
+            response = _fetch_upstream(self.command, url, self.headers, body)
+            with self.server.lock:
+                self.server.responses.append(response)
+        else:
+            response = self.server.lookup(self.command, url, body)
+            if response is None:
+                self.send_error(404, "Not recorded")
+                return
+            if self.server.latency:
+                time.sleep(response['latency_ms'] / 1000)
+
+        response_body = _body(response, 'body')
+        self.send_response(response['status'], response.get('reason'))
+        for name, value in response['headers']:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(response_body)
+
+
+def _fetch_upstream(method: str, url: str, headers: Any, body: bytes) -> dict[str, Any]:
+    parts = urllib.parse.urlsplit(url)
+    connection: http.client.HTTPConnection
+    if parts.scheme == 'https':
+        connection = http.client.HTTPSConnection(parts.hostname or '', parts.port or 443, timeout=60,
+                                                 context=ssl.create_default_context())
+    else:
+        connection = http.client.HTTPConnection(parts.hostname or '', parts.port or 80, timeout=60)
+    selector = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    request_headers = {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+    start = time.monotonic()
+    try:
+        connection.request(method, selector, body if len(body) > 0 else None, request_headers)
+        upstream = connection.getresponse()
+        # the body is kept as sent, e.g. still compressed
+        response_body = upstream.read()
+    finally:
+        connection.close()
+
+    response = {'method': method, 'url': url, 'status': upstream.status, 'reason': upstream.reason,
+                'headers': [[name, value] for name, value in upstream.getheaders() if name.lower() not in HOP_BY_HOP_HEADERS],
+                'body': base64.b64encode(response_body).decode(), 'latency_ms': round((time.monotonic() - start) * 1000)}
+    if len(body) > 0:
+        response['request_body'] = base64.b64encode(body).decode()
+    return response
+
+
+def _body(response: dict[str, Any], field: str) -> bytes:
+    return base64.b64decode(response.get(field, ''))
+
+
+def prepare_nova3(directory: Path, engines_dir: Path, engines: list[str]) -> None:
+    """ Lay out a copy of nova3 with the engines of the scenario, so the benchmark uses its own caches """
+
+    shutil.copytree(NOVA3_DIR, directory, ignore=shutil.ignore_patterns('__pycache__', '*.sqlite', '*.json'))
+    (directory / 'engines').mkdir(exist_ok=True)
+    (directory / 'engines' / '__init__.py').touch()
+    for engine in engines:
+        shutil.copy2(engines_dir / f'{engine}.py', directory / 'engines' / f'{engine}.py')
+
+
+def nova2_environment(proxy: ReplayProxy, ca: Optional[CertificateAuthority]) -> dict[str, str]:
+    environment = {key: value for key, value in os.environ.items()
+                   if key.lower() not in ('http_proxy', 'https_proxy', 'all_proxy', 'no_proxy', 'sock_proxy',
+                                          'nova_cache_ttl', 'nova_cache_size')}
+    environment.update({'http_proxy': proxy.url, 'https_proxy': proxy.url, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if ca is not None:
+        environment['SSL_CERT_FILE'] = str(ca.cert_path)
+    return environment
+
+
+class RunResult:
+    def __init__(self, wall_ms: float, first_result_ms: Optional[float], results: int, peak_rss_kib: int,
+                 exit_code: int, engines: dict[str, dict[str, Any]]) -> None:
+        self.wall_ms = wall_ms
+        self.first_result_ms = first_result_ms
+        self.results = results
+        self.peak_rss_kib = peak_rss_kib
+        self.exit_code = exit_code
+        self.engines = engines  # completion records of `nova2.py` per engine
+
+
+def run_nova2(nova3_dir: Path, executor: str, scenario: dict[str, Any], environment: dict[str, str],
+              timeout: float) -> RunResult:
+    command = [sys.executable, '-I', str(nova3_dir / 'nova2.py'), f'--executor={executor}',
+               ','.join(scenario['engines']), scenario['category'], *scenario['query'].split()]
+    start = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment)
+
+    first_result: list[float] = []
+    results = [0]
+    engines: dict[str, dict[str, Any]] = {}
+
+    def read_stdout() -> None:
+        for _ in process.stdout:  # type: ignore[union-attr]
+            if len(first_result) == 0:
+                first_result.append(time.monotonic())
+            results[0] += 1
+
+    def read_stderr() -> None:
+        for line in process.stderr:  # type: ignore[union-attr]
+            if line.startswith(b'nova2:completed '):
+                record = json.loads(line[len(b'nova2:completed '):])
+                engines[record['engine']] = record
+
+    readers = [threading.Thread(target=read_stdout), threading.Thread(target=read_stderr)]
+    for reader in readers:
+        reader.start()
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        # the resource usage of the process includes the pool workers it waited for
+        _, status, usage = os.wait4(process.pid, 0)
+    finally:
+        timer.cancel()
+    wall = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+
+    peak_rss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss  # bytes on macOS
+    return RunResult(wall * 1000, ((first_result[0] - start) * 1000) if len(first_result) > 0 else None,
+                     results[0], peak_rss, process.returncode, engines)
+
+
+def count_syscalls(nova3_dir: Path, executor: str, scenario: dict[str, Any], environment: dict[str, str]) -> Optional[int]:
+    """ Return the number of system calls of a run of `nova2.py` and its workers, `None` without strace """
+
+    if shutil.which('strace') is None:
+        return None
+
+    with tempfile.NamedTemporaryFile(suffix='.strace') as summary:
+        subprocess.run(['strace', '-f', '-c', '-o', summary.name, sys.executable, '-I', str(nova3_dir / 'nova2.py'),
+                        f'--executor={executor}', ','.join(scenario['engines']), scenario['category'],
+                        *scenario['query'].split()],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=environment, check=False)
+        for line in Path(summary.name).read_text().splitlines():
+            fields = line.split()
+            if (len(fields) >= 4) and (fields[-1] == 'total'):
+                return int(fields[3])
+    return None
+
+
+def record(args: argparse.Namespace) -> int:
+    engines = [engine.strip() for engine in args.engines.split(',')]
+    scenario = {'format': SCENARIO_FORMAT, 'engines': engines, 'category': args.category, 'query': ' '.join(args.query),
+                'responses': []}
+
+    with tempfile.TemporaryDirectory(prefix='nova3_bench-') as work_dir:
+        ca = _certificate_authority(Path(work_dir))
+        proxy = ReplayProxy(ca, scenario['responses'], record=True)
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+        nova3_dir = Path(work_dir) / 'nova3'
+        prepare_nova3(nova3_dir, Path(args.engines_dir), engines)
+        result = run_nova2(nova3_dir, 'pool', scenario, nova2_environment(proxy, ca), args.timeout)
+        proxy.shutdown()
+
+    Path(args.output).write_text(json.dumps(scenario, indent=1))
+    print(f"Recorded {len(scenario['responses'])} responses, {result.results} results in {result.wall_ms:.0f} ms "
+          f"to {args.output}")
+    return 0
+
+
+def replay(args: argparse.Namespace) -> int:
+    executors = [executor.strip() for executor in args.executors.split(',')]
+    report: dict[str, dict[str, Any]] = {}
+
+    with tempfile.TemporaryDirectory(prefix='nova3_bench-') as work_dir:
+        ca = _certificate_authority(Path(work_dir))
+        for scenario_path in args.scenarios:
+            scenario = json.loads(Path(scenario_path).read_text())
+            if scenario.get('format') != SCENARIO_FORMAT:
+                print(f"{scenario_path}: unsupported scenario format", file=sys.stderr)
+                return 1
+
+            proxy = ReplayProxy(ca, scenario['responses'], latency=(args.latency == 'recorded'))
+            threading.Thread(target=proxy.serve_forever, daemon=True).start()
+            environment = nova2_environment(proxy, ca)
+
+            for executor in executors:
+                # one copy per executor, its caches are warmed up by the first runs
+                nova3_dir = Path(work_dir) / f'{Path(scenario_path).stem}-{executor}'
+                prepare_nova3(nova3_dir, Path(args.engines_dir), scenario['engines'])
+
+                runs = []
+                for index in range(args.warmup + args.repeat):
+                    proxy.rewind()
+                    result = run_nova2(nova3_dir, executor, scenario, environment, args.timeout)
+                    if index >= args.warmup:
+                        runs.append(result)
+                if len(proxy.misses) > 0:
+                    print(f"{scenario_path}: {len(proxy.misses)} requests were not recorded, e.g. {proxy.misses[0]}",
+                          file=sys.stderr)
+
+                name = f'{Path(scenario_path).stem}/{executor}'
+                report[name] = summarize(runs)
+                if args.syscalls:
+                    proxy.rewind()
+                    report[name]['syscalls'] = count_syscalls(nova3_dir, executor, scenario, environment)
+            proxy.shutdown()
+
+    baseline = json.loads(Path(args.baseline).read_text()) if (args.baseline is not None) else {}
+    print_report(report, baseline)
+    if args.save is not None:
+        Path(args.save).write_text(json.dumps(report, indent=1))
+    return 0
+
+
+def summarize(runs: list[RunResult]) -> dict[str, Any]:
+    """ Median of the measurements of the runs, the time to first result of runs without results is left out """
+
+    first_results = [run.first_result_ms for run in runs if run.first_result_ms is not None]
+    wall_ms = statistics.median(run.wall_ms for run in runs)
+    results = statistics.median(run.results for run in runs)
+    engines: dict[str, list[int]] = {}
+    for run in runs:
+        for engine, completion in run.engines.items():
+            engines.setdefault(engine, []).append(completion['elapsed_ms'])
+    return {'runs': len(runs),
+            'wall_ms': round(wall_ms, 1),
+            'wall_ms_min': round(min(run.wall_ms for run in runs), 1),
+            'first_result_ms': round(statistics.median(first_results), 1) if len(first_results) > 0 else None,
+            'results': results,
+            'results_per_s': round(results / (wall_ms / 1000), 1),
+            'peak_rss_kib': max(run.peak_rss_kib for run in runs),
+            'failed_runs': sum(1 for run in runs if run.exit_code != 0),
+            'engine_ms': {engine: statistics.median(elapsed) for engine, elapsed in sorted(engines.items())}}
+
+
+def print_report(report: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]]) -> None:
+    columns = ['wall_ms', 'first_result_ms', 'results', 'results_per_s', 'peak_rss_kib', 'syscalls', 'failed_runs']
+    print(f"{'scenario/executor':<32}" + ''.join(f'{column:>18}' for column in columns))
+    for name, summary in report.items():
+        cells = []
+        for column in columns:
+            value = summary.get(column)
+            cell = '-' if value is None else f'{value:g}'
+            previous = baseline.get(name, {}).get(column)
+            if (value is not None) and isinstance(previous, (int, float)) and (previous != 0):
+                cell += f' ({(value - previous) / previous:+.0%})'
+            cells.append(f'{cell:>18}')
+        print(f'{name:<32}' + ''.join(cells))
+
+
+def _certificate_authority(directory: Path) -> Optional[CertificateAuthority]:
+    try:
+        return CertificateAuthority(directory)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"HTTPS is not replayed: {e}", file=sys.stderr)
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="record the responses of a search against the real sites")
+    record_parser.add_argument('--engines-dir', required=True, help="directory of the engine plugins")
+    record_parser.add_argument('-o', '--output', required=True, help="scenario file to write")
+    record_parser.add_argument('--timeout', type=float, default=300, help="seconds before nova2.py is killed")
+    record_parser.add_argument('engines', help="comma separated engine names")
+    record_parser.add_argument('category')
+    record_parser.add_argument('query', nargs='+')
+    record_parser.set_defaults(run=record)
+
+    replay_parser = subparsers.add_parser('replay', help="measure nova2.py replaying recorded scenarios")
+    replay_parser.add_argument('--engines-dir', required=True, help="directory of the engine plugins")
+    replay_parser.add_argument('--executors', default='pool,serial', help="comma separated values of --executor")
+    replay_parser.add_argument('--repeat', type=int, default=5, help="measured runs per scenario and executor")
+    replay_parser.add_argument('--warmup', type=int, default=1, help="runs ignored before the measured ones")
+    replay_parser.add_argument('--latency', choices=('recorded', 'none'), default='recorded',
+                               help="delay the responses like the sites did, or not at all")
+    replay_parser.add_argument('--syscalls', action='store_true', help="count the system calls with strace")
+    replay_parser.add_argument('--timeout', type=float, default=300, help="seconds before nova2.py is killed")
+    replay_parser.add_argument('--save', help="write the measurements to this JSON file")
+    replay_parser.add_argument('--baseline', help="JSON file of previous measurements to compare with")
+    replay_parser.add_argument('scenarios', nargs='+')
+    replay_parser.set_defaults(run=replay)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+""" Startup time check of nova2, fails when `nova2.py --capabilities --names` starts slower than a budget
+
+    qbt runs `nova2.py --capabilities --names` whenever it lists the search plugins, and every worker of a search
+    starts with the same imports. Measures the wall time of that command in fresh interpreters, as qbt runs it:
+
+        nova3_importtime.py --budget-ms 100
+        nova3_importtime.py --engines-dir ~/search-plugins/nova3/engines --repeat 20 --top 20
+
+    The time of `python -I -c pass` is taken off, so the budget only covers nova2 and not the startup of the
+    interpreter. A first run writes the bytecode and the capabilities manifest, the measured runs use them.
+    One more run with `-X importtime` lists the slowest imports, the modules of `--forbidden` must not be among
+    them: they are imported on first use by the code needing them.
+    Exits with 1 when the budget is exceeded or a forbidden module is imported.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+NOVA3_DIR = Path(__file__).resolve().parent.parent / 'src' / 'searchengine' / 'nova3'
+COMMAND = ['nova2.py', '--capabilities', '--names']
+FORBIDDEN = ('asyncio', 'concurrent.futures', 'sqlite3', 'ssl', 'tempfile', 'xml.etree.ElementTree')
+
+
+def wall_ms(command: list[str], cwd: Path, env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, check=True, cwd=cwd, env=env, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def import_times(command: list[str], cwd: Path, env: dict[str, str]) -> list[tuple[str, int, int]]:
+    """ Return the imports of `command`, as (module, self us, cumulative us) in the order `-X importtime` reports them """
+
+    result = subprocess.run(command, check=True, cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if (len(fields) != 3) or not fields[0].strip().isdigit():
+            continue  # header
+        imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return imports
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines-dir', help="directory of the engine plugins to install, none by default")
+    parser.add_argument('--engines', help="comma separated engine names, all the engines of --engines-dir by default")
+    parser.add_argument('--python', default=sys.executable, help="interpreter to run nova2.py with")
+    parser.add_argument('--repeat', type=int, default=10, help="measured runs, the median is reported")
+    parser.add_argument('--budget-ms', type=float, default=150, help="maximum startup time of nova2 in ms")
+    parser.add_argument('--forbidden', default=','.join(FORBIDDEN),
+                        help="comma separated modules nova2 must not import at startup")
+    parser.add_argument('--top', type=int, default=10, help="number of the slowest imports to list")
+    args = parser.parse_args()
+
+    from nova3_bench import prepare_nova3
+
+    engines: list[str] = []
+    engines_dir = NOVA3_DIR
+    if args.engines_dir is not None:
+        engines_dir = Path(args.engines_dir)
+        engines = (args.engines.split(',') if args.engines
+                   else sorted(path.stem for path in engines_dir.glob('*.py') if not path.stem.startswith('_')))
+    # without the caches of the user, nor the variables enabling the optional features
+    env = {key: value for key, value in os.environ.items() if not key.lower().startswith(('nova_', 'sock_proxy'))}
+
+    with tempfile.TemporaryDirectory(prefix='nova3_importtime') as directory:
+        nova3_dir = Path(directory) / 'nova3'
+        prepare_nova3(nova3_dir, engines_dir, engines)
+
+        nova2 = [args.python, '-I', *COMMAND]
+        wall_ms(nova2, nova3_dir, env)
+        interpreter = statistics.median(wall_ms([args.python, '-I', '-c', 'pass'], nova3_dir, env)
+                                        for _ in range(args.repeat))
+        total = statistics.median(wall_ms(nova2, nova3_dir, env) for _ in range(args.repeat))
+        imports = import_times([args.python, '-I', '-X', 'importtime', *COMMAND], nova3_dir, env)
+
+    startup = total - interpreter
+    print(f"{len(engines)} engines, median of {args.repeat} runs")
+    print(f"{'interpreter':<40}{interpreter:>10.1f} ms")
+    print(f"{' '.join(COMMAND):<40}{total:>10.1f} ms")
+    print(f"{'nova2 startup':<40}{startup:>10.1f} ms   budget {args.budget_ms:g} ms")
+    print()
+    print(f"{'slowest imports':<40}{'self':>10}{'cumulative':>14}")
+    for module, self_us, cumulative_us in sorted(imports, key=lambda entry: entry[2], reverse=True)[:args.top]:
+        print(f"{module:<40}{(self_us / 1000):>7.1f} ms{(cumulative_us / 1000):>11.1f} ms")
+
+    failures = []
+    if startup > args.budget_ms:
+        failures.append(f"nova2 startup took {startup:.1f} ms, over the budget of {args.budget_ms:g} ms")
+    imported = {module for module, *_ in imports}
+    for module in args.forbidden.split(','):
+        if module and (module in imported):
+            failures.append(f"{module} is imported at startup")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if (len(failures) > 0) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
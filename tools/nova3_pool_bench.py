@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+""" Benchmark of the start methods of the nova2 worker pool: fork, spawn and forkserver
+
+    Starts the pool of `nova2.create_pool()` the way `nova2.py` does for a search of the given engines, then has the
+    workers load the engines of a search, several times in a row like the searches of `nova2.py --serve`:
+
+        nova3_pool_bench.py --engines-dir ~/search-plugins/nova3/engines --repeat 5
+
+    Every measurement runs in a fresh interpreter, as a fork server only preloads the engines when it starts.
+    It runs in non-isolated mode from the nova3 directory, where the fork server can find them:
+      import   nova2 and the engines imported by the main process, the same for all methods
+      start    creation of the pool
+      first    first search: the workers start up and load the engines of their jobs
+      next     later searches of the same pool, median
+      pss      proportional set size of the workers after the searches, Linux only
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import active_children, get_all_start_methods
+from pathlib import Path
+from typing import Any, Optional
+
+COLUMNS = ('import', 'start', 'first', 'next', 'pss')
+# Set for the interpreters taking the measurements, where this script stands for nova2.py: the fork server and
+# spawned workers import it as their main module, so they import nova2 as they would with nova2.py
+NOVA3_DIR_VARIABLE = 'NOVA3_POOL_BENCH_DIR'
+_importStart = time.perf_counter()
+if NOVA3_DIR_VARIABLE in os.environ:
+    sys.path.insert(0, os.environ[NOVA3_DIR_VARIABLE])
+    import nova2
+_importMs = (time.perf_counter() - _importStart) * 1000
+
+
+def load_engine(engine: str) -> tuple[int, bool]:
+    """ The job of the workers: load the engine like `nova2.run_search()` does, return the pid and whether it was loaded already """
+
+    loaded = engine in nova2.engine_dict
+    nova2.import_engine(engine)
+    return os.getpid(), loaded
+
+
+def _pss_kib(pid: Optional[int]) -> Optional[int]:
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(method: str, engines: list[str], processes: int, searches: int) -> dict[str, Any]:
+    """ Take the measurements of one start method, in an interpreter started by `run_measure()` """
+
+    start = time.perf_counter()
+    imported_engines = [engine for engine in engines if nova2.import_engine(engine) is not None]
+    import_ms = _importMs + ((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    pool = nova2.create_pool(processes, imported_engines, nova2._CancelledSearches(), method)
+    start_ms = (time.perf_counter() - start) * 1000
+
+    search_ms = []
+    with pool:
+        for _ in range(searches):
+            start = time.perf_counter()
+            pool.map(load_engine, imported_engines, chunksize=1)
+            search_ms.append((time.perf_counter() - start) * 1000)
+        workers = [_pss_kib(worker.pid) for worker in active_children()]
+        pool.terminate()
+
+    return {
+        'import': round(import_ms, 1),
+        'start': round(start_ms, 1),
+        'first': round(search_ms[0], 1),
+        'next': round(statistics.median(search_ms[1:]), 1) if (len(search_ms) > 1) else None,
+        'pss': sum(workers) if (len(workers) > 0) and all((pss is not None) for pss in workers) else None  # type: ignore[misc]
+    }
+
+
+def run_measure(method: str, nova3_dir: Path, engines: list[str], processes: int, searches: int) -> dict[str, Any]:
+    """ Take the measurements of one start method in a new interpreter """
+
+    command = [sys.executable, __file__, '--measure', method,
+               '--engines', ','.join(engines), '--processes', str(processes), '--searches', str(searches)]
+    # from the nova3 directory, so the fork server can preload nova2 and the engines
+    result = subprocess.run(command, check=True, capture_output=True, text=True, cwd=nova3_dir,
+                            env={**os.environ, NOVA3_DIR_VARIABLE: str(nova3_dir)})
+    return json.loads(result.stdout)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines-dir', help="directory of the engine plugins")
+    parser.add_argument('--engines', help="comma separated engine names, all the engines of --engines-dir by default")
+    parser.add_argument('--methods', default=','.join(get_all_start_methods()), help="comma separated start methods")
+    parser.add_argument('--processes', type=int, help="workers of the pool, as nova2.py would start by default")
+    parser.add_argument('--searches', type=int, default=5, help="searches run by every pool")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per start method, the median is reported")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure, args.engines.split(','), args.processes, args.searches)))
+        return 0
+
+    if args.engines_dir is None:
+        parser.error("--engines-dir is required")
+    # not imported by the workers along with this script
+    from nova3_bench import prepare_nova3
+
+    engines_dir = Path(args.engines_dir)
+    engines = (args.engines.split(',') if args.engines
+               else sorted(path.stem for path in engines_dir.glob('*.py') if not path.stem.startswith('_')))
+    methods = args.methods.split(',')
+    for method in methods:
+        if method not in get_all_start_methods():
+            parser.error(f"unsupported start method: {method}")
+
+    with tempfile.TemporaryDirectory(prefix='nova3_pool_bench') as directory:
+        nova3_dir = Path(directory) / 'nova3'
+        prepare_nova3(nova3_dir, engines_dir, engines)
+        processes = args.processes
+        if processes is None:
+            sys.path.insert(0, str(nova3_dir))
+            from nova2 import MAX_THREADS
+            processes = max(min(len(engines), MAX_THREADS), 1)
+
+        print(f"{len(engines)} engines, {processes} workers, {args.searches} searches per pool")
+        print(f"{'method':<12}" + ''.join(f'{column + (" KiB" if column == "pss" else " ms"):>12}' for column in COLUMNS))
+        for method in methods:
+            runs = [run_measure(method, nova3_dir, engines, processes, args.searches) for _ in range(args.repeat)]
+            cells = []
+            for column in COLUMNS:
+                values = [run[column] for run in runs if run[column] is not None]
+                cells.append(f'{statistics.median(values):>12g}' if (len(values) > 0) else f'{"-":>12}')
+            print(f'{method:<12}' + ''.join(cells))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
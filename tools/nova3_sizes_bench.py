@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark of the parsing of the result sizes by `novaprinter.anySizeToBytes()`
+
+    Parses a few million size strings formatted like the torrent sites do, comparing the previous regex based
+    parser with `anySizeToBytes()` called per row and with the bulk `anySizesToBytes()`:
+
+        nova3_sizes_bench.py --rows 3000000 --distinct 5000
+
+    Sites print sizes with 2 or 3 significant decimals, so a search yields far fewer distinct size strings than
+    results, `--distinct` sets how many the rows are drawn from. The `cold` run parses distinct strings only.
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Union
+
+NOVA3_DIR = Path(__file__).resolve().parent.parent / 'src' / 'searchengine' / 'nova3'
+sys.path.insert(0, str(NOVA3_DIR))
+
+import novaprinter  # noqa: E402
+
+FORMATS = ('{value:.2f} {unit}', '{value:.1f}{unit}', '{value:,.2f} {unit}', '{comma} {unit}', '{value:.2f} {iec}')
+UNITS = (('KB', 'KiB', 2**10), ('MB', 'MiB', 2**20), ('GB', 'GiB', 2**30), ('TB', 'TiB', 2**40))
+
+legacySizeUnitRegex = re.compile(r"^(?P<size>\d*\.?\d+) *(?P<unit>[a-z]+)?", re.IGNORECASE)
+
+
+def legacy_any_size_to_bytes(size_string: Union[float, int, str]) -> int:
+    """ `anySizeToBytes()` of novaprinter 1.60 """
+
+    if isinstance(size_string, int):
+        return size_string
+    if isinstance(size_string, float):
+        return round(size_string)
+
+    match = legacySizeUnitRegex.match(size_string.strip())
+    if match is None:
+        return -1
+
+    size = float(match.group('size'))
+    unit = match.group('unit')
+
+    if unit is not None:
+        units_exponents = {'T': 40, 'G': 30, 'M': 20, 'K': 10}
+        exponent = units_exponents.get(unit[0].upper(), 0)
+        size *= 2**exponent
+
+    return round(size)
+
+
+def size_strings(count: int, rng: random.Random) -> list[str]:
+    sizes = set()
+    while len(sizes) < count:
+        unit, iec, multiplier = rng.choice(UNITS)
+        value = rng.uniform(1, 1024 if (multiplier < 2**40) else 8)
+        if (unit == 'MB') and (rng.random() < 0.2):
+            value *= 1000  # formatted with thousands separators
+        comma = f'{value:.2f}'.replace('.', ',')
+        sizes.add(rng.choice(FORMATS).format(value=value, unit=unit, iec=iec, comma=comma))
+    return sorted(sizes)
+
+
+def measure(name: str, parse: Callable[[list[str]], object], rows: list[str], repeat: int) -> None:
+    best = float('inf')
+    for _ in range(repeat):
+        novaprinter._sizeCache.clear()
+        start = time.perf_counter()
+        parse(rows)
+        best = min(best, (time.perf_counter() - start))
+    print(f"{name:<10} {len(rows):>10} rows {best:>8.3f} s {(len(rows) / best / 1e6):>8.2f} M rows/s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3_000_000, help="number of size strings to parse")
+    parser.add_argument('--distinct', type=int, default=5_000, help="number of distinct size strings among the rows")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of every parser, the fastest is reported")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    distinct = size_strings(args.distinct, rng)
+    rows = rng.choices(distinct, k=args.rows)
+
+    mismatches = [size for size in distinct
+                  if (',' not in size) and (' ' not in size)
+                  and (novaprinter.anySizeToBytes(size) != legacy_any_size_to_bytes(size))]
+    if len(mismatches) > 0:
+        print(f"anySizeToBytes() disagrees with the previous parser on {mismatches[:5]}", file=sys.stderr)
+        return 1
+
+    measure('legacy', lambda sizes: [legacy_any_size_to_bytes(size) for size in sizes], rows, args.repeat)
+    measure('per row', lambda sizes: [novaprinter.anySizeToBytes(size) for size in sizes], rows, args.repeat)
+    measure('bulk', novaprinter.anySizesToBytes, rows, args.repeat)
+    measure('cold', novaprinter.anySizesToBytes, distinct, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,12 +3,7 @@ import sys
 import os
 from datetime import datetime
 
-try:
-    import bencodepy
-except ImportError:
-    print("需要安装 bencodepy 库")
-    print("运行: pip install bencodepy")
-    sys.exit(1)
+import bencode
 
 
 def format_bytes(bytes_value):
@@ -42,6 +37,10 @@ def format_timestamp(timestamp):
     return "N/A"
 
 
+# 每个字节对应的 8 个 bit, 高位在前
+BYTE_BITS = [tuple((byte >> i) & 1 for i in range(7, -1, -1)) for byte in range(256)]
+
+
 def decode_bitfield(bitfield_bytes, num_pieces=None):
     """解码 bitfield"""
     if not bitfield_bytes:
@@ -49,8 +48,7 @@ def decode_bitfield(bitfield_bytes, num_pieces=None):
 
     bits = []
     for byte in bitfield_bytes:
-        for i in range(7, -1, -1):
-            bits.append((byte >> i) & 1)
+        bits.extend(BYTE_BITS[byte])
 
     if num_pieces:
         bits = bits[:num_pieces]
@@ -84,7 +82,7 @@ def read_fastresume(file_path):
 
     try:
         with open(file_path, 'rb') as f:
-            data = bencodepy.decode(f.read())
+            data = bencode.load(f.read())
 
         print("\n✓ Bencode 格式验证成功\n")
 
@@ -157,7 +155,7 @@ def read_fastresume(file_path):
             print(f"\n未完成 pieces 数量: {len(unfinished)}")
             print(f"\n未完成 pieces 详细信息:")
             for i, piece_info in enumerate(unfinished):
-                if isinstance(piece_info, dict):
+                if isinstance(piece_info, bencode.BencodedDict):
                     piece_idx = piece_info.get(b'piece', -1)
                     bitmask = piece_info.get(b'bitmask', b'')
                     adler32 = piece_info.get(b'adler32', 0)
@@ -189,7 +187,7 @@ def read_fastresume(file_path):
             print(f"Tracker 数量: {len(trackers)}")
             for tier_idx, tier in enumerate(trackers):
                 print(f"\nTier {tier_idx}:")
-                if isinstance(tier, list):
+                if isinstance(tier, bencode.BencodedList):
                     for tracker in tier:
                         tracker_url = tracker.decode('utf-8', errors='ignore') if isinstance(tracker, bytes) else str(tracker)
                         print(f"  - {tracker_url}")
@@ -313,7 +311,7 @@ def read_fastresume(file_path):
                     return f"<bytes: {val.hex()}>"
                 else:
                     return f"<bytes: {len(val)} 字节, hex前16字节: {val[:16].hex()}...>"
-            elif isinstance(val, list):
+            elif isinstance(val, bencode.BencodedList):
                 if len(val) == 0:
                     return "<list: 空>"
                 elif len(val) <= 10:
@@ -323,7 +321,7 @@ def read_fastresume(file_path):
                     return result.rstrip()
                 else:
                     return f"<list: {len(val)} 项, 过多不展开>"
-            elif isinstance(val, dict):
+            elif isinstance(val, bencode.BencodedDict):
                 if len(val) == 0:
                     return "<dict: 空>"
                 else:
@@ -359,12 +357,12 @@ def read_fastresume(file_path):
                             value_str = f"<bytes: {value.hex()}>"
                     except:
                         value_str = f"<bytes: {value.hex()}>"
-            elif isinstance(value, list):
+            elif isinstance(value, bencode.BencodedList):
                 if key in [b'trackers', b'httpseeds', b'url-list', b'qBt-tags']:
                     value_str = f"<list: {len(value)} 项, 已在上方展示>"
                 else:
                     value_str = format_value(value)
-            elif isinstance(value, dict):
+            elif isinstance(value, bencode.BencodedDict):
                 value_str = format_value(value)
             else:
                 value_str = str(value)
@@ -423,7 +421,7 @@ def interactive_mode(directory):
 
         try:
             with open(file_path, 'rb') as f:
-                data = bencodepy.decode(f.read())
+                data = bencode.load(f.read())
             name = data.get(b'name', b'').decode('utf-8', errors='ignore')
             if name:
                 print(f"  [{i:3d}] {filename}")
@@ -479,7 +477,7 @@ def interactive_mode(directory):
 
                 try:
                     with open(file_path, 'rb') as f:
-                        data = bencodepy.decode(f.read())
+                        data = bencode.load(f.read())
                     name = data.get(b'name', b'').decode('utf-8', errors='ignore')
                     if name:
                         print(f"  [{i:3d}] {filename}")